@@ -0,0 +1,47 @@
+"""Store the rendered html of issues, PRs and their comments
+
+Revision ID: 8a2c4f5e1b73
+Revises: 5df8314dfc13
+Create Date: 2026-10-18 07:30:12.418276
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a2c4f5e1b73'
+down_revision = '5df8314dfc13'
+
+
+COLUMNS = (
+    ('issues', 'content'),
+    ('issue_comments', 'comment'),
+    ('pull_requests', 'initial_comment'),
+    ('pull_request_comments', 'comment'),
+)
+
+
+def upgrade():
+    ''' Add the columns storing the rendered html of the markdown fields of
+    issues, pull-requests and their comments.
+    '''
+    for table, field in COLUMNS:
+        op.add_column(
+            table,
+            sa.Column('%s_html' % field, sa.Text, nullable=True)
+        )
+        op.add_column(
+            table,
+            sa.Column('%s_html_stamp' % field, sa.String(64), nullable=True)
+        )
+
+
+def downgrade():
+    ''' Remove the columns storing the rendered html of the markdown fields
+    of issues, pull-requests and their comments.
+    '''
+    for table, field in COLUMNS:
+        op.drop_column(table, '%s_html_stamp' % field)
+        op.drop_column(table, '%s_html' % field)
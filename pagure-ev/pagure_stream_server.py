@@ -11,22 +11,27 @@ Streaming server for pagure's eventsource feature
 This server takes messages sent to redis and publish them at the specified
 endpoint
 
+Each process holds a single subscription to redis, for all the channels, and
+sends the messages it receives to the clients listening to that channel.
+
 To test, run this script and in another terminal
 nc localhost 8080
-  HELLO
-
   GET /test/issue/26?foo=bar HTTP/1.1
 
 """
 
 from __future__ import unicode_literals, absolute_import
 
+import asyncio
+import collections
+import concurrent.futures
 import logging
 import os
-
+import sys
+import threading
+import time
 
 import redis
-import trololio
 
 from six.moves.urllib.parse import urlparse
 
@@ -47,17 +52,50 @@ from pagure.exceptions import PagureException, PagureEvException  # noqa: E402
 
 SERVER = None
 SESSION = None
+EXECUTOR = None
 POOL = redis.ConnectionPool(
     host=pagure.config.config["REDIS_HOST"],
     port=pagure.config.config["REDIS_PORT"],
     db=pagure.config.config["REDIS_DB"],
 )
 
+# Number of threads running the database queries
+DB_THREADS = 4
+# Number of seconds and number of paths for which the object found at a
+# given path is remembered
+OBJ_CACHE_TTL = 60
+OBJ_CACHE_SIZE = 10000
+# Number of seconds a client has to send its request, and maximum size of
+# that request
+REQUEST_TIMEOUT = 10
+REQUEST_MAX_SIZE = 8192
+# Number of seconds without any message after which a ping is sent
+PING_INTERVAL = 5
+# Number of messages waiting to be sent to a client after which it is
+# considered too slow and disconnected
+CLIENT_QUEUE_SIZE = 100
+
+# The clients listening to each redis channel
+SUBSCRIBERS = collections.defaultdict(set)
+# The uid of the object found at a given path, with its expiry date, and
+# the lookups in progress
+_OBJ_CACHE = collections.OrderedDict()
+_OBJ_LOOKUPS = {}
+
+STATS = {
+    "connections": 0,
+    "messages_received": 0,
+    "messages_sent": 0,
+    "clients_dropped": 0,
+    "fanout_count": 0,
+    "fanout_total": 0.0,
+    "fanout_max": 0.0,
+}
+
 
 def _get_session():
     global SESSION
     if SESSION is None:
-        print(pagure.config.config["DB_URL"])
         SESSION = pagure.lib.model_base.create_session(
             pagure.config.config["DB_URL"]
         )
@@ -115,8 +153,7 @@ OBJECTS = {"issue": _get_issue, "pull-request": _get_pull_request}
 
 
 def get_obj_from_path(path):
-    """ Return the Ticket or Request object based on the path provided.
-    """
+    """Return the Ticket or Request object based on the path provided."""
     (username, namespace, reponame, objtype, objid) = pagure.utils.parse_path(
         path
     )
@@ -137,129 +174,297 @@ def get_obj_from_path(path):
     return getfunc(repo, objid)
 
 
-@trololio.coroutine
-def handle_client(client_reader, client_writer):
-    data = None
+def _get_uid_from_path(path):
+    """Return the uid of the object at the given path, run in the threads
+    of the executor.
+    """
+    try:
+        return get_obj_from_path(path).uid
+    finally:
+        _get_session().remove()
+
+
+async def get_uid_from_path(path):
+    """Return the uid of the Ticket or Request at the given path.
+
+    The database is queried outside of the event loop, concurrent lookups
+    of the same path are only done once and their result is remembered for
+    OBJ_CACHE_TTL seconds.
+    """
+    cached = _OBJ_CACHE.get(path)
+    if cached is not None and cached[0] > time.monotonic():
+        _OBJ_CACHE.move_to_end(path)
+        return cached[1]
+
+    lookup = _OBJ_LOOKUPS.get(path)
+    if lookup is None:
+        loop = asyncio.get_running_loop()
+        lookup = loop.run_in_executor(EXECUTOR, _get_uid_from_path, path)
+        _OBJ_LOOKUPS[path] = lookup
+        try:
+            uid = await lookup
+        finally:
+            del _OBJ_LOOKUPS[path]
+        _OBJ_CACHE[path] = (time.monotonic() + OBJ_CACHE_TTL, uid)
+        _OBJ_CACHE.move_to_end(path)
+        while len(_OBJ_CACHE) > OBJ_CACHE_SIZE:
+            _OBJ_CACHE.popitem(last=False)
+        return uid
+
+    return await asyncio.shield(lookup)
+
+
+class Client(object):
+    """A client listening to the messages of a redis channel."""
+
+    def __init__(self, channel, writer):
+        self.channel = channel
+        self.writer = writer
+        self.queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+
+    def send(self, data):
+        """Queue the given message to be sent to the client, disconnecting
+        it if it does not keep up with the messages it receives.
+        """
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            log.info("Client too slow, disconnecting it")
+            STATS["clients_dropped"] += 1
+            SUBSCRIBERS[self.channel].discard(self)
+            self.writer.transport.abort()
+
+
+def dispatch(channel, data, received):
+    """Send the message received on the given redis channel to all the
+    clients listening to it.
+    """
+    STATS["messages_received"] += 1
+    for client in list(SUBSCRIBERS.get(channel, ())):
+        client.send(data)
+
+    latency = time.monotonic() - received
+    STATS["fanout_count"] += 1
+    STATS["fanout_total"] += latency
+    STATS["fanout_max"] = max(STATS["fanout_max"], latency)
+
+
+def listen_to_redis(loop):
+    """Hand over to the event loop all the messages published to redis
+    for pagure, using a single subscription for the whole process.
+
+    This is run in its own thread since the redis client is blocking. If
+    it fails for any other reason than redis, the event loop is stopped so
+    the server does not keep accepting clients it will never send anything.
+    """
+    conn = redis.Redis(connection_pool=POOL)
     while True:
-        # give client a chance to respond, timeout after 10 seconds
-        line = yield trololio.From(
-            trololio.asyncio.wait_for(client_reader.readline(), timeout=10.0)
-        )
-        if not line.decode().strip():
+        subscriber = conn.pubsub(ignore_subscribe_messages=True)
+        try:
+            subscriber.psubscribe("pagure.*")
+            for msg in subscriber.listen():
+                if msg["type"] != "pmessage":
+                    continue
+                try:
+                    channel = msg["channel"].decode("utf-8")
+                    data = msg["data"].decode("utf-8")
+                except UnicodeDecodeError:
+                    log.warning(
+                        "Skipping a message which is not valid UTF-8 on %r",
+                        msg["channel"],
+                    )
+                    continue
+                loop.call_soon_threadsafe(
+                    dispatch, channel, data, time.monotonic()
+                )
+        except redis.exceptions.RedisError:
+            log.exception("Lost the connection to redis, reconnecting")
+            time.sleep(1)
+        except Exception:
+            log.exception("Stopped listening to redis, stopping the server")
+            loop.call_soon_threadsafe(loop.stop)
+            return
+        finally:
+            subscriber.close()
+
+
+async def read_request(client_reader):
+    """Read the HTTP request sent by the client and return the path it
+    requests.
+    """
+    lines = []
+    size = 0
+    while True:
+        line = await client_reader.readline()
+        if not line:
+            raise ValueError("Connection closed before the end of the request")
+        size += len(line)
+        if size > REQUEST_MAX_SIZE:
+            raise ValueError("Request too large")
+        line = line.decode("utf-8", "replace").strip()
+        if not line:
             break
-        line = line.decode().rstrip()
-        if data is None:
-            data = line
-
-    if data is None:
-        log.warning("Expected ticket uid, received None")
-        return
+        lines.append(line)
 
-    data = data.decode().rstrip().split()
-    log.info("Received %s", data)
-    if not data:
-        log.warning("No URL provided: %s" % data)
-        return
+    if not lines:
+        raise ValueError("No request received")
 
-    if "/" not in data[1]:
-        log.warning("Invalid URL provided: %s" % data[1])
-        return
+    data = lines[0].split()
+    if len(data) != 3 or data[0] != "GET" or not data[2].startswith("HTTP/"):
+        raise ValueError("Invalid request: %s" % lines[0])
 
     url = urlparse(data[1])
+    if "/" not in url.path:
+        raise ValueError("Invalid URL provided: %s" % data[1])
 
-    try:
-        obj = get_obj_from_path(url.path)
-    except PagureException as err:
-        log.warning(str(err))
-        return
+    return url.path
 
-    origin = pagure.config.config.get("APP_URL")
-    if origin.endswith("/"):
-        origin = origin[:-1]
 
+async def _send_error(client_writer, status):
+    """Send the given HTTP error status to the client."""
     client_writer.write(
-        (
-            "HTTP/1.0 200 OK\n"
-            "Content-Type: text/event-stream\n"
-            "Cache: nocache\n"
-            "Connection: keep-alive\n"
-            "Access-Control-Allow-Origin: %s\n\n" % origin
-        ).encode()
+        ("HTTP/1.0 %s\r\nContent-Length: 0\r\n\r\n" % status).encode()
     )
+    await client_writer.drain()
 
-    conn = redis.Redis(connection_pool=POOL)
-    subscriber = conn.pubsub(ignore_subscribe_messages=True)
 
+async def handle_client(client_reader, client_writer):
+    client = None
     try:
-        subscriber.subscribe("pagure.%s" % obj.uid)
+        try:
+            path = await asyncio.wait_for(
+                read_request(client_reader), timeout=REQUEST_TIMEOUT
+            )
+        except (asyncio.TimeoutError, ValueError) as err:
+            log.warning("Invalid request: %s", err)
+            await _send_error(client_writer, "400 Bad Request")
+            return
+        log.info("Received %s", path)
+
+        try:
+            uid = await get_uid_from_path(path)
+        except PagureException as err:
+            log.warning(str(err))
+            await _send_error(client_writer, "404 Not Found")
+            return
+
+        origin = pagure.config.config.get("APP_URL")
+        if origin.endswith("/"):
+            origin = origin[:-1]
+
+        client_writer.write(
+            (
+                "HTTP/1.0 200 OK\r\n"
+                "Content-Type: text/event-stream\r\n"
+                "Cache-Control: no-cache\r\n"
+                "Connection: keep-alive\r\n"
+                "Access-Control-Allow-Origin: %s\r\n\r\n" % origin
+            ).encode()
+        )
+        await client_writer.drain()
+
+        client = Client("pagure.%s" % uid, client_writer)
+        SUBSCRIBERS[client.channel].add(client)
+        STATS["connections"] += 1
 
-        # Inside a while loop, wait for incoming events.
-        oncall = 0
+        # Wait for incoming events, sending a ping from time to time to see
+        # if the client is still alive
         while True:
-            msg = subscriber.get_message()
-            if msg is None:
-                # Send a ping to see if the client is still alive
-                if oncall >= 5:
-                    # Only send a ping once every 5 seconds
-                    client_writer.write(("event: ping\n\n").encode())
-                    oncall = 0
-                oncall += 1
-                yield trololio.From(client_writer.drain())
-                yield trololio.From(trololio.asyncio.sleep(1))
+            try:
+                data = await asyncio.wait_for(
+                    client.queue.get(), timeout=PING_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                client_writer.write(b"event: ping\n\n")
             else:
-                log.info("Sending %s", msg["data"])
-                client_writer.write(("data: %s\n\n" % msg["data"]).encode())
-                yield trololio.From(client_writer.drain())
+                log.info("Sending %s", data)
+                client_writer.write(("data: %s\n\n" % data).encode())
+                STATS["messages_sent"] += 1
+            # Wait for the client to receive what was sent so far
+            await client_writer.drain()
 
-    except OSError:
+    except (ConnectionError, OSError):
         log.info("Client closed connection")
-    except trololio.ConnectionResetError as err:
-        log.exception("ERROR: ConnectionResetError in handle_client")
-    except Exception as err:
+    except Exception:
         log.exception("ERROR: Exception in handle_client")
-        log.info(type(err))
     finally:
         # Wathever happens, close the connection.
         log.info("Client left. Goodbye!")
-        subscriber.close()
+        if client is not None:
+            STATS["connections"] -= 1
+            SUBSCRIBERS[client.channel].discard(client)
+            if not SUBSCRIBERS[client.channel]:
+                del SUBSCRIBERS[client.channel]
         client_writer.close()
 
 
-@trololio.coroutine
-def stats(client_reader, client_writer):
+def get_stats():
+    """Return the metrics of the server, as text."""
+    stats = dict(STATS)
+    stats["channels"] = len(SUBSCRIBERS)
+    stats["fanout_avg"] = stats["fanout_total"] / (stats["fanout_count"] or 1)
+    return "".join(
+        "%s: %s\n" % (key, stats[key])
+        for key in (
+            "connections",
+            "channels",
+            "messages_received",
+            "messages_sent",
+            "clients_dropped",
+            "fanout_avg",
+            "fanout_max",
+        )
+    )
+
 
+async def stats(client_reader, client_writer):
     try:
-        log.info("Clients: %s", SERVER.active_count)
+        log.info("Clients: %s", STATS["connections"])
         client_writer.write(
-            ("HTTP/1.0 200 OK\n" "Cache: nocache\n\n").encode()
+            (
+                "HTTP/1.0 200 OK\r\n"
+                "Content-Type: text/plain\r\n"
+                "Cache-Control: no-cache\r\n\r\n"
+            ).encode()
         )
-        client_writer.write(("data: %s\n\n" % SERVER.active_count).encode())
-        yield trololio.From(client_writer.drain())
-
-    except trololio.ConnectionResetError as err:
+        client_writer.write(get_stats().encode())
+        await client_writer.drain()
+    except (ConnectionError, OSError) as err:
         log.info(err)
     finally:
         client_writer.close()
-    return
 
 
 def main():
-    global SERVER
+    """Run the server, return 1 if it stopped because it could no longer
+    receive the messages from redis.
+    """
+    global SERVER, EXECUTOR
+    exit_code = 0
     _get_session()
+    EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=DB_THREADS)
 
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    stats_server = None
     try:
-        loop = trololio.asyncio.get_event_loop()
-        coro = trololio.asyncio.start_server(
+        listener = threading.Thread(
+            target=listen_to_redis, args=(loop,), daemon=True
+        )
+        listener.start()
+
+        coro = asyncio.start_server(
             handle_client,
             host=None,
             port=pagure.config.config["EVENTSOURCE_PORT"],
+            backlog=1024,
         )
         SERVER = loop.run_until_complete(coro)
         log.info(
             "Serving server at {}".format(SERVER.sockets[0].getsockname())
         )
         if pagure.config.config.get("EV_STATS_PORT"):
-            stats_coro = trololio.asyncio.start_server(
+            stats_coro = asyncio.start_server(
                 stats,
                 host=None,
                 port=pagure.config.config.get("EV_STATS_PORT"),
@@ -271,21 +476,24 @@ def main():
                 )
             )
         loop.run_forever()
+        # The loop only stops by itself when listen_to_redis failed
+        exit_code = 1
     except KeyboardInterrupt:
         pass
-    except trololio.ConnectionResetError as err:
-        log.exception("ERROR: ConnectionResetError in main")
     except Exception:
         log.exception("ERROR: Exception in main")
     finally:
         # Close the server
-        SERVER.close()
-        if pagure.config.config.get("EV_STATS_PORT"):
+        if SERVER is not None:
+            SERVER.close()
+            loop.run_until_complete(SERVER.wait_closed())
+        if stats_server is not None:
             stats_server.close()
         log.info("End Connection")
-        loop.run_until_complete(SERVER.wait_closed())
+        EXECUTOR.shutdown(wait=False)
         loop.close()
         log.info("End")
+    return exit_code
 
 
 if __name__ == "__main__":
@@ -304,4 +512,4 @@ if __name__ == "__main__":
 
     ch.setFormatter(formatter)
     log.addHandler(ch)
-    main()
+    sys.exit(main())
@@ -16,9 +16,11 @@ API namespace version 0.
 
 from __future__ import absolute_import, unicode_literals
 
+import base64
 import codecs
 import enum
 import functools
+import json
 import logging
 import os
 
@@ -150,6 +152,7 @@ class APIERROR(enum.Enum):
     EMIRRORINGDISABLED = (
         "Mirroring external project has been disabled in this instance"
     )
+    EINVALIDCURSOR = "Invalid or expired pagination cursor"
 
 
 def get_authorized_api_project(session, repo, user=None, namespace=None):
@@ -334,6 +337,100 @@ def get_per_page():
     return per_page
 
 
+def get_cursor():
+    """Returns the cursor specified in the request via the ``after``
+    argument, as a tuple of the keyset of the last object returned in the
+    previous page and the total number of objects computed on the first
+    page.
+    Returns None if no ``after`` argument was specified, in which case the
+    offset-based pagination (``page``) should be used.
+    An empty ``after`` argument requests the first page, and returns
+    ``([], None)``.
+    raises APIERROR.EINVALIDCURSOR if the cursor provided can't be decoded
+    """
+    if "after" not in flask.request.values:
+        return None
+
+    after = flask.request.values.get("after")
+    if not after:
+        return ([], None)
+
+    try:
+        keyset, total = json.loads(
+            base64.urlsafe_b64decode(after.encode("ascii")).decode("utf-8")
+        )
+    except (TypeError, ValueError):
+        raise pagure.exceptions.APIError(
+            400, error_code=APIERROR.EINVALIDCURSOR
+        )
+
+    if (
+        not isinstance(keyset, list)
+        or len(keyset) != 2
+        or not isinstance(total, int)
+    ):
+        raise pagure.exceptions.APIError(
+            400, error_code=APIERROR.EINVALIDCURSOR
+        )
+
+    return (keyset, total)
+
+
+def make_cursor(keyset, total):
+    """Returns the opaque cursor pointing after the given keyset.
+
+    :arg keyset: the keyset of the last object of a page as returned by
+        :func:`pagure.lib.query.get_keyset`
+    :arg total: the total number of objects, carried from one page to the
+        next so it is only counted once
+
+    """
+    return base64.urlsafe_b64encode(
+        json.dumps([keyset, total]).encode("utf-8")
+    ).decode("ascii")
+
+
+def get_cursor_page(cursor, per_page, search, order=None):
+    """Returns the objects of the page pointed by the given cursor, the
+    total number of objects and the pagination metadata of that page.
+
+    Only ``per_page + 1`` objects are retrieved to know if there is a next
+    page and the objects are counted only when returning the first page.
+
+    :arg cursor: the cursor as returned by :func:`get_cursor`
+    :arg per_page: the number of objects to return
+    :arg search: a function returning the number of objects when called
+        with ``count=True`` and otherwise the objects following the
+        ``after`` keyset, up to ``limit`` of them
+    :kwarg order: the key the objects are sorted by, passed to
+        :func:`pagure.lib.query.get_keyset`
+    raises APIERROR.EINVALIDCURSOR if the cursor does not match the
+        objects searched
+
+    """
+    after, total = cursor
+    try:
+        if total is None:
+            total = search(count=True)
+        objects = search(after=after, limit=per_page + 1)
+    except pagure.exceptions.PagureException:
+        raise pagure.exceptions.APIError(
+            400, error_code=APIERROR.EINVALIDCURSOR
+        )
+
+    next_cursor = None
+    if len(objects) > per_page:
+        objects = objects[:per_page]
+        next_cursor = make_cursor(
+            pagure.lib.query.get_keyset(objects[-1], order=order), total
+        )
+
+    pagination = pagure.lib.query.get_cursor_pagination_metadata(
+        flask.request, per_page, total, next_cursor
+    )
+    return objects, total, pagination
+
+
 if pagure_config.get("ENABLE_TICKETS", True):
     from pagure.api import issue  # noqa: E402
     from pagure.api import boards  # noqa: E402, F401
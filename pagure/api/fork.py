@@ -10,6 +10,7 @@
 
 from __future__ import absolute_import, unicode_literals
 
+import functools
 import logging
 
 import flask
@@ -26,6 +27,8 @@ from pagure.api import (
     api_login_required,
     api_method,
     get_authorized_api_project,
+    get_cursor,
+    get_cursor_page,
     get_page,
     get_per_page,
     get_request_data,
@@ -94,6 +97,24 @@ def api_pull_request_views(repo, username=None, namespace=None):
     |               |          |              |   tag, add an exclamation  |
     |               |          |              |   mark in front of it      |
     +---------------+----------+--------------+----------------------------+
+    | ``page``      | int      | Optional     | | Specifies which          |
+    |               |          |              |   page to return           |
+    |               |          |              |   (defaults to: 1)         |
+    +---------------+----------+--------------+----------------------------+
+    | ``per_page``  | int      | Optional     | | The number of pull       |
+    |               |          |              |   requests to return per   |
+    |               |          |              |   page. The maximum is 100.|
+    +---------------+----------+--------------+----------------------------+
+    | ``after``     | string   | Optional     | | Paginates using a cursor |
+    |               |          |              |   instead of ``page``:     |
+    |               |          |              |   leave empty for the      |
+    |               |          |              |   first page and follow    |
+    |               |          |              |   the ``next`` link of the |
+    |               |          |              |   pagination for the next  |
+    |               |          |              |   ones. Only the requested |
+    |               |          |              |   page is then retrieved   |
+    |               |          |              |   from the database.       |
+    +---------------+----------+--------------+----------------------------+
 
     Sample response
     ^^^^^^^^^^^^^^^
@@ -166,51 +187,47 @@ def api_pull_request_views(repo, username=None, namespace=None):
     tags = [tag.strip() for tag in tags if tag.strip()]
 
     status_text = ("%s" % status).lower()
-    requests = []
     if status_text in ["0", "false"]:
-        requests = pagure.lib.query.search_pull_requests(
-            flask.g.session,
-            project_id=repo.id,
-            status=False,
-            assignee=assignee,
-            author=author,
-            tags=tags,
-        )
-
+        status_filter = False
     elif status_text == "all":
-        requests = pagure.lib.query.search_pull_requests(
-            flask.g.session,
-            project_id=repo.id,
-            status=None,
-            assignee=assignee,
-            author=author,
-            tags=tags,
-        )
-
+        status_filter = None
     else:
-        requests = pagure.lib.query.search_pull_requests(
-            flask.g.session,
-            project_id=repo.id,
-            assignee=assignee,
-            author=author,
-            status=status,
-            tags=tags,
-        )
+        status_filter = status
 
-    page = get_page()
-    per_page = get_per_page()
-
-    pagination_metadata = pagure.lib.query.get_pagination_metadata(
-        flask.request, page, per_page, len(requests)
+    search = functools.partial(
+        pagure.lib.query.search_pull_requests,
+        flask.g.session,
+        project_id=repo.id,
+        status=status_filter,
+        assignee=assignee,
+        author=author,
+        tags=tags,
+        load="pull_request_json",
     )
-    start = (page - 1) * per_page
-    if start + per_page > len(requests):
-        requests_page = requests[start:]
+
+    per_page = get_per_page()
+    cursor = get_cursor()
+    if cursor is not None:
+        page = None
+        requests_page, total_requests, pagination_metadata = get_cursor_page(
+            cursor, per_page, search
+        )
     else:
-        requests_page = requests[start : (start + per_page)]
+        requests = search()
+        total_requests = len(requests)
+
+        page = get_page()
+        pagination_metadata = pagure.lib.query.get_pagination_metadata(
+            flask.request, page, per_page, total_requests
+        )
+        start = (page - 1) * per_page
+        if start + per_page > total_requests:
+            requests_page = requests[start:]
+        else:
+            requests_page = requests[start : (start + per_page)]
 
     jsonout = {
-        "total_requests": len(requests),
+        "total_requests": total_requests,
         "requests": [
             request.to_json(public=True, api=True) for request in requests_page
         ],
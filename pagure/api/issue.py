@@ -11,6 +11,7 @@
 from __future__ import absolute_import, print_function, unicode_literals
 
 import datetime
+import functools
 import logging
 
 import arrow
@@ -25,6 +26,8 @@ from pagure.api import (
     api_login_optional,
     api_login_required,
     api_method,
+    get_cursor,
+    get_cursor_page,
     get_page,
     get_per_page,
     get_request_data,
@@ -322,6 +325,15 @@ def api_view_issues(repo, username=None, namespace=None):
     |               |          |             |   to return per page.     |
     |               |          |             |   The maximum is 100.     |
     +---------------+----------+-------------+---------------------------+
+    | ``after``     | string   | Optional    | | Paginates using a       |
+    |               |          |             |   cursor instead of       |
+    |               |          |             |   ``page``: leave empty   |
+    |               |          |             |   for the first page and  |
+    |               |          |             |   follow the ``next``     |
+    |               |          |             |   link of the pagination  |
+    |               |          |             |   for the next ones.      |
+    |               |          |             |   Faster on large sets.   |
+    +---------------+----------+-------------+---------------------------+
 
     Sample response
     ^^^^^^^^^^^^^^^
@@ -474,20 +486,30 @@ def api_view_issues(repo, username=None, namespace=None):
 
     params.update({"updated_after": updated_after})
 
-    page = get_page()
     per_page = get_per_page()
-    params["count"] = True
-    issue_cnt = pagure.lib.query.search_issues(**params)
-    pagination_metadata = pagure.lib.query.get_pagination_metadata(
-        flask.request, page, per_page, issue_cnt
-    )
-    query_start = (page - 1) * per_page
-    query_limit = per_page
-
-    params["count"] = False
-    params["limit"] = query_limit
-    params["offset"] = query_start
-    issues = pagure.lib.query.search_issues(**params)
+    cursor = get_cursor()
+    if cursor is not None:
+        params["load"] = "issue_json"
+        issues, _, pagination_metadata = get_cursor_page(
+            cursor,
+            per_page,
+            functools.partial(pagure.lib.query.search_issues, **params),
+        )
+    else:
+        page = get_page()
+        params["count"] = True
+        issue_cnt = pagure.lib.query.search_issues(**params)
+        pagination_metadata = pagure.lib.query.get_pagination_metadata(
+            flask.request, page, per_page, issue_cnt
+        )
+        query_start = (page - 1) * per_page
+        query_limit = per_page
+
+        params["count"] = False
+        params["limit"] = query_limit
+        params["offset"] = query_start
+        params["load"] = "issue_json"
+        issues = pagure.lib.query.search_issues(**params)
 
     jsonout = flask.jsonify(
         {
@@ -151,6 +151,7 @@ def api_view_user(username):
         fork=False,
         start=repopage_start,
         limit=repopage_limit,
+        load="project_json",
     )
 
     forks_cnt = pagure.lib.query.search_projects(
@@ -169,6 +170,7 @@ def api_view_user(username):
         fork=True,
         start=forkpage_start,
         limit=forkpage_limit,
+        load="project_json",
     )
 
     output["user"] = user.to_json(public=True)
@@ -476,7 +478,9 @@ def api_view_user_issues(username):
     if author:
         # Issues authored by this user
         params_created = params.copy()
-        params_created.update({"author": username})
+        params_created.update(
+            {"author": username, "load": "issue_json_with_project"}
+        )
         issues_created = pagure.lib.query.search_issues(**params_created)
         params_created.update({"offset": None, "limit": None, "count": True})
         issues_created_cnt = pagure.lib.query.search_issues(**params_created)
@@ -491,7 +495,9 @@ def api_view_user_issues(username):
     if assignee:
         # Issues assigned to this user
         params_assigned = params.copy()
-        params_assigned.update({"assignee": username})
+        params_assigned.update(
+            {"assignee": username, "load": "issue_json_with_project"}
+        )
         issues_assigned = pagure.lib.query.search_issues(**params_assigned)
         params_assigned.update({"offset": None, "limit": None, "count": True})
         issues_assigned_cnt = pagure.lib.query.search_issues(**params_assigned)
@@ -1059,6 +1065,7 @@ def api_view_user_requests_filed(username):
         closed_until=closed_until,
         offset=offset,
         limit=limit,
+        load="pull_request_json",
     )
 
     pullrequestslist = [
@@ -1364,6 +1371,7 @@ def api_view_user_requests_actionable(username):
         closed_until=closed_until,
         offset=offset,
         limit=limit,
+        load="pull_request_json",
     )
 
     pullrequestslist = [
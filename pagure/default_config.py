@@ -141,11 +141,50 @@ CELERY_CONFIG = {}
 # Redis configuration
 EVENTSOURCE_SOURCE = None
 WEBHOOK = False
+# Web-hooks delivery: timeout (in seconds) of each request, number of urls
+# notified in parallel, number of retries of a failed delivery, delay (in
+# seconds) before the first retry and size of the per-project delivery log
+WEBHOOK_TIMEOUT = 60
+WEBHOOK_WORKERS = 10
+WEBHOOK_MAX_RETRIES = 5
+WEBHOOK_RETRY_DELAY = 60
+WEBHOOK_LOG_SIZE = 100
 REDIS_HOST = "0.0.0.0"
 REDIS_PORT = 6379
 REDIS_DB = 0
 EVENTSOURCE_PORT = 8080
 
+# Number of rendered markdown documents kept in memory by each process, for
+# how long (in seconds) and whether they are shared with the other processes
+# via redis
+MARKDOWN_CACHE_SIZE = 1000
+MARKDOWN_CACHE_TTL = 300
+MARKDOWN_CACHE_REDIS = False
+
+# Maximum size (in bytes) of the READMEs and documents rendered in html and of
+# the encodings of the files kept in memory by each process (0 to disable this
+# cache), whether they are shared with the other processes via redis and for
+# how long (in seconds) redis keeps them
+RENDER_CACHE_MAX_SIZE = 64 * 1024 * 1024
+RENDER_CACHE_REDIS = False
+RENDER_CACHE_REDIS_TTL = 86400
+
+# Number of seconds the html rendering of issues, pull-requests and their
+# comments stored in the database is used before being rendered again
+RENDERED_HTML_TTL = 3600
+
+# Number of seconds the access of a user on a project is cached in redis,
+# 0 to only cache it for the duration of a request
+REPO_ACCESS_CACHE_TTL = 0
+
+# Number of entries of the cache kept in each git repository after which the
+# outdated ones are removed
+REPO_CACHE_MAX_ENTRIES = 1000
+
+# Number of seconds the content of a repository requested using a full
+# object ID (raw files, patches...) may be cached by clients and proxies
+IMMUTABLE_CACHE_MAX_AGE = 31536000
+
 # Disallow remote pull requests
 DISABLE_REMOTE_PR = False
 
@@ -168,6 +207,18 @@ REMOTE_GIT_FOLDER = os.path.join(
     os.path.abspath(os.path.dirname(__file__)), "..", "lcl", "remotes"
 )
 
+# Folder in which to keep the clones of the git repos made to merge, rebase
+# or edit them, so they are reused. None disables reusing them.
+CLONE_POOL_FOLDER = None
+# Maximum number of clones and disk space (in bytes) the clones may use
+CLONE_POOL_MAX_CLONES = 20
+CLONE_POOL_MAX_SIZE = 10 * 1024 * 1024 * 1024
+
+# Maximum number of other issues or pull-requests updated since the last
+# commit in the tickets or requests git repo written along with the one being
+# updated, so bursts of updates result in a single commit. 0 disables it.
+METADATA_BATCH_SIZE = 100
+
 # Folder containing attachments
 ATTACHMENTS_FOLDER = os.path.join(
     os.path.abspath(os.path.dirname(__file__)), "..", "lcl", "attachments"
@@ -231,6 +282,11 @@ SMTP_SSL = False
 SMTP_USERNAME = None
 SMTP_PASSWORD = None
 
+# Number of connections to the SMTP server kept open to be reused and how
+# long (in seconds) they may stay idle before being closed
+SMTP_POOL_SIZE = 2
+SMTP_POOL_IDLE_TIMEOUT = 60
+
 
 # Email used to sent emails
 FROM_EMAIL = "pagure@localhost.localdomain"
@@ -568,6 +624,11 @@ ALLOW_HTTP_PULL_PUSH = True
 ALLOW_HTTP_PUSH = False
 # Path to Gitolite-shell if using that, None to use Git directly
 HTTP_REPO_ACCESS_GITOLITE = None
+# Whether to stream the body of the HTTP git requests to git instead of
+# buffering it in a temporary file first
+HTTP_REPO_ACCESS_STREAMING = False
+# Size of the chunks in which the body of the HTTP git requests is streamed
+HTTP_REPO_ACCESS_CHUNK_SIZE = 65536
 
 # Configuration for the key helper
 # Look a username up in the database, overrides SSH_KEYS_USERNAME_EXPECT
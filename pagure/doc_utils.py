@@ -27,8 +27,12 @@ from markupsafe import Markup
 
 import pagure.lib.encoding_utils
 import pagure.lib.query
+import pagure.lib.render_cache
+import pagure.pfmarkdown
 from pagure.config import config as pagure_config
 
+MARKDOWN_EXTENSIONS = (".mk", ".md", ".markdown")
+
 
 def modify_rst(rst, view_file_url=None):
     """Downgrade some of our rst directives if docutils is too old."""
@@ -101,16 +105,45 @@ def convert_doc(rst_string, view_file_url=None):
         return html_string
 
 
-def convert_readme(content, ext, view_file_url=None):
+def convert_readme(content, ext, view_file_url=None, oid=None):
     """Convert the provided content according to the extension of the file
     provided.
+    If the ID of the blob holding the content is provided, the conversion
+    is cached.
     """
+    if oid is None:
+        return _convert_readme(content, ext, view_file_url)
+
+    def _render():
+        pagure.pfmarkdown.set_depends_on_user(False)
+        output, safe = _convert_readme(content, ext, view_file_url)
+        return output, safe, pagure.pfmarkdown.depends_on_user()
+
+    mode = "readme%s" % ext
+    context = view_file_url or ""
+    if ext in MARKDOWN_EXTENSIONS:
+        context += pagure.lib.query._markdown_render_context(True)
+    output, safe, user = pagure.lib.render_cache.get_rendering(
+        oid, mode, _render, context=context
+    )
+    if user:
+        # The README links to private projects, it is rendered differently
+        # for each user
+        context += pagure.lib.query._markdown_render_context(True, user=True)
+        output, safe, user = pagure.lib.render_cache.get_rendering(
+            oid, mode, _render, context=context
+        )
+    return output, safe
+
+
+def _convert_readme(content, ext, view_file_url=None):
+    """Convert the provided content without looking at the cache."""
     output = pagure.lib.encoding_utils.decode(ktc.to_bytes(content))
     safe = False
     if ext and ext in [".rst"]:
         safe = True
         output = convert_doc(output, view_file_url)
-    elif ext and ext in [".mk", ".md", ".markdown"]:
+    elif ext and ext in MARKDOWN_EXTENSIONS:
         output = pagure.lib.query.text2markdown(output, readme=True)
         safe = True
     elif not ext or (ext and ext in [".text", ".txt"]):
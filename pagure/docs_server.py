@@ -25,6 +25,7 @@ import pagure.forms
 import pagure.lib.mimetype
 import pagure.lib.model_base
 import pagure.lib.query
+import pagure.utils
 
 # Create the application.
 APP = flask.Flask(__name__)
@@ -141,7 +142,7 @@ def __get_tree_and_content(repo_obj, commit, path):
         if not is_binary_string(blob_obj.data):
             try:
                 content, safe = pagure.doc_utils.convert_readme(
-                    blob_obj.data, ext
+                    blob_obj.data, ext, oid=blob_obj.oid.hex
                 )
                 if safe:
                     filename = name + ".html"
@@ -196,6 +197,10 @@ def view_docs(repo, username=None, namespace=None, filename=None):
             ),
         )
 
+    etag = pagure.utils.get_etag(commit.oid.hex, filename)
+    if pagure.utils.is_not_modified(etag):
+        return pagure.utils.not_modified_response(etag, private=repo.private)
+
     content = None
     tree = None
     if not filename:
@@ -232,4 +237,8 @@ def view_docs(repo, username=None, namespace=None, filename=None):
     else:
         mimetype, _ = pagure.lib.mimetype.guess_type(filename, content)
 
-    return flask.Response(content, mimetype=mimetype)
+    return pagure.utils.cache_response(
+        flask.Response(content, mimetype=mimetype),
+        etag,
+        private=repo.private,
+    )
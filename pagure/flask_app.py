@@ -70,12 +70,47 @@ class AnyJsonRequest(Request):
             return super().on_json_loading_failed(e)
 
 
+class LazyAppCtxGlobals(flask.Flask.app_ctx_globals_class):
+    """``flask.g`` allowing to define attributes whose value is only
+    computed the first time they are used.
+    """
+
+    def set_lazy(self, name, function):
+        """Define the attribute ``name`` as the value returned by the given
+        function, called without arguments when the attribute is first
+        used.
+        """
+        self.__dict__.pop(name, None)
+        self.__dict__.setdefault("_lazy", {})[name] = function
+
+    def __getattr__(self, name):
+        lazy = self.__dict__.get("_lazy", {})
+        if name in lazy:
+            value = lazy.pop(name)()
+            self.__dict__[name] = value
+            return value
+        return super(LazyAppCtxGlobals, self).__getattr__(name)
+
+    def __setattr__(self, name, value):
+        self.__dict__.get("_lazy", {}).pop(name, None)
+        super(LazyAppCtxGlobals, self).__setattr__(name, value)
+
+    def __contains__(self, item):
+        return item in self.__dict__ or item in self.__dict__.get("_lazy", {})
+
+    def get(self, name, default=None):
+        if name in self.__dict__.get("_lazy", {}):
+            return getattr(self, name)
+        return super(LazyAppCtxGlobals, self).get(name, default)
+
+
 def create_app(config=None):
     """Create the flask application."""
     app = flask.Flask(__name__)
     app.config = pagure_config
 
     app.request_class = AnyJsonRequest
+    app.app_ctx_globals_class = LazyAppCtxGlobals
 
     if config:
         app.config.update(config)
@@ -342,14 +377,23 @@ def set_request():
             flask.g.session, repo, user=username, namespace=namespace
         )
         if flask.g.authenticated:
-            flask.g.repo_forked = pagure.lib.query.get_authorized_project(
-                flask.g.session,
-                repo,
-                user=flask.g.fas_user.username,
-                namespace=namespace,
+            # These are only looked up if the page uses them
+            flask.g.set_lazy(
+                "repo_forked",
+                lambda: pagure.lib.query.get_authorized_project(
+                    flask.g.session,
+                    repo,
+                    user=flask.g.fas_user.username,
+                    namespace=namespace,
+                ),
             )
-            flask.g.repo_starred = pagure.lib.query.has_starred(
-                flask.g.session, flask.g.repo, user=flask.g.fas_user.username
+            flask.g.set_lazy(
+                "repo_starred",
+                lambda: pagure.lib.query.has_starred(
+                    flask.g.session,
+                    flask.g.repo,
+                    user=flask.g.fas_user.username,
+                ),
             )
 
             # Block all POST request from blocked users
@@ -402,25 +446,33 @@ def set_request():
                 flask.g.issues_enabled = False
 
         flask.g.reponame = get_repo_path(flask.g.repo)
-        flask.g.repo_obj = pygit2.Repository(flask.g.reponame)
+        # Many pages never look at the git repo, so only open it and list
+        # its branches if they do
+        flask.g.set_lazy(
+            "repo_obj", lambda: pygit2.Repository(flask.g.reponame)
+        )
         flask.g.repo_admin = pagure.utils.is_repo_admin(flask.g.repo)
         flask.g.repo_committer = pagure.utils.is_repo_committer(flask.g.repo)
         if flask.g.authenticated and not flask.g.repo_committer:
-            flask.g.repo_committer = flask.g.fas_user.username in [
-                u.user.username for u in flask.g.repo.collaborators
-            ]
+            access = pagure.utils.get_repo_access(flask.g.repo)
+            flask.g.repo_committer = "collaborator" in access["access"]
 
         flask.g.repo_user = pagure.utils.is_repo_user(flask.g.repo)
-        flask.g.branches = sorted(flask.g.repo_obj.listall_branches())
+        flask.g.set_lazy(
+            "branches", lambda: sorted(flask.g.repo_obj.listall_branches())
+        )
 
         repouser = flask.g.repo.user.user if flask.g.repo.is_fork else None
         fas_user = flask.g.fas_user if pagure.utils.authenticated() else None
-        flask.g.repo_watch_levels = pagure.lib.query.get_watch_level_on_repo(
-            flask.g.session,
-            fas_user,
-            flask.g.repo.name,
-            repouser=repouser,
-            namespace=namespace,
+        flask.g.set_lazy(
+            "repo_watch_levels",
+            lambda: pagure.lib.query.get_watch_level_on_repo(
+                flask.g.session,
+                fas_user,
+                flask.g.repo.name,
+                repouser=repouser,
+                namespace=namespace,
+            ),
         )
 
     items_per_page = pagure_config["ITEM_PER_PAGE"]
@@ -550,7 +602,9 @@ def end_request(exception=None):
 
 def after_request(response):
     """After request callback, adjust the headers returned"""
-    if not hasattr(flask.g, "nonce"):
+    # A 304 response must not replace the policy of the cached page, which
+    # uses the nonce it was rendered with
+    if not hasattr(flask.g, "nonce") or response.status_code == 304:
         return response
 
     csp_headers = pagure_config["CSP_HEADERS"]
@@ -125,9 +125,11 @@ def send_action_notification(
     session, subject, action, project, repodir, user, refname, rev
 ):
     """Send out-going notifications about the branch/tag."""
-    email = pagure.lib.git.get_author_email(rev, repodir)
-    name = pagure.lib.git.get_author(rev, repodir)
-    author = pagure.lib.query.search_user(session, email=email) or name
+    info = pagure.lib.git.get_commits_info([rev], repodir)[rev]
+    author = (
+        pagure.lib.query.search_user(session, email=info["email"])
+        or info["author"]
+    )
     if not isinstance(author, six.string_types):
         author = author.to_json(public=True)
     else:
@@ -169,12 +171,13 @@ def send_notifications(
     pushed.
     """
 
+    commits_info = pagure.lib.git.get_commits_info(revs, repodir)
+    users = pagure.lib.query.get_users_by_email(
+        session, [info["email"] for info in commits_info.values()]
+    )
     auths = set()
-    for rev in revs:
-        email = pagure.lib.git.get_author_email(rev, repodir)
-        name = pagure.lib.git.get_author(rev, repodir)
-        author = pagure.lib.query.search_user(session, email=email) or name
-        auths.add(author)
+    for info in commits_info.values():
+        auths.add(users.get(info["email"]) or info["author"])
 
     authors = []
     for author in auths:
@@ -13,6 +13,7 @@ content to unicode is implemented here.
 
 from __future__ import absolute_import, division, unicode_literals
 
+import codecs
 import logging
 from collections import namedtuple
 
@@ -29,16 +30,57 @@ _log = logging.getLogger(__name__)
 
 Guess = namedtuple("Guess", ["encoding", "confidence"])
 
+# Number of bytes chardet looks at to guess the encoding of the data which is
+# neither valid UTF-8 nor starts with a byte order mark
+SAMPLE_SIZE = 64 * 1024
+
+# Byte order marks and the encoding they denote, the UTF-32 ones come first
+# since the UTF-16 ones are their prefixes
+BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+
+def _detect_known_encoding(data):
+    """
+    Return the encoding of the provided data if it can be known for sure,
+    without having to guess it: if it starts with a byte order mark or if it
+    is valid UTF-8.
+
+    :param data: An array of bytes to treat as text data
+    :type  data: bytes
+    :return: The encoding of the data or None if it has to be guessed
+    :rtype:  str
 
-def detect_encodings(data):
+    """
+    for bom, encoding in BOMS:
+        if data.startswith(bom):
+            return encoding
+
+    try:
+        data.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    return "ascii" if data.isascii() else "utf-8"
+
+
+def detect_encodings(data, sample_size=SAMPLE_SIZE):
     """
     Analyze the provided data for possible character encodings.
 
-    This simply wraps chardet and extracts all the potential encodings it
-    considered before deciding on a particular result.
+    Data starting with a byte order mark or which is valid UTF-8 is known to
+    be in that encoding. Otherwise, this wraps chardet and extracts all the
+    potential encodings it considered before deciding on a particular result.
 
     :param data: An array of bytes to treat as text data
     :type  data: bytes
+    :param sample_size: The number of bytes at the start of the data given
+        to chardet, None to give it all the data
+    :type  sample_size: int
     :return: A dictionary mapping possible encodings to confidence levels
     :rtype:  dict
 
@@ -47,6 +89,13 @@ def detect_encodings(data):
         # It's an empty string so we can safely say it's ascii
         return {"ascii": 1.0}
 
+    encoding = _detect_known_encoding(data)
+    if encoding is not None:
+        return {encoding: 1.0}
+
+    if sample_size is not None:
+        data = data[:sample_size]
+
     # We can't use ``chardet.detect`` because we want to dig in the internals
     # of the detector to bias the utf-8 result.
     if cchardet is not None:
@@ -83,7 +132,7 @@ def detect_encodings(data):
     return encodings
 
 
-def guess_encodings(data):
+def guess_encodings(data, sample_size=SAMPLE_SIZE):
     """
     List all the possible encoding found for the given data.
 
@@ -99,11 +148,14 @@ def guess_encodings(data):
 
     :param data: An array of bytes to treat as text data
     :type  data: bytes
+    :param sample_size: The number of bytes at the start of the data used
+        to guess its encoding, None to use all the data
+    :type  sample_size: int
     :return: A dictionary mapping possible encodings to confidence levels
     :rtype:  dict
 
     """
-    encodings = detect_encodings(data)
+    encodings = detect_encodings(data, sample_size=sample_size)
 
     # Boost utf-8 confidence to heavily skew on the side of utf-8. chardet
     # confidence is between 1.0 and 0 (inclusive), so this boost remains within
@@ -138,6 +190,10 @@ def guess_encoding(data):
     The discussion that lead to this decision can be found at
     https://pagure.io/pagure/issue/891.
 
+    Data which is valid UTF-8 or starts with a byte order mark is not given
+    to chardet, and only its first ``SAMPLE_SIZE`` bytes are otherwise,
+    unless none of the encodings guessed from them fits all the data.
+
     :param data: An array of bytes to treat as text data
     :type  data: bytes
     :return: A string of the best encoding found
@@ -146,17 +202,24 @@ def guess_encoding(data):
         be decoded into
 
     """
-    encodings = guess_encodings(data)
-
-    for encoding in encodings:
-        _log.debug("Trying encoding: %s", encoding)
-        try:
-            data.decode(encoding.encoding)
-            return encoding.encoding
-        except (UnicodeDecodeError, TypeError):
-            # The first error is thrown when we failed to decode in that
-            # encoding, the second when encoding.encoding returned None
-            pass
+    sample_sizes = [SAMPLE_SIZE]
+    if len(data) > SAMPLE_SIZE:
+        # The encodings guessed from the start of the data may not fit the
+        # rest of it, in which case we look at all of it
+        sample_sizes.append(None)
+
+    for sample_size in sample_sizes:
+        encodings = guess_encodings(data, sample_size=sample_size)
+
+        for encoding in encodings:
+            _log.debug("Trying encoding: %s", encoding)
+            try:
+                data.decode(encoding.encoding)
+                return encoding.encoding
+            except (UnicodeDecodeError, TypeError):
+                # The first error is thrown when we failed to decode in that
+                # encoding, the second when encoding.encoding returned None
+                pass
     raise PagureEncodingException("No encoding could be guessed for this file")
 
 
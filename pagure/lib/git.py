@@ -10,6 +10,9 @@
 from __future__ import absolute_import, print_function, unicode_literals
 
 import datetime
+import fcntl
+import functools
+import hashlib
 import json
 import logging
 import os
@@ -22,9 +25,11 @@ import zipfile
 import arrow
 import pygit2
 import six
+import sqlalchemy.orm
 
 # from sqlalchemy.orm.session import Session
 from pygit2.remote import RemoteCollection
+from six.moves import dbm_gnu
 from sqlalchemy.exc import SQLAlchemyError
 
 import pagure.exceptions
@@ -171,15 +176,29 @@ def generate_gitolite_acls(project=None, group=None):
 
 
 def update_git(obj, repo):
-    """Schedules an update_repo task after determining arguments."""
+    """Schedules an update_repo task after determining arguments.
+
+    :arg obj: the issue or pull-request to update in the git repo, or a
+        list of issues or pull-requests of the same project which are
+        then all updated in a single commit
+    :arg repo: the project the objects belong to
+
+    """
+    objs = obj if isinstance(obj, (list, tuple)) else [obj]
+    if not objs:
+        return
+
     ticketuid = None
     requestuid = None
-    if obj.isa == "issue":
-        ticketuid = obj.uid
-    elif obj.isa == "pull-request":
-        requestuid = obj.uid
+    uids = [o.uid for o in objs]
+    if not isinstance(obj, (list, tuple)):
+        uids = uids[0]
+    if objs[0].isa == "issue":
+        ticketuid = uids
+    elif objs[0].isa == "pull-request":
+        requestuid = uids
     else:
-        raise NotImplementedError("Unknown object type %s" % obj.isa)
+        raise NotImplementedError("Unknown object type %s" % objs[0].isa)
 
     queued = pagure.lib.tasks.update_git.delay(
         repo.name,
@@ -209,88 +228,288 @@ def _make_signature(name, email):
     return pygit2.Signature(name=name, email=email)
 
 
-def _update_git(obj, repo):
-    """Update the given issue in its git.
+def _run_metadata_hook(project, repotype, repopath, hooktype, changes):
+    """Run the specified git hook of the bare repo the way a push from
+    pagure would have triggered it.
 
-    This method forks the provided repo, add/edit the issue whose file name
-    is defined by the uid field of the issue and if there are additions/
-    changes commit them and push them back to the original repo.
+    Hooks pointing to pagure's hookrunner are run in-process, any other
+    hook script is executed.
+
+    :arg project: the project the git repo belongs to
+    :type project: pagure.lib.model.Project
+    :arg repotype: the type of the git repo, for example: tickets
+    :arg repopath: the path to the bare git repo
+    :arg hooktype: the hook to run: pre-receive, update or post-receive
+    :arg changes: a dict with the ref updated as key and a tuple of (from,
+        to) as value
+    :raises pagure.exceptions.PagurePushDenied: if the pre-receive or
+        update hook declined the change
 
     """
-    _log.info("Update the git repo: %s for: %s", repo.path, obj)
+    if pagure_config.get("NOGITHOOKS"):
+        return
+
+    hookfile = os.path.join(repopath, "hooks", hooktype)
+    if not os.path.exists(hookfile):
+        return
 
-    with TemporaryClone(repo, obj.repotype, "update_git") as tempclone:
-        if tempclone is None:
-            # Turns out we don't have a repo for this kind of object.
+    hookrunner = os.path.join(
+        os.path.dirname(os.path.realpath(pagure.hooks.__file__)),
+        "files",
+        "hookrunner",
+    )
+    if os.path.realpath(hookfile) == hookrunner:
+        try:
+            pagure.hooks.run_project_hooks(
+                session=sqlalchemy.orm.object_session(project),
+                username="pagure",
+                project=project,
+                hooktype=hooktype,
+                repotype=repotype,
+                repodir=repopath,
+                changes=dict(changes),
+                is_internal=True,
+                pull_request=None,
+            )
             return
+        except SystemExit:
+            errored = True
+    else:
+        env = os.environ.copy()
+        env["GIT_DIR"] = repopath
+        env["GL_USER"] = "pagure"
+        env["GL_BYPASS_ACCESS_CHECKS"] = "1"
+        env["internal"] = "yes"
+        args = []
+        stdin = ""
+        if hooktype == "update":
+            refname = list(changes)[0]
+            args = [refname] + list(changes[refname])
+        else:
+            stdin = "".join(
+                "%s %s %s\n" % (changes[refname] + (refname,))
+                for refname in changes
+            )
+        proc = subprocess.Popen(
+            [hookfile] + args,
+            cwd=repopath,
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        out, _ = proc.communicate(stdin.encode("utf-8"))
+        _log.debug("Output of the %s hook: %s", hooktype, out)
+        errored = proc.returncode != 0
 
-        newpath = tempclone.repopath
-        new_repo = tempclone.repo
+    if errored and hooktype != "post-receive":
+        raise pagure.exceptions.PagurePushDenied(
+            "The %s hook declined the update of %s" % (hooktype, repopath)
+        )
 
-        file_path = os.path.join(newpath, obj.uid)
 
-        # Get the current index
-        index = new_repo.index
+def _commit_metadata(project, repotype, files, message):
+    """Commit the specified changes to the master branch of the bare git
+    repo of the given type of the project.
 
-        # Are we adding files
-        added = False
-        if not os.path.exists(file_path):
-            added = True
+    The blobs, tree and commit are written directly in the bare repo and
+    the branch is moved with a compare-and-swap, the whole commit being
+    redone if the branch moved in the meantime. The pre-receive, update and
+    post-receive hooks of the repo are run as they would be on a push.
 
-        # Write down what changed
-        with open(file_path, "w") as stream:
-            stream.write(
-                json.dumps(
-                    obj.to_json(),
-                    sort_keys=True,
-                    indent=4,
-                    separators=(",", ": "),
-                )
-            )
+    :arg project: the project whose git repo to update
+    :type project: pagure.lib.model.Project
+    :arg repotype: the type of the git repo to update, for example: tickets
+    :arg files: a dict of the names of the files to write at the root of
+        the repo and their content, a content of None removing the file
+    :arg message: the commit message
+    :return: the identifier of the commit created or None if there was
+        nothing to commit
+    :rtype: str or None
 
-        # Retrieve the list of files that changed
-        diff = new_repo.diff()
-        files = []
-        for patch in diff:
-            files.append(patch.delta.new_file.path)
+    """
+    repopath = project.repopath(repotype)
+    if repopath is None or not os.path.exists(repopath):
+        # Turns out we don't have a repo for this kind of object.
+        return None
 
-        # Add the changes to the index
-        if added:
-            index.add(obj.uid)
-        for filename in files:
-            index.add(filename)
+    repo_obj = pygit2.Repository(repopath)
+    refname = "refs/heads/master"
+    # Author/commiter will always be this one
+    author = _make_signature(name="pagure", email="pagure")
+
+    for _ in range(5):
+        parents = []
+        builder = repo_obj.TreeBuilder()
+        ref = repo_obj.references.get(refname)
+        if ref is not None:
+            parent = ref.peel(pygit2.Commit)
+            parents.append(parent.oid)
+            builder = repo_obj.TreeBuilder(parent.tree)
+
+        changed = False
+        for filename, content in sorted(files.items()):
+            entry = builder.get(filename)
+            if content is None:
+                if entry is not None:
+                    builder.remove(filename)
+                    changed = True
+                continue
+            blob = repo_obj.create_blob(content.encode("utf-8"))
+            if entry is None or entry.id != blob:
+                builder.insert(filename, blob, pygit2.GIT_FILEMODE_BLOB)
+                changed = True
 
         # If not change, return
-        if not files and not added:
-            return
+        if not changed:
+            return None
+
+        commit = repo_obj.create_commit(
+            None, author, author, message, builder.write(), parents
+        )
+        oldrev = parents[0].hex if parents else "0" * 40
+        changes = {refname: (oldrev, commit.hex)}
+
+        for hooktype in ("pre-receive", "update"):
+            _run_metadata_hook(project, repotype, repopath, hooktype, changes)
 
-        # See if there is a parent to this commit
-        parent = None
         try:
-            parent = new_repo.head.peel().oid
-        except pygit2.GitError:
-            pass
+            subprocess.check_output(
+                ["git", "update-ref", "-m", "pagure: metadata update"]
+                + [refname, commit.hex, oldrev],
+                cwd=repopath,
+                stderr=subprocess.STDOUT,
+            )
+        except subprocess.CalledProcessError as err:
+            _log.info(
+                "%s moved while updating it in %s, trying again: %s",
+                refname,
+                repopath,
+                err.output,
+            )
+            continue
 
-        parents = []
-        if parent:
-            parents.append(parent)
+        _run_metadata_hook(
+            project, repotype, repopath, "post-receive", changes
+        )
+        return commit.hex
 
-        # Author/commiter will always be this one
-        author = _make_signature(name="pagure", email="pagure")
+    raise pagure.exceptions.PagureException(
+        "Could not update %s in %s" % (refname, repopath)
+    )
 
-        # Actually commit
-        new_repo.create_commit(
-            "refs/heads/master",
-            author,
-            author,
-            "Updated %s %s: %s" % (obj.isa, obj.uid, obj.title),
-            new_repo.index.write_tree(),
-            parents,
+
+def _update_git(obj, repo):
+    """Update the given issue in its git.
+
+    This method writes the JSON representation of the provided issue or
+    pull-request in a file named after its uid field directly in the
+    corresponding bare git repo of the project and commits it, if it
+    changed.
+    A list of issues or pull-requests may also be given, they are then
+    all written in a single commit.
+
+    """
+    objs = obj if isinstance(obj, (list, tuple)) else [obj]
+    if not objs:
+        return
+    _log.info("Update the git repo: %s for: %s", repo.path, obj)
+
+    files = {}
+    for item in objs:
+        files[item.uid] = json.dumps(
+            item.to_json(),
+            sort_keys=True,
+            indent=4,
+            separators=(",", ": "),
         )
-        index.write()
 
-        # And push it back
-        tempclone.push("pagure", "master", internal="yes")
+    # Leave out of the commit the objects already up to date in the repo
+    tree = _get_metadata_tree(repo, objs[0].repotype)
+    if tree is not None:
+        objs = [
+            item
+            for item in objs
+            if item.uid not in tree
+            or tree[item.uid].id
+            != pygit2.hash(files[item.uid].encode("utf-8"))
+        ]
+        if not objs:
+            return
+        files = dict((item.uid, files[item.uid]) for item in objs)
+
+    messages = [
+        "Updated %s %s: %s" % (item.isa, item.uid, item.title) for item in objs
+    ]
+    if len(messages) == 1:
+        message = messages[0]
+    else:
+        message = "Updated %s %ss\n\n%s" % (
+            len(messages),
+            objs[0].isa,
+            "\n".join(messages),
+        )
+
+    _commit_metadata(repo, objs[0].repotype, files, message)
+
+
+def _get_metadata_tree(project, repotype):
+    """Return the tree of the master branch of the bare git repo of the
+    given type of the project, None if there is none.
+    """
+    repopath = project.repopath(repotype)
+    if repopath is None or not os.path.exists(repopath):
+        return None
+    repo_obj = pygit2.Repository(repopath)
+    ref = repo_obj.references.get("refs/heads/master")
+    if ref is None:
+        return None
+    return ref.peel(pygit2.Commit).tree
+
+
+def _get_pending_updates(session, project, objs):
+    """Return the other issues or pull-requests of the project, of the same
+    type as the given ones, updated since the last commit in their git repo.
+
+    Writing them along with the given ones coalesces a burst of updates in
+    a single commit, the tasks queued for them then having nothing left to
+    commit.
+
+    :arg session: the session to use to connect to the database
+    :arg project: the project the objects belong to
+    :type project: pagure.lib.model.Project
+    :arg objs: the issues or pull-requests being updated
+    :type objs: list
+    :return: at most ``METADATA_BATCH_SIZE`` other issues or pull-requests
+    :rtype: list
+
+    """
+    limit = pagure_config.get("METADATA_BATCH_SIZE", 100)
+    if not limit:
+        return []
+
+    repotype = objs[0].repotype
+    repopath = project.repopath(repotype)
+    if repopath is None or not os.path.exists(repopath):
+        return []
+    repo_obj = pygit2.Repository(repopath)
+    ref = repo_obj.references.get("refs/heads/master")
+    if ref is None:
+        return []
+    since = datetime.datetime.utcfromtimestamp(
+        ref.peel(pygit2.Commit).commit_time
+    )
+
+    if objs[0].isa == "issue":
+        pending = pagure.lib.query.search_issues(
+            session, repo=project, updated_after=since, limit=limit
+        )
+    else:
+        pending = pagure.lib.query.search_pull_requests(
+            session, project_id=project.id, updated_after=since, limit=limit
+        )
+    uids = set(item.uid for item in objs)
+    return [item for item in pending if item.uid not in uids]
 
 
 def clean_git(repo, obj_repotype, obj_uid):
@@ -312,54 +531,12 @@ def _clean_git(repo, obj_repotype, obj_uid):
     """Update the given issue remove it from its git."""
     _log.info("Update the git repo: %s to remove: %s", repo.path, obj_uid)
 
-    with TemporaryClone(repo, obj_repotype, "clean_git") as tempclone:
-        if tempclone is None:
-            # This repo is not tracked on disk
-            return
-
-        newpath = tempclone.repopath
-        new_repo = tempclone.repo
-
-        file_path = os.path.join(newpath, obj_uid)
-
-        # Get the current index
-        index = new_repo.index
-
-        # Are we adding files
-        if not os.path.exists(file_path):
-            return
-
-        # Remove the file
-        os.unlink(file_path)
-
-        # Add the changes to the index
-        index.remove(obj_uid)
-
-        # See if there is a parent to this commit
-        parent = None
-        if not new_repo.is_empty:
-            parent = new_repo.head.peel().oid
-
-        parents = []
-        if parent:
-            parents.append(parent)
-
-        # Author/commiter will always be this one
-        author = _make_signature(name="pagure", email="pagure")
-
-        # Actually commit
-        new_repo.create_commit(
-            "refs/heads/master",
-            author,
-            author,
-            "Removed object %s: %s" % (obj_repotype, obj_uid),
-            new_repo.index.write_tree(),
-            parents,
-        )
-        index.write()
-
-        master_ref = new_repo.lookup_reference("HEAD").resolve().name
-        tempclone.push("pagure", master_ref, internal="yes")
+    _commit_metadata(
+        repo,
+        obj_repotype,
+        {obj_uid: None},
+        "Removed object %s: %s" % (obj_repotype, obj_uid),
+    )
 
 
 def get_user_from_json(session, jsondata, key="user"):
@@ -965,12 +1142,79 @@ def _add_file_to_git(repo, issue, attachmentfolder, user, filename):
     return os.path.join("files", filename)
 
 
+def _evict_pooled_clones():
+    """Remove the clones from the pool of clones that were used the least
+    recently until the pool is within the number of clones and disk space
+    allowed (see the ``CLONE_POOL_MAX_CLONES`` and ``CLONE_POOL_MAX_SIZE``
+    configuration keys). Clones in use are never removed.
+    """
+    pooldir = pagure_config.get("CLONE_POOL_FOLDER")
+    if not pooldir or not os.path.exists(pooldir):
+        return
+
+    entries = []
+    for name in os.listdir(pooldir):
+        entry = os.path.join(pooldir, name)
+        if not os.path.isdir(entry):
+            continue
+        size = _read_pooled_clone_size(entry)[0]
+        entries.append((os.stat(entry).st_mtime, entry, size))
+    entries.sort()
+
+    max_clones = pagure_config.get("CLONE_POOL_MAX_CLONES", 20)
+    max_size = pagure_config.get("CLONE_POOL_MAX_SIZE", 10 * 1024**3)
+    total = sum(entry[2] for entry in entries)
+    count = len(entries)
+    for _, entry, size in entries:
+        if count <= max_clones and total <= max_size:
+            break
+        with open(entry + ".lock", "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (IOError, OSError):
+                # In use, keep it
+                continue
+            _log.info("Removing %s from the pool of clones", entry)
+            shutil.rmtree(entry, ignore_errors=True)
+            for extension in (".size", ".config"):
+                if os.path.exists(entry + extension):
+                    os.unlink(entry + extension)
+        count -= 1
+        total -= size
+
+
+def _get_disk_usage(path):
+    """Return the size, in bytes, of the files in the specified folder."""
+    size = 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            try:
+                size += os.lstat(os.path.join(root, filename)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def _read_pooled_clone_size(entry):
+    """Return the total size of the specified clone of the pool and the size
+    of its files outside of the git objects, as recorded when it was last
+    released, or zeros if they were not recorded.
+    """
+    if not os.path.exists(entry + ".size"):
+        return 0, 0
+    with open(entry + ".size") as stream:
+        sizes = [int(size) for size in stream.read().split()]
+    return tuple((sizes + [0, 0])[:2])
+
+
 class TemporaryClone(object):
     _project = None
     _action = None
     _repotype = None
     _origpath = None
     _origrepopath = None
+    _pool_lock = None
+    _pool_new = False
     repopath = None
     repo = None
 
@@ -1001,11 +1245,6 @@ class TemporaryClone(object):
 
     def __enter__(self):
         """Enter the context manager, creating the clone."""
-        self.repopath = tempfile.mkdtemp(prefix="pagure-%s-" % self._action)
-        self._origrepopath = self.repopath
-        if self._parent:
-            self.repopath = os.path.join(self.repopath, self._parent)
-            os.makedirs(self.repopath)
         # This is the simple case. Just do a local clone
         # use either the specified path or the use the path of the
         # specified project
@@ -1016,12 +1255,22 @@ class TemporaryClone(object):
             return None
         if not os.path.exists(self._origpath):
             return None
+        self._origrepo = pygit2.Repository(self._origpath)
+
+        if self._acquire_pooled_clone():
+            self.repo = pygit2.Repository(self.repopath)
+            return self
+
+        self.repopath = tempfile.mkdtemp(prefix="pagure-%s-" % self._action)
+        self._origrepopath = self.repopath
+        if self._parent:
+            self.repopath = os.path.join(self.repopath, self._parent)
+            os.makedirs(self.repopath)
         PagureRepo.clone(self._origpath, self.repopath)
         # Because for whatever reason, one pygit2.Repository is not
         # equal to another.... The pygit2.Repository returned from
         # pygit2.clone_repository does not have the "branches" attribute.
         self.repo = pygit2.Repository(self.repopath)
-        self._origrepo = pygit2.Repository(self._origpath)
 
         # Make sure that all remote refs are mapped to local ones.
         headname = None
@@ -1044,8 +1293,163 @@ class TemporaryClone(object):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        """Exit the context manager, removing the temorary clone."""
-        shutil.rmtree(self.repopath)
+        """Exit the context manager, removing the temorary clone or giving
+        it back to the pool."""
+        if self._pool_lock is not None:
+            self._release_pooled_clone()
+        elif self._origrepopath:
+            shutil.rmtree(self._origrepopath)
+
+    def _acquire_pooled_clone(self):
+        """Reuse, or create, the clone of the repo kept in the pool of
+        clones (see the ``CLONE_POOL_FOLDER`` configuration key).
+
+        The clone of a repo can only be used by one TemporaryClone at a
+        time, if it is already in use the caller is expected to fall back
+        to a fresh clone.
+
+        Returns:
+            bool: Whether a clone from the pool is now in use
+
+        """
+        pooldir = pagure_config.get("CLONE_POOL_FOLDER")
+        if not pooldir:
+            return False
+        if not os.path.exists(pooldir):
+            os.makedirs(pooldir)
+
+        key = "%s:%s" % (os.path.realpath(self._origpath), self._parent or "")
+        entry = os.path.join(
+            pooldir, hashlib.sha1(key.encode("utf-8")).hexdigest()
+        )
+        lock = open(entry + ".lock", "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            _log.debug("Clone %s of %s in use", entry, self._origpath)
+            lock.close()
+            return False
+
+        repopath = entry
+        if self._parent:
+            repopath = os.path.join(entry, self._parent)
+        self._pool_new = not (
+            os.path.exists(os.path.join(repopath, ".git"))
+            and os.path.exists(entry + ".config")
+        )
+        try:
+            if self._pool_new:
+                if os.path.exists(entry):
+                    shutil.rmtree(entry)
+                os.makedirs(repopath)
+                PagureRepo.clone(self._origpath, repopath)
+                # Keep the configuration of the fresh clone to restore it
+                shutil.copyfile(
+                    os.path.join(repopath, ".git", "config"), entry + ".config"
+                )
+            self._reset_pooled_clone(entry, repopath)
+        except Exception:
+            _log.exception("Could not reuse the clone %s", entry)
+            shutil.rmtree(entry, ignore_errors=True)
+            lock.close()
+            return False
+
+        self._pool_lock = lock
+        self._origrepopath = entry
+        self.repopath = repopath
+        return True
+
+    def _reset_pooled_clone(self, entry, repopath):
+        """Bring the specified clone from the pool back to the state of a
+        fresh clone of the repo: fetching what changed in the repo, mapping
+        all its branches and PR heads to local refs and dropping whatever
+        the previous user of the clone left behind, including its refs and
+        its git configuration.
+
+        Args:
+            entry (string): The path to the entry of the pool
+            repopath (string): The path to the clone to reset, in the entry
+
+        """
+
+        def _git(*args):
+            subprocess.check_output(
+                ["git"] + list(args), cwd=repopath, stderr=subprocess.STDOUT
+            )
+
+        repo = pygit2.Repository(repopath)
+        for remote in list(repo.remotes):
+            if remote.name != "origin":
+                repo.remotes.delete(remote.name)
+        shutil.copyfile(
+            entry + ".config", os.path.join(repopath, ".git", "config")
+        )
+        repo = pygit2.Repository(repopath)
+        repo.remotes.set_url("origin", self._origpath)
+        repo.remotes.set_push_url("origin", self._origpath)
+        for refname in repo.listall_references():
+            if not refname.startswith(
+                (
+                    "refs/heads/",
+                    "refs/remotes/origin/",
+                    "refs/pull/",
+                    "refs/tags/",
+                )
+            ):
+                repo.references.delete(refname)
+
+        for state in ("rebase-merge", "rebase-apply"):
+            shutil.rmtree(os.path.join(repopath, ".git", state), True)
+        if not repo.head_is_unborn:
+            _git("reset", "--quiet", "--hard")
+            _git("checkout", "--quiet", "--detach")
+        _git("clean", "-ffdxq")
+        _git(
+            "fetch",
+            "--quiet",
+            "--prune",
+            "--force",
+            "origin",
+            "+refs/heads/*:refs/remotes/origin/*",
+            "+refs/pull/*:refs/pull/*",
+            "+refs/tags/*:refs/tags/*",
+        )
+
+        repo = pygit2.Repository(repopath)
+        heads = {}
+        for branchname in self._origrepo.listall_branches():
+            heads[branchname] = self._origrepo.lookup_branch(branchname).peel()
+        for branchname in list(repo.branches.local):
+            if branchname not in heads:
+                repo.branches.local.delete(branchname)
+        for branchname, commit in heads.items():
+            repo.branches.local.create(branchname, repo[commit.oid], True)
+
+        if self._origrepo.head_is_unborn:
+            refname = self._origrepo.lookup_reference("HEAD").target
+            repo.references.create("HEAD", refname, force=True)
+        else:
+            refname = self._origrepo.head.name
+            repo.checkout(refname, strategy=pygit2.GIT_CHECKOUT_FORCE)
+
+    def _release_pooled_clone(self):
+        """Give the clone in use back to the pool, evicting the clones
+        used the least recently if the pool grew over its limits."""
+        entry = self._origrepopath
+        # Only the git objects grow as the clone is reused, the size of
+        # the other files is measured once, when the clone is created
+        objects_size = _get_disk_usage(
+            os.path.join(self.repopath, ".git", "objects")
+        )
+        other_size = _read_pooled_clone_size(entry)[1]
+        if self._pool_new or not other_size:
+            other_size = _get_disk_usage(entry) - objects_size
+        with open(entry + ".size", "w") as stream:
+            stream.write("%s %s" % (objects_size + other_size, other_size))
+        os.utime(entry, None)
+        self._pool_lock.close()
+        self._pool_lock = None
+        _evict_pooled_clones()
 
     def change_project_association(self, new_project):
         """Make this instance "belong" to another project.
@@ -1367,28 +1771,51 @@ def get_default_branch(abspath):
         return "master"
 
 
+def get_commits_info(commits, abspath):
+    """Return the name and email of the author and the subject of all the
+    specified commits, reading them from the git repo in one pass instead
+    of running git for each of them.
+
+    :arg commits: the identifiers of the commits (or of objects pointing to
+        them, such as annotated tags) to return the information of
+    :type commits: list
+    :arg abspath: the path to the git repo
+    :type abspath: str
+    :return: a dict associating each of the commits specified to a dict
+        with the keys: ``author``, ``email`` and ``subject``
+    :rtype: dict
+
+    """
+    repo_obj = pygit2.Repository(abspath)
+    output = {}
+    for commit in commits:
+        if commit in output:
+            continue
+        commit_obj = repo_obj.revparse_single(commit).peel(pygit2.Commit)
+        encoding = commit_obj.message_encoding or "utf-8"
+        # Same as git's %s: the first paragraph of the message on one line
+        subject = commit_obj.message.strip().split("\n\n")[0]
+        output[commit] = {
+            "author": commit_obj.author.raw_name.decode(encoding, "replace"),
+            "email": commit_obj.author.raw_email.decode(encoding, "replace"),
+            "subject": " ".join(subject.split("\n")).strip(),
+        }
+    return output
+
+
 def get_author(commit, abspath):
     """Return the name of the person that authored the commit."""
-    user = pagure.lib.git.read_git_lines(
-        ["log", "-1", '--pretty=format:"%an"', commit], abspath
-    )[0].replace('"', "")
-    return user
+    return get_commits_info([commit], abspath)[commit]["author"]
 
 
 def get_author_email(commit, abspath):
     """Return the email of the person that authored the commit."""
-    user = pagure.lib.git.read_git_lines(
-        ["log", "-1", '--pretty=format:"%ae"', commit], abspath
-    )[0].replace('"', "")
-    return user
+    return get_commits_info([commit], abspath)[commit]["email"]
 
 
 def get_commit_subject(commit, abspath):
     """Return the subject of the commit."""
-    subject = pagure.lib.git.read_git_lines(
-        ["log", "-1", '--pretty=format:"%s"', commit], abspath
-    )[0].replace('"', "")
-    return subject
+    return get_commits_info([commit], abspath)[commit]["subject"]
 
 
 def get_changed_files(torev, fromrev, abspath):
@@ -2006,6 +2433,225 @@ def rebase_pull_request(session, request, username):
     return "Pull-request rebased"
 
 
+# Name of the file, in the git repos, caching what is computed out of them
+REPO_CACHE_FILE = "pagure_cache"
+
+
+def read_repo_cache(repo_obj, section, key):
+    """Return the value stored under the specified key in the given section
+    of the cache kept in the specified git repo, or None if there is
+    nothing cached for this key.
+
+    This cache is a gdbm file stored next to the git objects, it is only an
+    optimization, so any error accessing it is logged and otherwise
+    ignored.
+
+    :arg repo_obj: the pygit2.Repository object of the git repo
+    :arg section: the section of the cache, for example ``diff``
+    :type section: str
+    :arg key: the key to look for in the section
+    :type key: str
+    :return: the value, as stored by ``write_repo_cache``, or None
+    :rtype: object or None
+
+    """
+    cache_file = os.path.join(repo_obj.path, REPO_CACHE_FILE)
+    if not os.path.exists(cache_file):
+        return None
+
+    cf = None
+    try:
+        cf = dbm_gnu.open(cache_file, "r")
+        value = cf.get("%s:%s" % (section, key))
+    except dbm_gnu.error as err:
+        # The file is locked by a writer
+        _log.debug("Could not read the cache %s: %s", cache_file, err)
+        return None
+    finally:
+        if cf:
+            cf.close()
+
+    if value is None:
+        return None
+    return json.loads(value)
+
+
+def write_repo_cache(repo_obj, section, key, value, outdated=None):
+    """Store the specified value under the specified key in the given
+    section of the cache kept in the specified git repo.
+
+    Once the cache holds more than ``REPO_CACHE_MAX_ENTRIES`` entries, the
+    outdated entries of the section are removed and, if that is not
+    enough, all the other entries of the section.
+
+    :arg repo_obj: the pygit2.Repository object of the git repo
+    :arg section: the section of the cache, for example ``diff``
+    :type section: str
+    :arg key: the key to store the value under
+    :type key: str
+    :arg value: the value to store, it must be serializable in JSON
+    :kwarg outdated: a function returning, out of a list of keys of the
+        section, the ones which are no longer needed
+    :type outdated: callable or None
+
+    """
+    cache_file = os.path.join(repo_obj.path, REPO_CACHE_FILE)
+    cf = None
+    try:
+        cf = dbm_gnu.open(cache_file, "c")
+        cf["%s:%s" % (section, key)] = json.dumps(value)
+        if len(cf) > pagure_config.get("REPO_CACHE_MAX_ENTRIES", 1000):
+            _prune_repo_cache(cf, section, key, outdated)
+    except dbm_gnu.error as err:
+        _log.debug("Could not write to the cache %s: %s", cache_file, err)
+    finally:
+        if cf:
+            cf.close()
+
+
+def _prune_repo_cache(cf, section, key, outdated):
+    """Remove from the given opened cache the entries of the specified
+    section which are outdated, or all of them but the specified key if
+    the cache is still too large.
+    """
+    prefix = "%s:" % section
+    keys = []
+    for cache_key in cf.keys():
+        cache_key = cache_key.decode("utf-8")
+        if cache_key.startswith(prefix) and cache_key != prefix + key:
+            keys.append(cache_key[len(prefix) :])
+
+    removed = outdated(keys) if outdated else []
+    if len(cf) - len(removed) > pagure_config.get(
+        "REPO_CACHE_MAX_ENTRIES", 1000
+    ):
+        removed = keys
+    # gdbm reuses the space of the removed entries for the new ones
+    for cache_key in removed:
+        del cf[prefix + cache_key]
+
+
+def _get_diff_commits(repo_obj, orig_repo, repo_commit, orig_commit):
+    """Return the list of commits (most recent first) that are reachable
+    from repo_commit but not from orig_commit.
+
+    The commits are found by walking from repo_commit while hiding
+    orig_commit, stopping at their merge base, so the cost is proportional
+    to the number of commits in the pull-request rather than to the size
+    of the history. The result is cached in the target git repo.
+
+    :arg repo_obj: The pygit2.Repository object of the first git repo
+    :arg orig_repo:  The pygit2.Repository object of the second git repo
+    :arg repo_commit: the pygit2.Commit at the head of the branch having
+        the changes, in the first git repo
+    :arg orig_commit: the pygit2.Commit at the head of the branch in which
+        we want to merge the changes, or None if there is no such branch
+
+    """
+    if orig_commit is None:
+        return list(repo_obj.walk(repo_commit.oid.hex, pygit2.GIT_SORT_NONE))
+
+    commit_stop = repo_commit.oid.hex
+    target_head = orig_commit.oid.hex
+
+    # Commit identifiers are immutable, so an entry never needs to be
+    # invalidated: if either branch moves, the key changes.
+    cache_key = "%s..%s" % (target_head, commit_stop)
+    cached = read_repo_cache(orig_repo, "diff", cache_key)
+    if cached is not None:
+        _log.debug("Diff commits found in cache")
+        return [repo_obj[commitid] for commitid in cached]
+
+    # Both commits need to be in the same repo to compute their ancestry,
+    # if that's not the case, we will walk both histories side by side
+    walk_repo = None
+    for candidate in (repo_obj, orig_repo):
+        if commit_stop in candidate and target_head in candidate:
+            walk_repo = candidate
+            break
+
+    if walk_repo is None:
+        return _walk_diff_commits(
+            repo_obj, orig_repo, repo_commit, orig_commit
+        )
+
+    walker = walk_repo.walk(commit_stop, pygit2.GIT_SORT_NONE)
+    walker.hide(target_head)
+    commits = [commit.oid.hex for commit in walker]
+
+    write_repo_cache(
+        orig_repo,
+        "diff",
+        cache_key,
+        commits,
+        outdated=functools.partial(_outdated_diff_keys, orig_repo),
+    )
+
+    return [repo_obj[commitid] for commitid in commits]
+
+
+def _outdated_diff_keys(orig_repo, keys):
+    """Return, out of the given keys of the cached diff commits, the ones
+    computed against a commit which is no longer the head of a branch of
+    the target git repo.
+    """
+    heads = set(
+        orig_repo.lookup_branch(branchname).peel().hex
+        for branchname in orig_repo.listall_branches()
+    )
+    return [key for key in keys if key.split("..", 1)[0] not in heads]
+
+
+def _walk_diff_commits(repo_obj, orig_repo, repo_commit, orig_commit):
+    """Return the list of commits (most recent first) that are reachable
+    from repo_commit but not from orig_commit by walking the history of
+    the two git repos side by side until they meet.
+
+    This is only used when the two commits cannot be found in the same
+    git repo.
+
+    """
+    main_walker = orig_repo.walk(orig_commit.oid.hex, pygit2.GIT_SORT_NONE)
+    branch_walker = repo_obj.walk(repo_commit.oid.hex, pygit2.GIT_SORT_NONE)
+
+    diff_commits = []
+    main_commits = set()
+    branch_commits = set()
+
+    while 1:
+        try:
+            com = next(main_walker)
+            main_commits.add(com.oid.hex)
+        except StopIteration:
+            com = None
+
+        try:
+            branch_commit = next(branch_walker)
+        except StopIteration:
+            branch_commit = None
+
+        # We sure never end up here but better safe than sorry
+        if com is None and branch_commit is None:
+            break
+
+        if branch_commit:
+            branch_commits.add(branch_commit.oid.hex)
+            diff_commits.append(branch_commit)
+        if main_commits.intersection(branch_commits):
+            break
+
+    # If master is ahead of branch, we need to remove the commits
+    # that are after the first one found in master
+    i = 0
+    if diff_commits and main_commits:
+        for i in range(len(diff_commits)):
+            if diff_commits[i].oid.hex in main_commits:
+                break
+        diff_commits = diff_commits[:i]
+
+    return diff_commits
+
+
 def get_diff_info(repo_obj, orig_repo, branch_from, branch_to, prid=None):
     """Return the info needed to see a diff or make a Pull-Request between
     the two specified repo.
@@ -2077,51 +2723,12 @@ def get_diff_info(repo_obj, orig_repo, branch_from, branch_to, prid=None):
         )
         if branch:
             orig_commit = orig_repo[branch.peel().hex]
-            main_walker = orig_repo.walk(
-                orig_commit.oid.hex, pygit2.GIT_SORT_NONE
-            )
 
         repo_commit = repo_obj[commitid]
-        branch_walker = repo_obj.walk(
-            repo_commit.oid.hex, pygit2.GIT_SORT_NONE
+        diff_commits = _get_diff_commits(
+            repo_obj, orig_repo, repo_commit, orig_commit
         )
 
-        main_commits = set()
-        branch_commits = set()
-
-        while 1:
-            com = None
-            if branch:
-                try:
-                    com = next(main_walker)
-                    main_commits.add(com.oid.hex)
-                except StopIteration:
-                    com = None
-
-            try:
-                branch_commit = next(branch_walker)
-            except StopIteration:
-                branch_commit = None
-
-            # We sure never end up here but better safe than sorry
-            if com is None and branch_commit is None:
-                break
-
-            if branch_commit:
-                branch_commits.add(branch_commit.oid.hex)
-                diff_commits.append(branch_commit)
-            if main_commits.intersection(branch_commits):
-                break
-
-        # If master is ahead of branch, we need to remove the commits
-        # that are after the first one found in master
-        i = 0
-        if diff_commits and main_commits:
-            for i in range(len(diff_commits)):
-                if diff_commits[i].oid.hex in main_commits:
-                    break
-            diff_commits = diff_commits[:i]
-
         _log.debug("Diff commits: %s", diff_commits)
         if diff_commits:
             first_commit = repo_obj[diff_commits[-1].oid.hex]
@@ -2450,34 +3057,64 @@ def get_git_tags_objects(project):
 
 
 def log_commits_to_db(session, project, commits, gitdir):
-    """Log the given commits to the DB."""
+    """Log the given commits to the DB.
+
+    The authors of the commits are resolved in a single query and the
+    logs are inserted in bulk. Commits already logged for this project
+    are skipped, so pushing the same commits again does not duplicate
+    them.
+    """
     repo_obj = PagureRepo(gitdir)
 
+    commit_objs = []
+    seen = set()
     for commitid in commits:
         try:
             commit = repo_obj[commitid]
         except ValueError:
             continue
+        if commit.oid.hex not in seen:
+            seen.add(commit.oid.hex)
+            commit_objs.append(commit)
 
-        try:
-            author_obj = pagure.lib.query.get_user(
-                session, commit.author.email
-            )
-        except pagure.exceptions.PagureException:
-            author_obj = None
+    if not commit_objs:
+        return
 
-        date_created = arrow.get(commit.commit_time)
+    logged = set()
+    hexes = sorted(seen)
+    for idx in range(0, len(hexes), 500):
+        query = session.query(model.PagureLog.ref_id).filter(
+            model.PagureLog.project_id == project.id,
+            model.PagureLog.log_type == "committed",
+            model.PagureLog.ref_id.in_(hexes[idx : idx + 500]),
+        )
+        logged.update(row.ref_id for row in query)
+
+    commit_objs = [
+        commit for commit in commit_objs if commit.oid.hex not in logged
+    ]
+    users = pagure.lib.query.get_users_by_email(
+        session, [commit.author.email for commit in commit_objs]
+    )
 
-        log = model.PagureLog(
-            user_id=author_obj.id if author_obj else None,
-            user_email=commit.author.email if not author_obj else None,
-            project_id=project.id,
-            log_type="committed",
-            ref_id=commit.oid.hex,
-            date=date_created.date(),
-            date_created=date_created.datetime,
+    logs = []
+    for commit in commit_objs:
+        author_obj = users.get(commit.author.email)
+        date_created = arrow.get(commit.commit_time)
+        logs.append(
+            {
+                "user_id": author_obj.id if author_obj else None,
+                "user_email": commit.author.email if not author_obj else None,
+                "project_id": project.id,
+                "log_type": "committed",
+                "ref_id": commit.oid.hex,
+                "date": date_created.date(),
+                "date_created": date_created.datetime,
+            }
         )
-        session.add(log)
+
+    if logs:
+        session.bulk_insert_mappings(model.PagureLog, logs)
 
 
 def reinit_git(project, repofolder):
@@ -2536,6 +3173,47 @@ def get_default_git_branches(project):
     return branchname, commit.oid.hex
 
 
+def get_branches_of_commit(repo_obj, commit_id):
+    """Return the list of branches containing the specified commit that
+    the default branch does not contain.
+
+    A branch contains the commit if the commit is its head or one of its
+    ancestors, which is checked with ``descendant_of`` instead of walking
+    the history of each branch.
+
+    :arg repo_obj: the pygit2.Repository object of the git repo
+    :arg commit_id: the full identifier of the commit to look for
+    :type commit_id: str
+    :return: the list of the names of the branches containing the commit
+    :rtype: list
+
+    """
+    commit = repo_obj.get(commit_id)
+    if not isinstance(commit, pygit2.Commit):
+        return []
+    commit_id = commit.oid.hex
+
+    heads = {}
+    for branchname in repo_obj.listall_branches():
+        heads[branchname] = repo_obj.lookup_branch(branchname).peel().hex
+
+    default_head = None
+    if not repo_obj.head_is_unborn:
+        default_head = heads.get(repo_obj.head.shorthand)
+
+    def _contains(head):
+        return head == commit_id or repo_obj.descendant_of(head, commit_id)
+
+    if len(heads) < 2 or (default_head and _contains(default_head)):
+        return []
+
+    return [
+        branchname
+        for branchname in sorted(heads)
+        if heads[branchname] != default_head and _contains(heads[branchname])
+    ]
+
+
 def new_git_branch(
     username, project, branch, from_branch=None, from_commit=None
 ):
@@ -21,6 +21,7 @@ import pkg_resources
 import werkzeug.utils
 from six import with_metaclass
 from six.moves import dbm_gnu
+from sqlalchemy.orm import selectinload
 
 import pagure.exceptions
 import pagure.lib.model_base
@@ -194,6 +195,10 @@ def _read_file(filename):
 class Gitolite2Auth(GitAuthHelper):
     """A gitolite 2 authentication module."""
 
+    # Number of projects loaded at once when refreshing the configuration
+    # for all the projects
+    _full_refresh_batch_size = 1000
+
     @classmethod
     def _process_project(cls, project, config, global_pr_only):
         """Generate the gitolite configuration for the specified project.
@@ -279,7 +284,50 @@ class Gitolite2Auth(GitAuthHelper):
         return config
 
     @classmethod
-    def _clean_current_config(cls, current_config, project):
+    def _index_config(cls, config):
+        """Index the position of the repo blocks and of the groups in the
+        specified configuration, in a single pass over it.
+
+        :arg config: the content of the current/actual gitolite
+            configuration file read from the disk
+        :type config: list
+        :return: a dictionary associating to the ``repo <name>`` line of
+            each block the indexes of its first line and of the empty line
+            closing it, and to each ``@<group>`` the index of its line
+        :return type: dict
+
+        """
+        index = {}
+        start = None
+        for idx, line in enumerate(config):
+            if start is not None and (line == "" or line.startswith("repo ")):
+                index[config[start]] = (start, idx)
+                start = None
+
+            if line.startswith("repo "):
+                start = idx
+            elif line.startswith("@"):
+                index[line.split(" ", 1)[0]] = idx
+
+        if start is not None:
+            index[config[start]] = (start, len(config))
+
+        return index
+
+    @classmethod
+    def _get_project_blocks(cls, index, project):
+        """Return the sorted list of the (start, end) indexes of the repo
+        blocks of the specified project found in the index of the
+        configuration.
+        """
+        keys = [
+            "repo %s%s" % (repos, project.fullname)
+            for repos in ["", "docs/", "tickets/", "requests/"]
+        ]
+        return sorted(index[key] for key in keys if key in index)
+
+    @classmethod
+    def _clean_current_config(cls, current_config, project, index=None):
         """Remove the specified project from the current configuration file
 
         :arg current_config: the content of the current/actual gitolite
@@ -287,27 +335,52 @@ class Gitolite2Auth(GitAuthHelper):
         :type current_config: list
         :arg project: the project to update in the configuration file
         :type project: pagure.lib.model.Project
+        :kwarg index: the index of the current configuration as returned
+            by ``_index_config``, computed if not provided
+        :type index: None or dict
 
         """
-        keys = [
-            "repo %s%s" % (repos, project.fullname)
-            for repos in ["", "docs/", "tickets/", "requests/"]
-        ]
+        return cls._replace_project_config(
+            current_config, project, [], index=index
+        )
 
-        keep = True
-        config = []
-        for line in current_config:
-            line = line.rstrip()
+    @classmethod
+    def _replace_project_config(
+        cls, current_config, project, project_config, index=None
+    ):
+        """Replace the configuration of the specified project in the
+        current configuration file, keeping its position in the file.
+        If the project is not in the current configuration, its
+        configuration is added at the end.
+
+        :arg current_config: the content of the current/actual gitolite
+            configuration file read from the disk
+        :type current_config: list
+        :arg project: the project to update in the configuration file
+        :type project: pagure.lib.model.Project
+        :arg project_config: the new configuration of the project as
+            generated by ``_process_project``
+        :type project_config: list
+        :kwarg index: the index of the current configuration as returned
+            by ``_index_config``, computed if not provided
+        :type index: None or dict
+        :return: the updated config
+        :return type: list
 
-            if line in keys:
-                keep = False
-                continue
+        """
+        if index is None:
+            index = cls._index_config(current_config)
 
-            if keep is False and line == "":
-                keep = True
+        blocks = cls._get_project_blocks(index, project)
+        if not blocks:
+            return current_config + project_config
 
-            if keep:
-                config.append(line)
+        config = current_config[: blocks[0][0]] + project_config
+        for idx, (start, end) in enumerate(blocks):
+            if idx + 1 < len(blocks):
+                config.extend(current_config[end : blocks[idx + 1][0]])
+            else:
+                config.extend(current_config[end:])
 
         return config
 
@@ -367,8 +440,10 @@ class Gitolite2Auth(GitAuthHelper):
         :return type: list
 
         """
-        query = session.query(model.PagureGroup).order_by(
-            model.PagureGroup.group_name
+        query = (
+            session.query(model.PagureGroup)
+            .options(selectinload(model.PagureGroup.users))
+            .order_by(model.PagureGroup.group_name)
         )
 
         groups = {}
@@ -486,8 +561,21 @@ class Gitolite2Auth(GitAuthHelper):
 
         if project == -1 or not os.path.exists(configfile):
             _log.info("Refreshing the configuration for all projects")
-            query = session.query(model.Project).order_by(model.Project.id)
-            for project in query.all():
+            # Load the projects by batches with everything needed to
+            # generate their configuration, instead of lazy-loading their
+            # owner, committers, groups and deploy keys one project at a time
+            query = (
+                session.query(model.Project)
+                .options(
+                    selectinload(model.Project.user),
+                    selectinload(model.Project.committers),
+                    selectinload(model.Project.committer_groups),
+                    selectinload(model.Project.deploykeys),
+                )
+                .order_by(model.Project.id)
+                .yield_per(cls._full_refresh_batch_size)
+            )
+            for project in query:
                 config = cls._process_project(project, config, global_pr_only)
         elif project:
             _log.info("Refreshing the configuration for one project")
@@ -497,9 +585,9 @@ class Gitolite2Auth(GitAuthHelper):
                 configfile, preconfig, postconfig
             )
 
-            current_config = cls._clean_current_config(current_config, project)
-
-            config = current_config + config
+            config = cls._replace_project_config(
+                current_config, project, config
+            )
 
         if config:
             _log.info("Cleaning the group %s from the loaded config", group)
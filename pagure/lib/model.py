@@ -11,6 +11,7 @@
 from __future__ import absolute_import, unicode_literals
 
 import collections
+import copy
 import datetime
 import json
 import logging
@@ -594,10 +595,31 @@ class Project(BASE):
         """Return the list of tags in a simple text form."""
         return [tag.tag for tag in self.tags]
 
-    @property
-    def settings(self):
-        """Return the dict stored as string in the database as an actual
-        dict object.
+    def _get_json(self, name, parse):
+        """Return the value of the JSON stored in the ``_<name>`` column as
+        returned by the given parse function.
+
+        The JSON is only parsed again when the column changed since the
+        last time, so the accessors below can be used many times in a
+        request without paying for it. The value returned is shared, the
+        accessors return copies of it.
+        """
+        raw = getattr(self, "_%s" % name)
+        cache = self.__dict__.setdefault("_json_cache", {})
+        cached = cache.get(name)
+        if cached is None or cached[0] != raw:
+            cached = cache[name] = (raw, parse(raw))
+        return cached[1]
+
+    def _set_json(self, name, value):
+        """Store the given value as JSON in the ``_<name>`` column."""
+        setattr(self, "_%s" % name, json.dumps(value))
+        self.__dict__.get("_json_cache", {}).pop(name, None)
+
+    @staticmethod
+    def _parse_settings(raw):
+        """Return the settings stored in the given JSON, merged with the
+        default settings.
         """
         default = {
             "issue_tracker": True,
@@ -620,8 +642,8 @@ class Project(BASE):
             "open_metadata_access_to_all": False,
         }
 
-        if self._settings:
-            current = json.loads(self._settings)
+        if raw:
+            current = json.loads(raw)
             # Update the current dict with the new keys
             for key in default:
                 if key not in current:
@@ -638,19 +660,14 @@ class Project(BASE):
         else:
             return default
 
-    @settings.setter
-    def settings(self, settings):
-        """Ensures the settings are properly saved."""
-        self._settings = json.dumps(settings)
-
-    @property
-    def milestones(self):
-        """Return the dict stored as string in the database as an actual
-        dict object.
+    @staticmethod
+    def _parse_milestones(raw):
+        """Return the milestones stored in the given JSON, each of them as
+        a dict.
         """
         milestones = {}
 
-        if self._milestones:
+        if raw:
 
             def _convert_to_dict(value):
                 if isinstance(value, dict):
@@ -659,135 +676,134 @@ class Project(BASE):
                     return {"date": value, "active": True}
 
             milestones = dict(
-                [
-                    (k, _convert_to_dict(v))
-                    for k, v in json.loads(self._milestones).items()
-                ]
+                [(k, _convert_to_dict(v)) for k, v in json.loads(raw).items()]
             )
 
         return milestones
 
+    @staticmethod
+    def _parse_json(default):
+        """Return a function parsing a JSON, returning the given default
+        if there is none.
+        """
+
+        def _parse(raw):
+            if raw:
+                return json.loads(raw)
+            return type(default)(default)
+
+        return _parse
+
+    @property
+    def settings(self):
+        """Return the dict stored as string in the database as an actual
+        dict object.
+        """
+        return dict(self._get_json("settings", self._parse_settings))
+
+    @settings.setter
+    def settings(self, settings):
+        """Ensures the settings are properly saved."""
+        self._set_json("settings", settings)
+
+    @property
+    def milestones(self):
+        """Return the dict stored as string in the database as an actual
+        dict object.
+        """
+        milestones = self._get_json("milestones", self._parse_milestones)
+        return dict((k, dict(v)) for k, v in milestones.items())
+
     @milestones.setter
     def milestones(self, milestones):
         """Ensures the milestones are properly saved."""
-        self._milestones = json.dumps(milestones)
+        self._set_json("milestones", milestones)
 
     @property
     def milestones_keys(self):
         """Return the list of milestones so we can keep the order consistent."""
-        milestones_keys = {}
-
-        if self._milestones_keys:
-            milestones_keys = json.loads(self._milestones_keys)
-
-        return milestones_keys
+        return copy.copy(
+            self._get_json("milestones_keys", self._parse_json({}))
+        )
 
     @milestones_keys.setter
     def milestones_keys(self, milestones_keys):
         """Ensures the milestones keys are properly saved."""
-        self._milestones_keys = json.dumps(milestones_keys)
+        self._set_json("milestones_keys", milestones_keys)
 
     @property
     def priorities(self):
         """Return the dict stored as string in the database as an actual
         dict object.
         """
-        priorities = {}
-
-        if self._priorities:
-            priorities = json.loads(self._priorities)
-
-        return priorities
+        return dict(self._get_json("priorities", self._parse_json({})))
 
     @priorities.setter
     def priorities(self, priorities):
         """Ensures the priorities are properly saved."""
-        self._priorities = json.dumps(priorities)
+        self._set_json("priorities", priorities)
 
     @property
     def block_users(self):
         """Return the dict stored as string in the database as an actual
         dict object.
         """
-        block_users = []
-
-        if self._block_users:
-            block_users = json.loads(self._block_users)
-
-        return block_users
+        return list(self._get_json("block_users", self._parse_json([])))
 
     @block_users.setter
     def block_users(self, block_users):
         """Ensures the block_users are properly saved."""
-        self._block_users = json.dumps(block_users)
+        self._set_json("block_users", block_users)
 
     @property
     def quick_replies(self):
         """Return a list of quick replies available for pull requests and
         issues.
         """
-        quick_replies = []
-
-        if self._quick_replies:
-            quick_replies = json.loads(self._quick_replies)
-
-        return quick_replies
+        return list(self._get_json("quick_replies", self._parse_json([])))
 
     @quick_replies.setter
     def quick_replies(self, quick_replies):
         """Ensures the quick replies are properly saved."""
-        self._quick_replies = json.dumps(quick_replies)
+        self._set_json("quick_replies", quick_replies)
 
     @property
     def notifications(self):
         """Return the dict stored as string in the database as an actual
         dict object.
         """
-        notifications = {}
-
-        if self._notifications:
-            notifications = json.loads(self._notifications)
-
-        return notifications
+        return copy.deepcopy(
+            self._get_json("notifications", self._parse_json({}))
+        )
 
     @notifications.setter
     def notifications(self, notifications):
         """Ensures the notifications are properly saved."""
-        self._notifications = json.dumps(notifications)
+        self._set_json("notifications", notifications)
 
     @property
     def reports(self):
         """Return the dict stored as string in the database as an actual
         dict object.
         """
-        reports = {}
-
-        if self._reports:
-            reports = json.loads(self._reports)
-
-        return reports
+        return copy.deepcopy(self._get_json("reports", self._parse_json({})))
 
     @reports.setter
     def reports(self, reports):
         """Ensures the reports are properly saved."""
-        self._reports = json.dumps(reports)
+        self._set_json("reports", reports)
 
     @property
     def close_status(self):
         """Return the dict stored as string in the database as an actual
         dict object.
         """
-        close_status = []
-
-        if self._close_status:
-            close_status = json.loads(self._close_status)
-
-        return close_status
+        return list(self._get_json("close_status", self._parse_json([])))
 
     @close_status.setter
     def close_status(self, close_status):
         """Ensures the different close status are properly saved."""
-        self._close_status = json.dumps(close_status)
+        self._set_json("close_status", close_status)
 
     @property
     def open_requests(self):
@@ -1268,6 +1284,8 @@ class Issue(BASE):
     )
     title = sa.Column(sa.Text, nullable=False)
     content = sa.Column(sa.Text(), nullable=False)
+    content_html = sa.Column(sa.Text(), nullable=True)
+    content_html_stamp = sa.Column(sa.String(64), nullable=True)
     user_id = sa.Column(
         sa.Integer,
         sa.ForeignKey("users.id", onupdate="CASCADE"),
@@ -1601,6 +1619,8 @@ class IssueComment(BASE):
         index=True,
     )
     comment = sa.Column(sa.Text(), nullable=False)
+    comment_html = sa.Column(sa.Text(), nullable=True)
+    comment_html_stamp = sa.Column(sa.String(64), nullable=True)
     parent_id = sa.Column(
         sa.Integer,
         sa.ForeignKey("issue_comments.id", onupdate="CASCADE"),
@@ -1988,6 +2008,8 @@ class PullRequest(BASE):
     commit_start = sa.Column(sa.Text(), nullable=True)
     commit_stop = sa.Column(sa.Text(), nullable=True)
     initial_comment = sa.Column(sa.Text(), nullable=True)
+    initial_comment_html = sa.Column(sa.Text(), nullable=True)
+    initial_comment_html_stamp = sa.Column(sa.String(64), nullable=True)
     user_id = sa.Column(
         sa.Integer,
         sa.ForeignKey("users.id", onupdate="CASCADE"),
@@ -2275,6 +2297,8 @@ class PullRequestComment(BASE):
     line = sa.Column(sa.Integer, nullable=True)
     tree_id = sa.Column(sa.String(40), nullable=True)
     comment = sa.Column(sa.Text(), nullable=False)
+    comment_html = sa.Column(sa.Text(), nullable=True)
+    comment_html_stamp = sa.Column(sa.String(64), nullable=True)
     parent_id = sa.Column(
         sa.Integer,
         sa.ForeignKey("pull_request_comments.id", onupdate="CASCADE"),
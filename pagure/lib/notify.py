@@ -10,6 +10,7 @@ pagure notifications.
 """
 from __future__ import absolute_import, print_function, unicode_literals
 
+import copy
 import datetime
 import hashlib
 import json
@@ -18,6 +19,7 @@ import os
 import re
 import smtplib
 import ssl
+import threading
 import time
 from email.header import Header
 from email.mime.text import MIMEText
@@ -39,6 +41,9 @@ from pagure.pfmarkdown import MENTION_RE
 
 _log = logging.getLogger(__name__)
 
+# Idle SMTP connections kept open to be reused, with when they were last used
+_SMTP_POOL = []
+_SMTP_POOL_LOCK = threading.Lock()
 
 REPLY_MSG = "To reply, visit the link below"
 if pagure_config["EVENTSOURCE_SOURCE"]:
@@ -398,6 +403,114 @@ def _fullname_to_url(fullname):
     return fullname
 
 
+def _smtp_connect():  # pragma: no cover
+    """Open a new connection to the SMTP server, using STARTTLS and
+    logging in if configured to.
+
+    :return: the connection to the SMTP server
+    :rtype: smtplib.SMTP
+
+    """
+    if pagure_config["SMTP_SSL"]:
+        smtp = smtplib.SMTP_SSL(
+            pagure_config["SMTP_SERVER"], pagure_config["SMTP_PORT"]
+        )
+    else:
+        smtp = smtplib.SMTP(
+            pagure_config["SMTP_SERVER"], pagure_config["SMTP_PORT"]
+        )
+
+    if pagure_config.get("SMTP_STARTTLS"):
+        context = ssl.create_default_context()
+        keyfile = pagure_config.get("SMTP_KEYFILE") or None
+        certfile = pagure_config.get("SMTP_CERTFILE") or None
+        respcode, _ = smtp.starttls(
+            keyfile=keyfile, certfile=certfile, context=context
+        )
+        if respcode != 220:
+            _log.warning(
+                "The starttls command did not return the 220 "
+                "response code expected."
+            )
+
+    if pagure_config["SMTP_USERNAME"] and pagure_config["SMTP_PASSWORD"]:
+        smtp.login(
+            pagure_config["SMTP_USERNAME"], pagure_config["SMTP_PASSWORD"]
+        )
+
+    return smtp
+
+
+def _smtp_close(smtp):  # pragma: no cover
+    """Close the specified connection to the SMTP server, ignoring the
+    errors if the server already dropped it."""
+    try:
+        smtp.quit()
+    except (smtplib.SMTPException, OSError):
+        smtp.close()
+
+
+def _smtp_acquire():  # pragma: no cover
+    """Return a connection to the SMTP server, reusing one from the pool
+    if there is one that was not left idle for too long.
+
+    :return: the connection to the SMTP server
+    :rtype: smtplib.SMTP
+
+    """
+    timeout = pagure_config.get("SMTP_POOL_IDLE_TIMEOUT", 60)
+    smtp = None
+    with _SMTP_POOL_LOCK:
+        while _SMTP_POOL and smtp is None:
+            smtp, last_used = _SMTP_POOL.pop()
+            if time.time() - last_used > timeout:
+                _smtp_close(smtp)
+                smtp = None
+    if smtp is None:
+        smtp = _smtp_connect()
+    return smtp
+
+
+def _smtp_release(smtp):  # pragma: no cover
+    """Give back the specified connection to the pool so it is reused, or
+    close it if the pool is full."""
+    with _SMTP_POOL_LOCK:
+        if len(_SMTP_POOL) < pagure_config.get("SMTP_POOL_SIZE", 2):
+            _SMTP_POOL.append((smtp, time.time()))
+            return
+    _smtp_close(smtp)
+
+
+def _smtp_send(messages):  # pragma: no cover
+    """Send all the specified messages over one connection to the SMTP
+    server.
+
+    :arg messages: a list of tuples (from, recipient, message) to send
+    :type messages: list
+
+    """
+    try:
+        smtp = _smtp_acquire()
+    except smtplib.SMTPException as err:
+        _log.exception(err)
+        return
+
+    for from_email, mailto, msg in messages:
+        try:
+            try:
+                smtp.sendmail(from_email, [mailto], msg.as_string())
+            except smtplib.SMTPServerDisconnected:
+                # The connection came from the pool and was closed by the
+                # server in the meantime, try again with a new one
+                smtp.close()
+                smtp = _smtp_connect()
+                smtp.sendmail(from_email, [mailto], msg.as_string())
+        except smtplib.SMTPException as err:
+            _log.exception(err)
+
+    _smtp_release(smtp)
+
+
 def send_email(
     text,
     subject,
@@ -411,6 +524,11 @@ def send_email(
 ):  # pragma: no cover
     """Send an email with the specified information.
 
+    The message is built once and only its recipient specific headers are
+    set for each recipient. The messages are all sent over a single
+    connection to the SMTP server, taken from a pool of connections kept
+    open across calls.
+
     :arg text: the content of the email to send
     :type text: unicode
     :arg subject: the subject of the email
@@ -443,42 +561,46 @@ def send_email(
             in_reply_to + "@%s" % pagure_config["DOMAIN_EMAIL_NOTIFICATIONS"]
         )
 
-    smtp = None
+    base_msg = MIMEText(text.encode("utf-8"), "plain", "utf-8")
+    base_msg["Subject"] = Header("[%s] %s" % (subject_tag, subject), "utf-8")
+    base_msg["From"] = from_email
+
+    if mail_id:
+        base_msg["mail-id"] = mail_id
+        base_msg["Message-Id"] = "<%s>" % mail_id
+
+    if in_reply_to:
+        base_msg["In-Reply-To"] = "<%s>" % in_reply_to
+
+    base_msg["X-Auto-Response-Suppress"] = "All"
+    base_msg["X-pagure"] = pagure_config["APP_URL"]
+    if project_name is not None:
+        base_msg["X-pagure-project"] = project_name
+        base_msg["List-ID"] = project_name
+        base_msg["List-Archive"] = _build_url(
+            pagure_config["APP_URL"], _fullname_to_url(project_name)
+        )
+    if reporter is not None:
+        base_msg["X-pagure-reporter"] = reporter
+    if assignee is not None:
+        base_msg["X-pagure-assignee"] = assignee
+
+    salt = pagure_config.get("SALT_EMAIL")
+    if salt and not isinstance(salt, bytes):
+        salt = salt.encode("utf-8")
+
+    msg = None
+    messages = []
     for mailto in to_mail.split(","):
         try:
             pagure.lib.query.allowed_emailaddress(mailto)
         except pagure.exceptions.PagureException:
             continue
-        msg = MIMEText(text.encode("utf-8"), "plain", "utf-8")
-        msg["Subject"] = Header("[%s] %s" % (subject_tag, subject), "utf-8")
-        msg["From"] = from_email
-
-        if mail_id:
-            msg["mail-id"] = mail_id
-            msg["Message-Id"] = "<%s>" % mail_id
-
-        if in_reply_to:
-            msg["In-Reply-To"] = "<%s>" % in_reply_to
-
-        msg["X-Auto-Response-Suppress"] = "All"
-        msg["X-pagure"] = pagure_config["APP_URL"]
-        if project_name is not None:
-            msg["X-pagure-project"] = project_name
-            msg["List-ID"] = project_name
-            msg["List-Archive"] = _build_url(
-                pagure_config["APP_URL"], _fullname_to_url(project_name)
-            )
-        if reporter is not None:
-            msg["X-pagure-reporter"] = reporter
-        if assignee is not None:
-            msg["X-pagure-assignee"] = assignee
+        msg = copy.deepcopy(base_msg)
 
         # Send the message via our own SMTP server, but don't include the
         # envelope header.
         msg["To"] = mailto
-        salt = pagure_config.get("SALT_EMAIL")
-        if salt and not isinstance(salt, bytes):
-            salt = salt.encode("utf-8")
 
         if mail_id and pagure_config["EVENTSOURCE_SOURCE"]:
 
@@ -511,48 +633,10 @@ def send_email(
             _log.debug(msg.as_string())
             _log.debug("*****/EMAIL******")
             continue
-        try:
-            if smtp is None:
-                if pagure_config["SMTP_SSL"]:
-                    smtp = smtplib.SMTP_SSL(
-                        pagure_config["SMTP_SERVER"],
-                        pagure_config["SMTP_PORT"],
-                    )
-                else:
-                    smtp = smtplib.SMTP(
-                        pagure_config["SMTP_SERVER"],
-                        pagure_config["SMTP_PORT"],
-                    )
-
-            if pagure_config.get("SMTP_STARTTLS"):
-                context = ssl.create_default_context()
-                keyfile = pagure_config.get("SMTP_KEYFILE") or None
-                certfile = pagure_config.get("SMTP_CERTFILE") or None
-                respcode, _ = smtp.starttls(
-                    keyfile=keyfile,
-                    certfile=certfile,
-                    context=context,
-                )
-                if respcode != 220:
-                    _log.warning(
-                        "The starttls command did not return the 220 "
-                        "response code expected."
-                    )
-
-            if (
-                pagure_config["SMTP_USERNAME"]
-                and pagure_config["SMTP_PASSWORD"]
-            ):
-                smtp.login(
-                    pagure_config["SMTP_USERNAME"],
-                    pagure_config["SMTP_PASSWORD"],
-                )
+        messages.append((from_email, mailto, msg))
 
-            smtp.sendmail(from_email, [mailto], msg.as_string())
-        except smtplib.SMTPException as err:
-            _log.exception(err)
-    if smtp:
-        smtp.quit()
+    if messages:
+        _smtp_send(messages)
     return msg
 
 
@@ -1105,13 +1189,14 @@ def notify_new_commits(abspath, project, branch, commits):
     """
     # string note: abspath, project and branch can only contain ASCII
     # by policy (pagure and/or gitolite)
+    info = pagure.lib.git.get_commits_info(commits, abspath)
     commits_info = []
     for commit in commits:
         commits_info.append(
             {
                 "commit": commit,
-                "author": pagure.lib.git.get_author(commit, abspath),
-                "subject": pagure.lib.git.get_commit_subject(commit, abspath),
+                "author": info[commit]["author"],
+                "subject": info[commit]["subject"],
             }
         )
 
@@ -33,11 +33,14 @@ import os
 import shutil
 import subprocess
 import tempfile
+import threading
+import time
 import uuid
-from collections import Counter
+from collections import Counter, OrderedDict
 from math import ceil
 
 import bleach
+import flask
 import markdown
 import redis
 import six
@@ -69,6 +72,17 @@ from pagure.lib.model_base import create_session  # noqa
 REDIS = None
 PAGURE_CI = None
 _log = logging.getLogger(__name__)
+# Markdown processors and bleach cleaners are reused between documents but
+# are not thread-safe, so each thread gets its own.
+_RENDERERS = threading.local()
+# Version of the html rendering stored for issues, pull-requests and their
+# comments, to increase when the rendering changes so they are rendered again
+RENDERED_HTML_VERSION = 1
+# Rendered markdown, keyed by the hash of the text and its rendering context
+_MARKDOWN_CACHE = OrderedDict()
+_MARKDOWN_CACHE_LOCK = threading.Lock()
+# Cached in place of the documents rendered differently for each user
+_MARKDOWN_USER_DEPENDENT = "\0user-dependent"
 # List of all the possible hooks pagure could generate before it was moved
 # to the runner architecture we now use.
 # This list is kept so we can ignore all of these hooks.
@@ -137,6 +151,32 @@ def get_user_by_id(session, userid):
     return query.first()
 
 
+def get_users_by_email(session, emails):
+    """Searches in the database for the users having any of the specified
+    emails, using a single query per batch of emails.
+
+    :arg session: the session to use to connect to the database.
+    :arg emails: the emails of the users to look for
+    :type emails: list or set
+    :return: a dictionary associating each email found to its User object
+    :rtype: dict
+
+    """
+    emails = sorted(set(email for email in emails if email))
+    output = {}
+    # Keep the number of parameters of each query reasonable
+    for idx in range(0, len(emails), 500):
+        query = (
+            session.query(model.UserEmail)
+            .options(sqlalchemy.orm.joinedload(model.UserEmail.user))
+            .filter(model.UserEmail.email.in_(emails[idx : idx + 500]))
+        )
+        for user_email in query:
+            output[user_email.email] = user_email.user
+
+    return output
+
+
 def get_blocked_users(session, username=None, date=None):
     """Returns all the users that are blocked in this pagure instance."""
     now = datetime.datetime.utcnow()
@@ -866,7 +906,8 @@ def remove_tags(session, project, tags, user):
             if issue_tag.tag in tags:
                 tag = issue_tag.tag
                 session.delete(issue_tag)
-        pagure.lib.git.update_git(issue, repo=issue.project)
+    # Update the git version of all the issues in one go
+    pagure.lib.git.update_git(issues, repo=project)
 
     pagure.lib.notify.log(
         project,
@@ -1027,9 +1068,8 @@ def edit_issue_tags(
         .filter(model.TagIssueColored.issue_uid == model.Issue.uid)
         .all()
     )
-    for issue in issues:
-        # Update the git version
-        pagure.lib.git.update_git(issue, repo=issue.project)
+    # Update the git version of all the issues in one go
+    pagure.lib.git.update_git(issues, repo=project)
 
     msgs = []
     msgs.append(
@@ -1455,6 +1495,8 @@ def edit_comment(session, parent, comment, user, updated_comment):
     """Edit a comment."""
     user_obj = get_user(session, user)
     comment.comment = updated_comment
+    comment.comment_html = None
+    comment.comment_html_stamp = None
     comment.edited_on = datetime.datetime.utcnow()
     comment.editor = user_obj
     parent.last_updated = comment.edited_on
@@ -2100,6 +2142,8 @@ def edit_issue(
         edit.append("title")
     if content and content != issue.content:
         issue.content = content
+        issue.content_html = None
+        issue.content_html_stamp = None
         edit.append("content")
     if status and status != issue.status:
         old_status = issue.status
@@ -2356,6 +2400,298 @@ def fork_project(session, user, repo, editbranch=None, editfile=None):
     return task
 
 
+def _selectin_options(path, relations):
+    """Return the options eagerly loading the given relationships of the
+    objects found following the given path of relationships.
+
+    :arg path: the relationships leading from the queried objects to the
+        objects whose relationships should be loaded, empty for the
+        queried objects themselves.
+    :type path: tuple
+    :arg relations: the relationships to load.
+    :type relations: list
+
+    """
+    options = []
+    for relation in relations:
+        option = None
+        for step in path:
+            if option is None:
+                option = sqlalchemy.orm.defaultload(step)
+            else:
+                option = option.defaultload(step)
+        if option is None:
+            option = sqlalchemy.orm.selectinload(relation)
+        else:
+            option = option.selectinload(relation)
+        options.append(option)
+    return options
+
+
+def _project_json_options(path=()):
+    """Return the options loading what ``Project.to_json`` uses."""
+    options = _selectin_options(
+        path,
+        [
+            model.Project.user,
+            model.Project.issue_keys,
+            model.Project.tags,
+            model.Project.users,
+            model.Project.admins,
+            model.Project.committers,
+            model.Project.collaborators,
+            model.Project.groups,
+            model.Project.admin_groups,
+            model.Project.committer_groups,
+            model.Project.collaborator_groups,
+        ],
+    )
+    options.extend(
+        _selectin_options(
+            path + (model.Project.collaborators,), [model.ProjectUser.user]
+        )
+    )
+    # The parent of the parent is rare enough to be loaded lazily
+    if not any(step is model.Project.parent for step in path):
+        options.extend(_selectin_options(path, [model.Project.parent]))
+        options.extend(_project_json_options(path + (model.Project.parent,)))
+    return options
+
+
+def _comments_json_options(path, comment_class):
+    """Return the options loading what ``to_json`` of the comments uses."""
+    return _selectin_options(path, [comment_class.user, comment_class.editor])
+
+
+def _issue_json_options(path=()):
+    """Return the options loading what ``Issue.to_json`` uses."""
+    options = _selectin_options(
+        path,
+        [
+            model.Issue.project,
+            model.Issue.user,
+            model.Issue.assignee,
+            model.Issue.closed_by,
+            model.Issue.tags,
+            model.Issue.parents,
+            model.Issue.children,
+            model.Issue.other_fields,
+            model.Issue.related_prs,
+            model.Issue.comments,
+            model.Issue.boards_issues,
+        ],
+    )
+    options.extend(
+        _selectin_options(path + (model.Issue.project,), [model.Project.user])
+    )
+    options.extend(
+        _selectin_options(
+            path + (model.Issue.other_fields,), [model.IssueValues.key]
+        )
+    )
+    options.extend(
+        _comments_json_options(
+            path + (model.Issue.comments,), model.IssueComment
+        )
+    )
+    boards_path = path + (model.Issue.boards_issues,)
+    options.extend(
+        _selectin_options(
+            boards_path, [model.BoardIssues.board, model.BoardIssues.status]
+        )
+    )
+    options.extend(
+        _selectin_options(
+            boards_path + (model.BoardIssues.board,),
+            [model.Board.statuses, model.Board.tag, model.Board.project],
+        )
+    )
+    return options
+
+
+def _issue_project_json_options():
+    """Return the options loading what ``Issue.to_json`` uses when
+    called with ``with_project=True``.
+    """
+    return _issue_json_options() + _project_json_options(
+        (model.Issue.project,)
+    )
+
+
+def _pull_request_json_options():
+    """Return the options loading what ``PullRequest.to_json`` uses."""
+    options = _selectin_options(
+        (),
+        [
+            model.PullRequest.project,
+            model.PullRequest.project_from,
+            model.PullRequest.user,
+            model.PullRequest.assignee,
+            model.PullRequest.closed_by,
+            model.PullRequest.tags,
+            model.PullRequest.comments,
+        ],
+    )
+    options.extend(_project_json_options((model.PullRequest.project,)))
+    options.extend(_project_json_options((model.PullRequest.project_from,)))
+    options.extend(
+        _comments_json_options(
+            (model.PullRequest.comments,), model.PullRequestComment
+        )
+    )
+    return options
+
+
+# The loading profiles that can be given to the search functions: they
+# eagerly load, in a few queries, everything that the serializer the
+# results are given to will use, instead of lazy loading it object by
+# object.
+LOAD_PROFILES = {
+    "project_json": _project_json_options,
+    "issue_json": _issue_json_options,
+    "issue_json_with_project": _issue_project_json_options,
+    "pull_request_json": _pull_request_json_options,
+}
+
+
+def _apply_load_profile(query, load):
+    """Apply the given loading profile to the given query.
+
+    :arg query: the query returning the objects to load.
+    :type query: sqlalchemy.orm.Query
+    :arg load: the name of the loading profile, one of the keys of
+        ``LOAD_PROFILES``, or None to not load anything eagerly.
+    :type load: str or None
+
+    """
+    if load is None:
+        return query
+    if load not in LOAD_PROFILES:
+        raise pagure.exceptions.PagureException(
+            "Unknown loading profile: %s" % load
+        )
+    return query.options(*LOAD_PROFILES[load]())
+
+
+# Format of the dates stored in the keysets returned by get_keyset
+KEYSET_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+def _project_keyset_column(sort):
+    """Return the column projects are sorted on for the given sort."""
+    if sort in ("latest", "oldest"):
+        return model.Project.date_created
+    return model.Project.name
+
+
+def _issue_keyset_column(order_key):
+    """Return the column issues are sorted on for the given order_key,
+    raises a PagureException if issues sorted that way cannot be paginated
+    using keysets.
+    """
+    if order_key is None:
+        return model.Issue.date_created
+    if order_key in ("date_created", "last_updated", "id", "title"):
+        return getattr(model.Issue, order_key)
+    raise pagure.exceptions.PagureException(
+        "Issues sorted by %s cannot be paginated with a cursor" % order_key
+    )
+
+
+def _pull_request_keyset_column(order_key):
+    """Return the column pull-requests are sorted on for the given
+    order_key.
+    """
+    if order_key == "last_updated":
+        return model.PullRequest.updated_on
+    return model.PullRequest.date_created
+
+
+def get_keyset(obj, order=None):
+    """Return the keyset of the given project, issue or pull-request, ie:
+    its position in the list it was returned in, which can be given as the
+    `after` argument of the search functions to get the objects following
+    it in that list.
+
+    :arg obj: the project, issue or pull-request to get the keyset of.
+    :type obj: pagure.lib.model.Project, pagure.lib.model.Issue or
+        pagure.lib.model.PullRequest
+    :kwarg order: the `sort` (for projects) or the `order_key` (for issues
+        and pull-requests) the list was retrieved with.
+    :type order: str or None
+    :return: a list containing the value of the column the list is
+        sorted on and the identifier of the object, which can be
+        serialized in JSON.
+    :rtype: list
+
+    """
+    if isinstance(obj, model.Project):
+        column = _project_keyset_column(order)
+        identifier = obj.id
+    elif isinstance(obj, model.Issue):
+        column = _issue_keyset_column(order)
+        identifier = obj.uid
+    else:
+        column = _pull_request_keyset_column(order)
+        identifier = obj.uid
+
+    value = getattr(obj, column.key)
+    if isinstance(value, datetime.datetime):
+        value = value.strftime(KEYSET_DATE_FORMAT)
+    return [value, identifier]
+
+
+def _order_by_keyset(query, column, identifier, after, descending):
+    """Sort the given query on the given column and then on the given
+    identifier and, if a keyset is given, only return the rows following
+    it.
+
+    :arg query: the query to sort and filter.
+    :arg column: the column to sort the query on, text columns are sorted
+        case-insensitively.
+    :arg identifier: the column uniquely identifying the rows returned.
+    :arg after: the keyset, as returned by get_keyset, of the row after
+        which to start, or an empty list to start with the first row.
+    :type after: list
+    :arg descending: whether to sort the rows in descending order.
+    :type descending: bool
+
+    """
+    key = column
+    if ("%s" % column.type) == "TEXT" or isinstance(
+        column.type, sqlalchemy.String
+    ):
+        key = func.lower(column)
+
+    if after:
+        try:
+            value, last = after
+            if isinstance(column.type, sqlalchemy.DateTime):
+                value = datetime.datetime.strptime(value, KEYSET_DATE_FORMAT)
+        except (TypeError, ValueError):
+            raise pagure.exceptions.PagureException("Invalid keyset")
+        if key is not column:
+            value = func.lower(value)
+        if descending:
+            query = query.filter(
+                sqlalchemy.or_(
+                    key < value,
+                    sqlalchemy.and_(key == value, identifier < last),
+                )
+            )
+        else:
+            query = query.filter(
+                sqlalchemy.or_(
+                    key > value,
+                    sqlalchemy.and_(key == value, identifier > last),
+                )
+            )
+
+    if descending:
+        return query.order_by(desc(key), desc(identifier))
+    return query.order_by(asc(key), asc(identifier))
+
+
 def search_projects(
     session,
     username=None,
@@ -2370,8 +2706,20 @@ def search_projects(
     exclude_groups=None,
     private=None,
     owner=None,
+    load=None,
+    after=None,
 ):
-    """List existing projects"""
+    """List existing projects
+
+    :kwarg load: the name of the profile to eagerly load the projects
+        with, see ``LOAD_PROFILES``.
+    :type load: str or None
+    :kwarg after: the keyset, as returned by ``get_keyset``, of the project
+        after which to start listing the projects, instead of using an
+        offset. An empty list starts with the first project.
+    :type after: list or None
+
+    """
     projects = session.query(sqlalchemy.distinct(model.Project.id))
 
     if owner is not None and username is not None:
@@ -2583,7 +2931,15 @@ def search_projects(
         model.Project.id.in_(projects.as_scalar())
     )
 
-    if sort == "latest":
+    if after is not None:
+        query = _order_by_keyset(
+            query,
+            _project_keyset_column(sort),
+            model.Project.id,
+            after,
+            descending=sort == "latest",
+        )
+    elif sort == "latest":
         query = query.order_by(model.Project.date_created.desc())
     elif sort == "oldest":
         query = query.order_by(model.Project.date_created.asc())
@@ -2599,7 +2955,7 @@ def search_projects(
     if count:
         return query.count()
     else:
-        return query.all()
+        return _apply_load_profile(query, load).all()
 
 
 def list_users_projects(
@@ -2872,6 +3228,8 @@ def search_issues(
     closed_until=None,
     order="desc",
     order_key=None,
+    load=None,
+    after=None,
 ):
     """Retrieve one or more issues associated to a project with the given
     criterias.
@@ -2937,6 +3295,14 @@ def search_issues(
     :type order: None, str
     :kwarg order_key: Order issues by database column
     :type order_key: None, str
+    :kwarg load: the name of the profile to eagerly load the issues with,
+        see ``LOAD_PROFILES``.
+    :type load: str or None
+    :kwarg after: the keyset, as returned by ``get_keyset``, of the issue
+        after which to start listing the issues, instead of using an
+        offset. An empty list starts with the first issue. Only some
+        order_key are supported.
+    :type after: list or None
 
     :return: A single Issue object if issueid is specified, a list of Project
         objects otherwise.
@@ -3186,9 +3552,17 @@ def search_issues(
     if ("%s" % column.type) == "TEXT":
         column = func.lower(column)
 
+    if after is not None:
+        query = _order_by_keyset(
+            query,
+            _issue_keyset_column(order_key),
+            model.Issue.uid,
+            after,
+            descending=order != "asc",
+        )
     # The priority is sorted differently because it is by weight and the lower
     # the number, the higher the priority
-    if (order_key != "priority" and order == "asc") or (
+    elif (order_key != "priority" and order == "asc") or (
         order_key == "priority" and order == "desc"
     ):
         query = query.order_by(asc(column))
@@ -3204,7 +3578,7 @@ def search_issues(
             query = query.offset(offset)
         if limit:
             query = query.limit(limit)
-        output = query.all()
+        output = _apply_load_profile(query, load).all()
 
     return output
 
@@ -3261,8 +3635,21 @@ def search_pull_requests(
     order="desc",
     order_key=None,
     search_pattern=None,
+    load=None,
+    after=None,
 ):
-    """Retrieve the specified pull-requests."""
+    """Retrieve the specified pull-requests.
+
+    :kwarg load: the name of the profile to eagerly load the pull-requests
+        with, see ``LOAD_PROFILES``.
+    :type load: str or None
+    :kwarg after: the keyset, as returned by ``get_keyset``, of the
+        pull-request after which to start listing the pull-requests,
+        instead of using an offset. An empty list starts with the first
+        pull-request.
+    :type after: list or None
+
+    """
 
     query = session.query(model.PullRequest)
 
@@ -3388,7 +3775,15 @@ def search_pull_requests(
         query = query.filter(model.PullRequest.title.ilike(search_pattern))
 
     # Depending on the order, the query is sorted(default is desc)
-    if order == "asc":
+    if after is not None:
+        query = _order_by_keyset(
+            query,
+            column,
+            model.PullRequest.uid,
+            after,
+            descending=order != "asc",
+        )
+    elif order == "asc":
         query = query.order_by(asc(column))
     else:
         query = query.order_by(desc(column))
@@ -3402,7 +3797,7 @@ def search_pull_requests(
             query = query.offset(offset)
         if limit:
             query = query.limit(limit)
-        output = query.all()
+        output = _apply_load_profile(query, load).all()
 
     return output
 
@@ -4366,8 +4761,19 @@ def _convert_markdown(md_processor, text):
     return md_processor.convert(text)
 
 
-def text2markdown(text, extended=True, readme=False):
-    """Simple text to html converter using the markdown library."""
+def _get_markdown_processor(extended, readme):
+    """Return the markdown processor of the current thread for the given
+    set of extensions, ready to convert a new document.
+    """
+    processors = getattr(_RENDERERS, "markdown", None)
+    if processors is None:
+        processors = _RENDERERS.markdown = {}
+
+    md_processor = processors.get((extended, readme))
+    if md_processor is not None:
+        md_processor.reset()
+        return md_processor
+
     extensions = [
         "markdown.extensions.def_list",
         "markdown.extensions.fenced_code",
@@ -4407,18 +4813,256 @@ def text2markdown(text, extended=True, readme=False):
         },
         output_format="xhtml5",
     )
+    processors[(extended, readme)] = md_processor
+    return md_processor
+
+
+def _markdown_render_context(extended, user=False):
+    """Return what, besides the text, the rendering of markdown depends
+    on in the current request.
+
+    Our markdown extensions link to issues, PRs and commits of the project
+    being viewed, and to the private projects the current user may see.
+
+    :arg extended: whether our markdown extensions are used
+    :kwarg user: whether the document refers to private projects, in which
+        case it depends on who views it
+    :return: the project viewed and, if asked, the current user
+    :rtype: str
+
+    """
+    if not extended or not flask.has_request_context():
+        return ""
+
+    try:
+        context = "%s/%s/%s" % pagure.pfmarkdown._get_ns_repo_user()
+    except (IndexError, ValueError):
+        context = ""
+    if user:
+        fas_user = getattr(flask.g, "fas_user", None)
+        context += " %s" % (fas_user.username if fas_user else "")
+    return context
+
+
+def _markdown_cache_key(text, extended, readme, user=False):
+    """Return the key under which the rendering of the given text is
+    cached.
+    """
+    context = _markdown_render_context(extended, user=user)
+    content = "%s|%s|%s|%s" % (extended, readme, context, text)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
 
-    if text:
+def _markdown_cache_get(key):
+    """Return the cached rendering stored under the given key, None if
+    there is none or it has expired.
+    """
+    with _MARKDOWN_CACHE_LOCK:
+        cached = _MARKDOWN_CACHE.get(key)
+        if cached is not None:
+            if cached[0] > time.time():
+                _MARKDOWN_CACHE.move_to_end(key)
+                return cached[1]
+            del _MARKDOWN_CACHE[key]
+
+    if REDIS and pagure_config.get("MARKDOWN_CACHE_REDIS", False):
         try:
-            text = _convert_markdown(md_processor, text)
-        except Exception as err:
-            print(err)
-            _log.debug(
-                "A markdown error occured while processing: ``%s``", text
-            )
-        return clean_input(text)
+            html = REDIS.get("pagure.markdown.%s" % key)
+        except redis.exceptions.RedisError:  # pragma: no cover
+            _log.exception("Could not read the rendered markdown")
+            html = None
+        if html is not None:
+            html = html.decode("utf-8")
+            _markdown_cache_set(key, html, shared=False)
+            return html
+
+    return None
+
+
+def _markdown_cache_set(key, html, shared=True):
+    """Store the given rendering in the cache under the given key."""
+    size = pagure_config.get("MARKDOWN_CACHE_SIZE", 1000)
+    ttl = pagure_config.get("MARKDOWN_CACHE_TTL", 300)
+    if not size or not ttl:
+        return
+
+    with _MARKDOWN_CACHE_LOCK:
+        _MARKDOWN_CACHE[key] = (time.time() + ttl, html)
+        _MARKDOWN_CACHE.move_to_end(key)
+        while len(_MARKDOWN_CACHE) > size:
+            _MARKDOWN_CACHE.popitem(last=False)
+
+    if shared and REDIS and pagure_config.get("MARKDOWN_CACHE_REDIS", False):
+        try:
+            REDIS.setex("pagure.markdown.%s" % key, ttl, html)
+        except redis.exceptions.RedisError:  # pragma: no cover
+            _log.exception("Could not cache the rendered markdown")
+
+
+def _render_markdown(text, extended, readme):
+    """Convert the given text to html, without looking at the cache."""
+    md_processor = _get_markdown_processor(extended, readme)
+    pagure.pfmarkdown.set_depends_on_user(False)
+    try:
+        text = _convert_markdown(md_processor, text)
+    except Exception as err:
+        print(err)
+        _log.debug("A markdown error occured while processing: ``%s``", text)
+    finally:
+        pagure.pfmarkdown.clear_references()
+    return clean_input(text)
+
+
+def text2markdown(text, extended=True, readme=False):
+    """Simple text to html converter using the markdown library."""
+    if not text:
+        return ""
+
+    key = None
+    user = False
+    if pagure_config.get("MARKDOWN_CACHE_SIZE", 1000):
+        key = _markdown_cache_key(text, extended, readme)
+        html = _markdown_cache_get(key)
+        if html == _MARKDOWN_USER_DEPENDENT:
+            # Rendered differently for each user, look for the rendering
+            # of the current one
+            user = True
+            key = _markdown_cache_key(text, extended, readme, user=True)
+            html = _markdown_cache_get(key)
+        if html is not None:
+            pagure.pfmarkdown.set_depends_on_user(user)
+            return html
+
+    html = _render_markdown(text, extended, readme)
+
+    if key:
+        if not user and pagure.pfmarkdown.depends_on_user():
+            _markdown_cache_set(key, _MARKDOWN_USER_DEPENDENT)
+            key = _markdown_cache_key(text, extended, readme, user=True)
+        _markdown_cache_set(key, html)
+    return html
+
+
+def _rendered_html_stamp(text):
+    """Return the stamp identifying the rendering of the given text by the
+    current version of the renderer.
+    """
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    return "%s:%s:%s" % (RENDERED_HTML_VERSION, digest, int(time.time()))
+
+
+def _rendered_html_is_valid(stamp, text):
+    """Return whether the stamp of a stored rendering is the one of the
+    given text, by the current version of the renderer, and is recent
+    enough for the links it contains to be up to date.
+    """
+    try:
+        version, digest, date = stamp.split(":")
+        date = int(date)
+    except (AttributeError, ValueError):
+        return False
+
+    if version != str(RENDERED_HTML_VERSION):
+        return False
+    if digest != hashlib.sha1(text.encode("utf-8")).hexdigest():
+        return False
+    ttl = pagure_config.get("RENDERED_HTML_TTL", 3600)
+    return not ttl or date + ttl > time.time()
+
+
+def get_rendered_html(obj, field):
+    """Return the html rendering of the specified markdown field of an
+    issue, a pull-request or one of their comments.
+
+    The rendering stored in the database is returned if it is still valid,
+    otherwise the text is rendered again.
+
+    :arg obj: the issue, pull-request or comment to render
+    :type obj: pagure.lib.model.Issue, pagure.lib.model.PullRequest,
+        pagure.lib.model.IssueComment or pagure.lib.model.PullRequestComment
+    :arg field: the name of the field to render: ``content``,
+        ``initial_comment`` or ``comment``
+    :type field: str
+    :return: the html rendering of the field
+    :rtype: str
+
+    """
+    text = getattr(obj, field)
+    if not text:
+        return ""
+
+    stamp = getattr(obj, "%s_html_stamp" % field, None)
+    if _rendered_html_is_valid(stamp, text):
+        return getattr(obj, "%s_html" % field)
+
+    rendered = _get_request_renderings().get(_rendering_key(obj, field))
+    if rendered and rendered[0] == text:
+        return rendered[1]
+
+    return clean_input(text2markdown(text))
 
-    return ""
+
+def _rendering_key(obj, field):
+    """Return the key identifying the given field of the given object among
+    the renderings of the current request.
+    """
+    return (type(obj).__name__, obj.id, field)
+
+
+def _get_request_renderings():
+    """Return the renderings which depend on the user viewing them, made
+    during the current request so they can be displayed without being
+    rendered again.
+    """
+    if not flask.has_app_context():
+        return {}
+    if "rendered_html" not in flask.g:
+        flask.g.rendered_html = {}
+    return flask.g.rendered_html
+
+
+def update_rendered_html(session, objs):
+    """Render and store in the database the html of the specified issues,
+    pull-requests or comments, if the one stored is missing or outdated.
+
+    Documents linking to private projects are rendered differently
+    depending on who views them, so their rendering is not stored but only
+    kept for the rest of the current request.
+
+    :arg session: the session to use to connect to the database.
+    :arg objs: a list of tuples associating an issue, a pull-request or a
+        comment to the name of its markdown field, as accepted by
+        :func:`get_rendered_html`
+    :type objs: list
+    :return: whether some renderings were stored
+    :rtype: bool
+
+    """
+    updated = False
+    renderings = _get_request_renderings()
+    for obj, field in objs:
+        text = getattr(obj, field)
+        stamp = getattr(obj, "%s_html_stamp" % field)
+        if not text or _rendered_html_is_valid(stamp, text):
+            continue
+
+        html = clean_input(_render_markdown(text, True, False))
+        if pagure.pfmarkdown.depends_on_user():
+            renderings[_rendering_key(obj, field)] = (text, html)
+            continue
+        setattr(obj, "%s_html" % field, html)
+        setattr(obj, "%s_html_stamp" % field, _rendered_html_stamp(text))
+        session.add(obj)
+        updated = True
+
+    if updated:
+        try:
+            session.commit()
+        except sqlalchemy.exc.SQLAlchemyError:  # pragma: no cover
+            session.rollback()
+            _log.exception("Could not store the rendered html")
+            return False
+    return updated
 
 
 def filter_img_src(name, value):
@@ -4433,12 +5077,17 @@ def filter_img_src(name, value):
     return False
 
 
-def clean_input(text, ignore=None):
-    """For a given html text, escape everything we do not want to support
-    to avoid potential security breach.
+def _get_bleach_cleaner(ignore):
+    """Return the bleach cleaner of the current thread allowing the tags we
+    support, minus the ones to ignore.
     """
-    if ignore and not isinstance(ignore, (tuple, set, list)):
-        ignore = [ignore]
+    cleaners = getattr(_RENDERERS, "bleach", None)
+    if cleaners is None:
+        cleaners = _RENDERERS.bleach = {}
+
+    ignore = frozenset(ignore or [])
+    if ignore in cleaners:
+        return cleaners[ignore]
 
     bleach_v = bleach.__version__.split(".")
     for idx, val in enumerate(bleach_v):
@@ -4448,14 +5097,14 @@ def clean_input(text, ignore=None):
             pass
         bleach_v[idx] = val
 
-    attrs = bleach.ALLOWED_ATTRIBUTES.copy()
+    attrs = copy.deepcopy(bleach.ALLOWED_ATTRIBUTES)
     attrs["table"] = ["class"]
     attrs["span"] = ["class", "id"]
     attrs["div"] = ["class", "id"]
     attrs["td"] = ["align", "class"]
     attrs["th"] = ["align"]
     attrs["a"].extend(["id", "data-line-number"])
-    if not ignore or "img" not in ignore:
+    if "img" not in ignore:
         # newer bleach need three args for attribute callable
         if tuple(bleach_v) >= (2, 0, 0):  # pragma: no cover
             attrs["img"] = lambda tag, name, val: filter_img_src(name, val)
@@ -4493,10 +5142,9 @@ def clean_input(text, ignore=None):
         "noscript",
         "colgroup",
     ]
-    if ignore:
-        for tag in ignore:
-            if tag in tags:
-                tags.remove(tag)
+    for tag in ignore:
+        if tag in tags:
+            tags.remove(tag)
 
     kwargs = {"tags": tags, "attributes": attrs}
 
@@ -4505,7 +5153,22 @@ def clean_input(text, ignore=None):
         protocols = bleach.ALLOWED_PROTOCOLS + ["irc", "ircs"]
         kwargs["protocols"] = protocols
 
-    return bleach.clean(text, **kwargs)
+    if tuple(bleach_v) >= (2, 0, 0):  # pragma: no cover
+        cleaner = bleach.Cleaner(**kwargs).clean
+    else:
+        cleaner = functools.partial(bleach.clean, **kwargs)
+    cleaners[ignore] = cleaner
+    return cleaner
+
+
+def clean_input(text, ignore=None):
+    """For a given html text, escape everything we do not want to support
+    to avoid potential security breach.
+    """
+    if ignore and not isinstance(ignore, (tuple, set, list)):
+        ignore = [ignore]
+
+    return _get_bleach_cleaner(ignore)(text)
 
 
 def could_be_text(text):
@@ -4532,6 +5195,7 @@ def get_pull_request_of_user(
     closed_since=None,
     closed_until=None,
     count=False,
+    load=None,
 ):
     """List the opened pull-requests of an user.
     These pull-requests have either been opened by that user or against
@@ -4541,6 +5205,8 @@ def get_pull_request_of_user(
     returned.
     If actionable: only the PRs not opened/filed by the specified username
     will be returned.
+    The load argument is the name of the profile to eagerly load the
+    pull-requests with, see ``LOAD_PROFILES``.
     """
     projects = session.query(sqlalchemy.distinct(model.Project.id))
 
@@ -4651,7 +5317,7 @@ def get_pull_request_of_user(
     if count:
         return query.count()
     else:
-        return query.all()
+        return _apply_load_profile(query, load).all()
 
 
 def update_watch_status(session, project, user, watch):
@@ -5381,6 +6047,92 @@ def get_obj_access(session, project_obj, obj):
     return query.first()
 
 
+def get_user_project_access(session, project_obj, username):
+    """Returns all the access the given user has on the project, directly
+    or via the groups of the project, using a single query.
+
+    :arg session: the session to use to connect to the database.
+    :arg project_obj: SQLAlchemy object of Project class
+    :arg username: the username of the user to look for
+    :return: a dictionary with the keys:
+        ``exists``: whether the user exists in the database,
+        ``access``: the list of access levels granted to the user directly,
+        ``branches``: the list of branches patterns the user can push to
+        as a collaborator,
+        ``groups``: a dictionary associating the name of each group of the
+        project to its ``access``, its ``branches`` and whether the user is
+        a ``member`` of it.
+    :rtype: dict
+    """
+    user_id = (
+        session.query(model.User.id)
+        .filter(model.User.user == username)
+        .as_scalar()
+    )
+
+    user_query = (
+        session.query(
+            model.ProjectUser.access,
+            model.ProjectUser.branches,
+            sqlalchemy.null().label("group_name"),
+            sqlalchemy.literal(True).label("member"),
+        )
+        .select_from(model.User)
+        .outerjoin(
+            model.ProjectUser,
+            sqlalchemy.and_(
+                model.ProjectUser.user_id == model.User.id,
+                model.ProjectUser.project_id == project_obj.id,
+            ),
+        )
+        .filter(model.User.user == username)
+    )
+
+    group_query = (
+        session.query(
+            model.ProjectGroup.access,
+            model.ProjectGroup.branches,
+            model.PagureGroup.group_name,
+            model.PagureUserGroup.user_id.isnot(None),
+        )
+        .join(
+            model.PagureGroup,
+            model.PagureGroup.id == model.ProjectGroup.group_id,
+        )
+        .outerjoin(
+            model.PagureUserGroup,
+            sqlalchemy.and_(
+                model.PagureUserGroup.group_id == model.PagureGroup.id,
+                model.PagureUserGroup.user_id == user_id,
+            ),
+        )
+        .filter(model.ProjectGroup.project_id == project_obj.id)
+    )
+
+    output = {"exists": False, "access": [], "branches": [], "groups": {}}
+    for access, branches, group_name, member in user_query.union_all(
+        group_query
+    ):
+        if group_name is None:
+            output["exists"] = True
+            if access:
+                output["access"].append(access)
+            if access == "collaborator" and branches:
+                output["branches"].extend(
+                    branch.strip() for branch in branches.split(",")
+                )
+        else:
+            output["groups"][group_name] = {
+                "access": access,
+                "branches": [branch.strip() for branch in branches.split(",")]
+                if branches
+                else [],
+                "member": bool(member),
+            }
+
+    return output
+
+
 def search_token(
     session,
     acls,
@@ -5542,6 +6294,60 @@ def get_pagination_metadata(
     }
 
 
+def get_cursor_pagination_metadata(
+    flask_request, per_page, total, next_cursor, key_cursor="after"
+):
+    """
+    Returns pagination metadata for an API paginated using a cursor rather
+    than a page number. Only the next and the first pages can be linked to.
+    :param flask_request: flask.request object
+    :param per_page: int of results per page
+    :param total: int of total results, as counted on the first page
+    :param next_cursor: the cursor pointing to the next page or None if
+        the current page is the last one
+    :param key_cursor: the name of the argument corresponding to the cursor
+    :return: dictionary of pagination metadata
+    """
+    pages = int(ceil(total / float(per_page)))
+    request_args_wo_cursor = dict(copy.deepcopy(flask_request.args))
+    for key in [key_cursor, "page", "per_page", "endpoint"]:
+        if key in request_args_wo_cursor:
+            request_args_wo_cursor.pop(key)
+    for key in flask_request.args:
+        if key.startswith("_"):
+            request_args_wo_cursor.pop(key)
+
+    request_args_wo_cursor.update(flask_request.view_args)
+
+    next_page = None
+    if next_cursor:
+        request_args_wo_cursor.update({key_cursor: next_cursor})
+        next_page = url_for(
+            flask_request.endpoint,
+            per_page=per_page,
+            _external=True,
+            **request_args_wo_cursor,
+        )
+
+    request_args_wo_cursor.update({key_cursor: ""})
+    first_page = url_for(
+        flask_request.endpoint,
+        per_page=per_page,
+        _external=True,
+        **request_args_wo_cursor,
+    )
+
+    return {
+        key_cursor: flask_request.args.get(key_cursor) or None,
+        "pages": pages,
+        "per_page": per_page,
+        "prev": None,
+        "next": next_page,
+        "first": first_page,
+        "last": None,
+    }
+
+
 def update_star_project(session, repo, star, user):
     """Unset or set the star status depending on the star value.
 
@@ -5671,59 +6477,85 @@ def issues_history_stats(session, project, detailed=False, weeks_range=53):
 
     """
     tomorrow = datetime.datetime.utcnow() + datetime.timedelta(days=1)
-    current_open = (
-        session.query(model.Issue)
+    a_year_ago = tomorrow - datetime.timedelta(days=(weeks_range * 7))
+    one_week = datetime.timedelta(days=7)
+
+    # Retrieve in one query the number of open tickets, the oldest
+    # closed_at date and the number of tickets closed without closed_at
+    current_open, oldest_closed, no_closed_at = (
+        session.query(
+            func.count(sqlalchemy.case([(model.Issue.status == "Open", 1)])),
+            func.min(model.Issue.closed_at),
+            func.count(
+                sqlalchemy.case(
+                    [
+                        (
+                            sqlalchemy.and_(
+                                model.Issue.closed_at == None,  # noqa
+                                model.Issue.status == "Closed",
+                            ),
+                            1,
+                        )
+                    ]
+                )
+            ),
+        )
         .filter(model.Issue.project_id == project.id)
-        .filter(model.Issue.status == "Open")
-        .count()
+        .one()
     )
 
     # Check if the oldest ticket with a closed_at date is older than a year
     # ago, if it is, we will assume that all tickets that were closed last year
     # have a closed_at date set.
-    oldest_closed = (
-        session.query(model.Issue)
-        .filter(model.Issue.project_id == project.id)
-        .filter(model.Issue.closed_at != None)  # noqa
-        .order_by(sqlalchemy.asc(model.Issue.closed_at))
-        .first()
-    )
-    a_year_ago = tomorrow - datetime.timedelta(days=(weeks_range * 7))
-    if oldest_closed and oldest_closed.closed_at < a_year_ago:
+    if oldest_closed and oldest_closed < a_year_ago:
         to_ignore = 0
     else:
         # Some ticket got imported as closed but without a closed_at date, so
         # let's ignore them all
-        to_ignore = (
-            session.query(model.Issue)
-            .filter(model.Issue.project_id == project.id)
-            .filter(model.Issue.closed_at == None)  # noqa
-            .filter(model.Issue.status == "Closed")
-            .count()
-        )
+        to_ignore = no_closed_at
 
-    # For each week from tomorrow, get the number of open tickets
+    # Retrieve in a second query the dates of the tickets opened or closed
+    # over the period and count them per week, starting from tomorrow
+    opened = [0] * weeks_range
+    closed = [0] * weeks_range
+
+    def _get_week(date):
+        """Return the index of the week (from tomorrow) the date is in."""
+        if date is None or date < a_year_ago or date >= tomorrow:
+            return None
+        # The week of index N covers [tomorrow - N - 1 weeks, tomorrow - N)
+        delta = tomorrow - date - datetime.timedelta(microseconds=1)
+        return delta // one_week
+
+    query = (
+        session.query(
+            model.Issue.date_created,
+            model.Issue.closed_at,
+            model.Issue.status,
+        )
+        .filter(model.Issue.project_id == project.id)
+        .filter(
+            sqlalchemy.or_(
+                model.Issue.date_created >= a_year_ago,
+                model.Issue.closed_at >= a_year_ago,
+            )
+        )
+    )
+    for date_created, closed_at, status in query:
+        week = _get_week(date_created)
+        # For backward compatibility
+        if week is not None and (detailed or status == "Open"):
+            opened[week] += 1
+        week = _get_week(closed_at)
+        if week is not None:
+            closed[week] += 1
 
     output = {}
     for week in range(weeks_range):
         end = tomorrow - datetime.timedelta(days=(week * 7))
-        start = end - datetime.timedelta(days=7)
-        closed_ticket = (
-            session.query(model.Issue)
-            .filter(model.Issue.project_id == project.id)
-            .filter(model.Issue.closed_at >= start)
-            .filter(model.Issue.closed_at < end)
-        ).count()
-        query_open = (
-            session.query(model.Issue)
-            .filter(model.Issue.project_id == project.id)
-            .filter(model.Issue.date_created >= start)
-            .filter(model.Issue.date_created < end)
-        )
-        # For backward compatibility
-        if detailed is False:
-            query_open = query_open.filter(model.Issue.status == "Open")
-        open_ticket = query_open.count()
+        start = end - one_week
+        closed_ticket = closed[week]
+        open_ticket = opened[week]
         cnt = open_ticket + closed_ticket - to_ignore
         current_open = current_open - open_ticket + closed_ticket
 
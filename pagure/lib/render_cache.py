@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module caches what is computed out of the blobs of the git repositories
+to display them: the html rendering of the READMEs and documents and the
+character encoding of the text files.
+
+Git blobs never change, so these are keyed by the ID of the blob, the way it
+is rendered and the version of the renderers. They are kept in memory by each
+process, up to a given size, and can be shared with the other processes via
+redis.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+import docutils
+import markdown
+import redis
+
+import pagure
+import pagure.lib.encoding_utils
+import pagure.lib.query
+from pagure.config import config as pagure_config
+from pagure.exceptions import PagureEncodingException
+
+_log = logging.getLogger(__name__)
+
+# Version of the rendering of the blobs, to increase when it changes in a
+# way the versions of pagure and of the renderers do not reflect
+RENDER_CACHE_VERSION = 1
+# Cached values and their size, keyed by the hash of the blob ID, the mode
+# and the context of their rendering
+_CACHE = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+_STATS = {"hits": 0, "redis_hits": 0, "misses": 0, "size": 0}
+
+
+def _cache_key(oid, mode, context):
+    """Return the key under which the rendering of the given blob in the
+    given mode and context is cached.
+    """
+    content = "|".join(
+        [
+            "%s" % RENDER_CACHE_VERSION,
+            pagure.__version__,
+            docutils.__version__,
+            markdown.__version__,
+            oid,
+            mode,
+            context or "",
+        ]
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _redis_enabled():
+    """Return whether the renderings are shared via redis."""
+    return bool(
+        pagure.lib.query.REDIS
+        and pagure_config.get("RENDER_CACHE_REDIS", False)
+    )
+
+
+def _cache_get(key):
+    """Return the value stored under the given key, None if there is
+    none.
+    """
+    with _CACHE_LOCK:
+        cached = _CACHE.get(key)
+        if cached is not None:
+            _CACHE.move_to_end(key)
+            _STATS["hits"] += 1
+            return cached[1]
+
+    if _redis_enabled():
+        try:
+            value = pagure.lib.query.REDIS.get("pagure.render.%s" % key)
+        except redis.exceptions.RedisError:  # pragma: no cover
+            _log.exception("Could not read the cached rendering")
+            value = None
+        if value is not None:
+            value = json.loads(value.decode("utf-8"))
+            _cache_set(key, value, shared=False)
+            with _CACHE_LOCK:
+                _STATS["redis_hits"] += 1
+            return value
+
+    with _CACHE_LOCK:
+        _STATS["misses"] += 1
+    return None
+
+
+def _cache_set(key, value, shared=True):
+    """Store the given value in the cache under the given key, evicting
+    the least recently used values beyond the size limit.
+    """
+    max_size = pagure_config.get("RENDER_CACHE_MAX_SIZE", 0)
+    serialized = json.dumps(value)
+    size = len(serialized)
+    if size <= max_size:
+        with _CACHE_LOCK:
+            previous = _CACHE.pop(key, None)
+            if previous is not None:
+                _STATS["size"] -= previous[0]
+            _CACHE[key] = (size, value)
+            _STATS["size"] += size
+            while _STATS["size"] > max_size:
+                _, (evicted_size, _) = _CACHE.popitem(last=False)
+                _STATS["size"] -= evicted_size
+
+    if shared and _redis_enabled():
+        try:
+            pagure.lib.query.REDIS.setex(
+                "pagure.render.%s" % key,
+                pagure_config.get("RENDER_CACHE_REDIS_TTL", 86400),
+                serialized,
+            )
+        except redis.exceptions.RedisError:  # pragma: no cover
+            _log.exception("Could not cache the rendering")
+
+
+def get_rendering(oid, mode, render, context=None):
+    """Return the rendering of a blob, from the cache if it is there.
+
+    :arg oid: the ID of the blob rendered, as an hexadecimal string
+    :arg mode: how the blob is rendered, for example the extension of the
+        document converted to html
+    :arg render: a function rendering the blob when it is not cached,
+        returning a list or a tuple of values which can be serialized in
+        JSON
+    :kwarg context: anything else the rendering depends on, as a string
+    :return: the rendering, as a tuple
+
+    """
+    if not pagure_config.get("RENDER_CACHE_MAX_SIZE", 0):
+        return tuple(render())
+
+    key = _cache_key(oid, mode, context)
+    value = _cache_get(key)
+    if value is None:
+        value = list(render())
+        _cache_set(key, value)
+    return tuple(value)
+
+
+def decode_blob(blob):
+    """Decode the given blob, guessing its character encoding only if it is
+    not cached yet.
+
+    :arg blob: the blob to decode
+    :type blob: pygit2.Blob
+    :return: the content of the blob as text
+    :rtype: str
+    :raises PagureEncodingException: if the blob could not be decoded
+
+    """
+
+    def _guess_encoding():
+        try:
+            return [pagure.lib.encoding_utils.guess_encoding(blob.data)]
+        except PagureEncodingException:
+            return [None]
+
+    (encoding,) = get_rendering(blob.oid.hex, "encoding", _guess_encoding)
+    if encoding is None:
+        raise PagureEncodingException(
+            "No encoding could be guessed for this file"
+        )
+    return blob.data.decode(encoding)
+
+
+def get_stats():
+    """Return the number of hits, of hits from redis and of misses of the
+    cache of this process, as well as the number of values it holds and
+    their total size.
+    """
+    with _CACHE_LOCK:
+        stats = dict(_STATS)
+        stats["entries"] = len(_CACHE)
+    return stats
+
+
+def clear():
+    """Empty the cache of this process and reset its statistics."""
+    with _CACHE_LOCK:
+        _CACHE.clear()
+        for key in _STATS:
+            _STATS[key] = 0
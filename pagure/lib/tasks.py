@@ -335,6 +335,11 @@ def update_git(
 ):
     """Update the JSON representation of either a ticket or a pull-request
     depending on the argument specified.
+
+    A list of tickets or pull-requests uid may be given, in which case they
+    are all updated in a single commit. The other tickets or pull-requests
+    of the project updated since the last commit are included in it as well,
+    so a burst of updates results in a single commit.
     """
     project = pagure.lib.query._get_project(
         session, namespace=namespace, name=name, user=user
@@ -348,14 +353,25 @@ def update_git(
 
     with project.lock(project_lock):
         if ticketuid is not None:
-            obj = pagure.lib.query.get_issue_by_uid(session, ticketuid)
+            uids, getter = ticketuid, pagure.lib.query.get_issue_by_uid
         elif requestuid is not None:
-            obj = pagure.lib.query.get_request_by_uid(session, requestuid)
+            uids, getter = requestuid, pagure.lib.query.get_request_by_uid
         else:
             raise NotImplementedError("No ticket ID or request ID provided")
 
-        if obj is None:
-            raise Exception("Unable to find object")
+        if isinstance(uids, (list, tuple)):
+            obj = [getter(session, uid) for uid in uids]
+            if None in obj:
+                raise Exception("Unable to find object")
+        else:
+            obj = getter(session, uids)
+            if obj is None:
+                raise Exception("Unable to find object")
+
+        objs = obj if isinstance(obj, list) else [obj]
+        pending = pagure.lib.git._get_pending_updates(session, project, objs)
+        if pending:
+            obj = objs + pending
 
         result = pagure.lib.git._update_git(obj, project)
 
@@ -859,27 +875,56 @@ def commits_author_stats(self, session, repopath):
         raise ValueError("Git repository not found.")
 
     repo_obj = pygit2.Repository(repopath)
+    head = repo_obj.head.peel().oid.hex
+
+    # Only walk the commits added since the last time the stats were
+    # computed, if the history was not rewritten since
+    cached, walker = _get_stats_walker(repo_obj, "authors", head)
 
     stats = collections.defaultdict(int)
     number_of_commits = 0
-    authors_email = set()
-    for commit in repo_obj.walk(
-        repo_obj.head.peel().oid.hex, pygit2.GIT_SORT_NONE
-    ):
+    first_commit_time = None
+    if cached:
+        number_of_commits = cached["number_of_commits"]
+        first_commit_time = cached["first_commit_time"]
+        for name, email, val in cached["authors"]:
+            stats[(name, email)] = val
+
+    for commit in walker:
         # For each commit record how many times each combination of name and
         # e-mail appears in the git history.
         number_of_commits += 1
         email = commit.author.email
         author = commit.author.name
         stats[(author, email)] += 1
+        if not cached:
+            first_commit_time = commit.commit_time
+
+    pagure.lib.git.write_repo_cache(
+        repo_obj,
+        "stats",
+        "authors",
+        {
+            "head": head,
+            "number_of_commits": number_of_commits,
+            "first_commit_time": first_commit_time,
+            "authors": [
+                [name, email, val] for (name, email), val in stats.items()
+            ],
+        },
+    )
 
+    authors_email = set()
+    users = pagure.lib.query.get_users_by_email(
+        session, [email for _, email in stats]
+    )
     for (name, email), val in list(stats.items()):
         if not email:
             # Author email is missing in the git commit.
             continue
         # For each recorded user info, check if we know the e-mail address of
         # the user.
-        user = pagure.lib.query.search_user(session, email=email)
+        user = users.get(email)
         if user and (user.default_email != email or user.fullname != name):
             # We know the the user, but the name or e-mail used in Git commit
             # does not match their default e-mail address and full name. Let's
@@ -907,7 +952,7 @@ def commits_author_stats(self, session, repopath):
         number_of_commits,
         out_list,
         len(authors_email),
-        commit.commit_time,
+        first_commit_time,
     )
 
 
@@ -922,19 +967,73 @@ def commits_history_stats(self, session, repopath):
         raise ValueError("Git repository not found.")
 
     repo_obj = pygit2.Repository(repopath)
+    head = repo_obj.head.peel().oid.hex
+
+    cached, walker = _get_stats_walker(repo_obj, "history", head)
+
+    now = datetime.datetime.utcnow()
+    a_year_ago = (now - datetime.timedelta(days=365)).date().isoformat()
 
     dates = collections.defaultdict(int)
-    for commit in repo_obj.walk(
-        repo_obj.head.peel().oid.hex, pygit2.GIT_SORT_NONE
-    ):
-        delta = (
-            datetime.datetime.utcnow() - arrow.get(commit.commit_time).naive
-        )
+    if cached:
+        for key, val in cached["dates"]:
+            # Drop the days that are now more than a year old
+            if key >= a_year_ago:
+                dates[key] = val
+
+    for commit in walker:
+        delta = now - arrow.get(commit.commit_time).naive
         if delta.days > 365:
             break
         dates[arrow.get(commit.commit_time).date().isoformat()] += 1
 
-    return [(key, dates[key]) for key in sorted(dates)]
+    output = [(key, dates[key]) for key in sorted(dates)]
+
+    pagure.lib.git.write_repo_cache(
+        repo_obj,
+        "stats",
+        "history",
+        {"head": head, "dates": output},
+    )
+
+    return output
+
+
+def _get_stats_walker(repo_obj, name, head):
+    """Return the stats of the given name cached for the specified git
+    repo and a walker over the commits not taken into account in them.
+
+    If the cached stats were computed for a commit that is not an ancestor
+    of ``head`` (the history was rewritten), they are dropped and the
+    walker goes over the entire history.
+
+    :arg repo_obj: the pygit2.Repository object of the git repo
+    :arg name: the name of the stats to retrieve from the cache
+    :type name: str
+    :arg head: the commit identifier to walk the history from
+    :type head: str
+    :return: a tuple of the cached stats (or None) and the walker
+    :rtype: (dict or None, pygit2.Walker)
+
+    """
+    walker = repo_obj.walk(head, pygit2.GIT_SORT_NONE)
+
+    cached = pagure.lib.git.read_repo_cache(repo_obj, "stats", name)
+    if cached and cached["head"] != head:
+        try:
+            usable = repo_obj.descendant_of(head, cached["head"])
+        except (KeyError, ValueError):
+            # The previous head is no longer in the repo
+            usable = False
+        if usable:
+            walker.hide(cached["head"])
+        else:
+            cached = None
+    elif cached:
+        # Nothing new since the last time
+        walker.hide(head)
+
+    return cached, walker
 
 
 @conn.task(queue=pagure_config.get("MEDIUM_CELERY_QUEUE", None), bind=True)
@@ -10,15 +10,19 @@
 
 from __future__ import absolute_import, unicode_literals
 
+import collections
 import datetime
 import hashlib
 import hmac
 import json
 import os
 import os.path
+import threading
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 
+import pygit2
 import requests
 import six
 from celery import Celery
@@ -33,10 +37,21 @@ from pagure.lib.lib_ci import trigger_jenkins_build
 from pagure.lib.tasks_utils import pagure_task
 from pagure.mail_logging import format_callstack
 from pagure.utils import set_up_logging, split_project_fullname
+from six.moves.urllib_parse import urlparse
 
 # logging.config.dictConfig(pagure_config.get('LOGGING') or {'version': 1})
 _log = get_task_logger(__name__)
 _i = 0
+# Keep-alive HTTP sessions used to send the web-hooks, one per host, with
+# the time they were last used, the least recently used first
+_SESSIONS = collections.OrderedDict()
+_SESSIONS_LOCK = threading.Lock()
+# Maximum number of sessions kept and number of seconds a session is kept
+# once it is no longer used
+WEBHOOK_MAX_SESSIONS = 100
+WEBHOOK_SESSION_IDLE_TIME = 300
+# Upper bounds (in seconds) of the buckets of the latency histograms
+WEBHOOK_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
 
 
 if os.environ.get("PAGURE_BROKER_URL"):  # pragma: no cover
@@ -59,8 +74,218 @@ def augment_celery_log(**kwargs):
     set_up_logging(force=True)
 
 
+def _get_session(url):
+    """Return the HTTP session to use to query the specified url.
+
+    Sessions are kept per host so that consecutive notifications sent to
+    the same host reuse the already opened connections. The sessions which
+    have not been used for ``WEBHOOK_SESSION_IDLE_TIME`` seconds, or the
+    least recently used ones beyond ``WEBHOOK_MAX_SESSIONS``, are closed.
+
+    :arg url: the url that will be queried
+    :type url: str
+    :return: the session to use to query this url
+    :rtype: requests.Session
+
+    """
+    host = urlparse(url).netloc
+    now = time.time()
+    with _SESSIONS_LOCK:
+        session, _ = _SESSIONS.pop(host, (None, None))
+        if session is None:
+            pool_size = pagure_config.get("WEBHOOK_WORKERS", 10)
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=pool_size
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        _SESSIONS[host] = (session, now)
+
+        for old_host, (old_session, last_used) in list(_SESSIONS.items()):
+            if (
+                len(_SESSIONS) <= WEBHOOK_MAX_SESSIONS
+                and last_used > now - WEBHOOK_SESSION_IDLE_TIME
+            ):
+                break
+            del _SESSIONS[old_host]
+            old_session.close()
+    return session
+
+
+def _get_web_hook_headers(project, topic, content):
+    """Return the headers to send along with the specified web-hook
+    content.
+
+    :arg project: the project the notification is about
+    :type project: pagure.lib.model.Project
+    :arg topic: the topic of the notification
+    :type topic: bytes
+    :arg content: the JSON content sent in the notification
+    :type content: str
+    :return: the headers of the notification
+    :rtype: dict
+
+    """
+    hashhex = hmac.new(
+        project.hook_token.encode("utf-8"),
+        content.encode("utf-8"),
+        hashlib.sha1,
+    ).hexdigest()
+    hashhex256 = hmac.new(
+        project.hook_token.encode("utf-8"),
+        content.encode("utf-8"),
+        hashlib.sha256,
+    ).hexdigest()
+    return {
+        "X-Pagure": pagure_config["APP_URL"],
+        "X-Pagure-project": project.fullname,
+        "X-Pagure-Signature": hashhex,
+        "X-Pagure-Signature-256": hashhex256,
+        "X-Pagure-Topic": topic,
+        "Content-Type": "application/json",
+    }
+
+
+def _record_web_hook_delivery(fullname, url, status, latency, attempt):
+    """Store the outcome of a web-hook delivery in the delivery log of the
+    project and in its latency histogram, if redis is available.
+
+    :arg fullname: the fullname of the project the notification is about
+    :type fullname: str
+    :arg url: the url the notification was sent to
+    :type url: str
+    :arg status: the HTTP status code returned or None if the request
+        failed
+    :type status: int or None
+    :arg latency: the time it took to deliver the notification, in seconds
+    :type latency: float
+    :arg attempt: the number of previous attempts to deliver this
+        notification
+    :type attempt: int
+
+    """
+    if not pagure.lib.query.REDIS:
+        return
+
+    bucket = "+Inf"
+    for limit in WEBHOOK_LATENCY_BUCKETS:
+        if latency <= limit:
+            bucket = str(limit)
+            break
+
+    entry = json.dumps(
+        {
+            "url": url,
+            "status": status,
+            "latency": round(latency, 3),
+            "attempt": attempt,
+            "date": int(time.time()),
+        }
+    )
+    key = "pagure.webhook.%s" % fullname
+    try:
+        pipeline = pagure.lib.query.REDIS.pipeline()
+        pipeline.lpush("%s.log" % key, entry)
+        pipeline.ltrim(
+            "%s.log" % key, 0, pagure_config.get("WEBHOOK_LOG_SIZE", 100) - 1
+        )
+        pipeline.hincrby("%s.latency" % key, bucket, 1)
+        pipeline.execute()
+    except Exception as err:
+        _log.info("Could not log the web-hook delivery: %s" % err)
+
+
+def _send_web_hook(fullname, url, headers, content, attempt=0):
+    """Send the web-hook notification to one url.
+
+    :arg fullname: the fullname of the project the notification is about
+    :type fullname: str
+    :arg url: the url to send the notification to
+    :type url: str
+    :arg headers: the headers of the notification
+    :type headers: dict
+    :arg content: the JSON content of the notification
+    :type content: str
+    :kwarg attempt: the number of previous attempts to deliver this
+        notification
+    :type attempt: int
+    :return: whether the delivery should be tried again later
+    :rtype: bool
+
+    """
+    _log.info("Calling url %s" % url)
+    start = time.time()
+    status = None
+    retry = False
+    try:
+        req = _get_session(url).post(
+            url,
+            headers=headers,
+            data=content,
+            timeout=pagure_config.get("WEBHOOK_TIMEOUT", 60),
+        )
+        status = req.status_code
+        if not req:
+            _log.info(
+                "An error occured while querying: %s - "
+                "Error code: %s" % (url, req.status_code)
+            )
+            retry = req.status_code >= 500 or req.status_code == 429
+    except (requests.exceptions.RequestException, Exception) as err:
+        _log.info(
+            "An error occured while querying: %s - Error: %s" % (url, err)
+        )
+        retry = True
+
+    _record_web_hook_delivery(
+        fullname, url, status, time.time() - start, attempt
+    )
+    return retry
+
+
+def _schedule_web_hook_retry(project, topic, url, content, attempt):
+    """Schedule a new attempt at sending the web-hook notification to the
+    specified url, backing off exponentially with the number of attempts.
+
+    :arg project: the project the notification is about
+    :type project: pagure.lib.model.Project
+    :arg topic: the topic of the notification
+    :type topic: bytes
+    :arg url: the url the notification failed to be sent to
+    :type url: str
+    :arg content: the JSON content of the notification
+    :type content: str
+    :arg attempt: the number of attempts made so far
+    :type attempt: int
+
+    """
+    if attempt > pagure_config.get("WEBHOOK_MAX_RETRIES", 5):
+        _log.info("Giving up on calling url %s" % url)
+        return
+
+    delay = pagure_config.get("WEBHOOK_RETRY_DELAY", 60) * 2 ** (attempt - 1)
+    _log.info("Retrying url %s in %s seconds" % (url, delay))
+    retry_web_hook.apply_async(
+        kwargs=dict(
+            topic=topic.decode("utf-8"),
+            url=url,
+            content=content,
+            attempt=attempt,
+            namespace=project.namespace,
+            name=project.name,
+            user=project.user.username if project.is_fork else None,
+        ),
+        countdown=delay,
+    )
+
+
 def call_web_hooks(project, topic, msg, urls):
-    """Sends the web-hook notification."""
+    """Sends the web-hook notification.
+
+    The notification is sent to all the urls concurrently, the urls which
+    could not be reached are retried later on.
+    """
     _log.info("Processing project: %s - topic: %s", project.fullname, topic)
     _log.debug("msg: %s", msg)
 
@@ -81,38 +306,25 @@ def call_web_hooks(project, topic, msg, urls):
     )
 
     content = json.dumps(msg, sort_keys=True)
-    hashhex = hmac.new(
-        project.hook_token.encode("utf-8"),
-        content.encode("utf-8"),
-        hashlib.sha1,
-    ).hexdigest()
-    hashhex256 = hmac.new(
-        project.hook_token.encode("utf-8"),
-        content.encode("utf-8"),
-        hashlib.sha256,
-    ).hexdigest()
-    headers = {
-        "X-Pagure": pagure_config["APP_URL"],
-        "X-Pagure-project": project.fullname,
-        "X-Pagure-Signature": hashhex,
-        "X-Pagure-Signature-256": hashhex256,
-        "X-Pagure-Topic": topic,
-        "Content-Type": "application/json",
-    }
-    for url in sorted(urls):
-        url = url.strip()
-        _log.info("Calling url %s" % url)
-        try:
-            req = requests.post(url, headers=headers, data=content, timeout=60)
-            if not req:
-                _log.info(
-                    "An error occured while querying: %s - "
-                    "Error code: %s" % (url, req.status_code)
-                )
-        except (requests.exceptions.RequestException, Exception) as err:
-            _log.info(
-                "An error occured while querying: %s - Error: %s" % (url, err)
+    headers = _get_web_hook_headers(project, topic, content)
+
+    urls = sorted(set(url.strip() for url in urls if url.strip()))
+    if not urls:
+        return
+
+    fullname = project.fullname
+    workers = min(len(urls), pagure_config.get("WEBHOOK_WORKERS", 10))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        retries = list(
+            executor.map(
+                lambda url: _send_web_hook(fullname, url, headers, content),
+                urls,
             )
+        )
+
+    for url, retry in zip(urls, retries):
+        if retry:
+            _schedule_web_hook_retry(project, topic, url, content, 1)
 
 
 @conn.task(queue=pagure_config.get("WEBHOOK_CELERY_QUEUE", None), bind=True)
@@ -157,6 +369,69 @@ def webhook_notification(
     call_web_hooks(project, topic, msg, urls)
 
 
+@conn.task(queue=pagure_config.get("WEBHOOK_CELERY_QUEUE", None), bind=True)
+@pagure_task
+def retry_web_hook(
+    self,
+    session,
+    topic,
+    url,
+    content,
+    attempt,
+    namespace=None,
+    name=None,
+    user=None,
+):
+    """Try again to send a web-hook notification which could not be
+    delivered.
+
+    :arg session: SQLAlchemy session object
+    :type session: sqlalchemy.orm.session.Session
+    :arg topic: the topic for the notification
+    :type topic: str
+    :arg url: the url to send the notification to
+    :type url: str
+    :arg content: the JSON content of the notification
+    :type content: str
+    :arg attempt: the number of attempts made so far
+    :type attempt: int
+    :kwarg namespace: the namespace of the project
+    :type namespace: None or str
+    :kwarg name: the name of the project
+    :type name: None or str
+    :kwarg user: the user of the project, only set if the project is a fork
+    :type user: None or str
+
+    """
+    project = pagure.lib.query._get_project(
+        session, namespace=namespace, name=name, user=user
+    )
+
+    if not project:
+        session.close()
+        raise RuntimeError(
+            "Project: %s/%s from user: %s not found in the DB"
+            % (namespace, name, user)
+        )
+
+    # The url may have been removed from the web-hooks of the project since
+    # the previous attempt
+    urls = project.settings.get("Web-hooks") or ""
+    if url not in set(entry.strip() for entry in urls.split("\n")):
+        _log.info(
+            "Url %s is no longer a web-hook of %s, not retrying"
+            % (url, project.fullname)
+        )
+        return
+
+    topic = to_bytes(topic, encoding="utf8", nonstring="passthru")
+    headers = _get_web_hook_headers(project, topic, content)
+    if _send_web_hook(
+        project.fullname, url, headers, content, attempt=attempt
+    ):
+        _schedule_web_hook_retry(project, topic, url, content, attempt + 1)
+
+
 @conn.task(queue=pagure_config.get("LOGCOM_CELERY_QUEUE", None), bind=True)
 @pagure_task
 def log_commit_send_notifications(
@@ -227,39 +502,74 @@ def log_commit_send_notifications(
         session.rollback()
 
 
+def _list_tree_files(repo_obj, tree, prefix=""):
+    """Return the path of all the files in the specified git tree."""
+    output = []
+    for entry in tree:
+        path = prefix + entry.name
+        if entry.type_str == "tree":
+            output.extend(
+                _list_tree_files(repo_obj, repo_obj[entry.id], path + "/")
+            )
+        else:
+            output.append(path)
+    return output
+
+
+def _diff_tree_files(repo_obj, old_commit, new_commit):
+    """Return the path of the files changed between the two commits, all
+    the files of the new commit if there is no old commit."""
+    if old_commit is None:
+        return _list_tree_files(repo_obj, new_commit.tree)
+    diff = repo_obj.diff(old_commit.tree, new_commit.tree)
+    output = set()
+    for patch in diff.deltas:
+        output.add(patch.old_file.path)
+        output.add(patch.new_file.path)
+    return sorted(output)
+
+
 def get_files_to_load(title, new_commits_list, abspath):
+    """Return the list of the files changed by the specified commits.
 
+    When the commits form a single range (one tip, one base), this is a
+    single tree diff between the base and the tip, otherwise the files
+    changed by each commit are gathered. Everything is read from the git
+    repo in-process.
+    """
     _log.info("%s: Retrieve the list of files changed" % title)
-    file_list = []
-    new_commits_list.reverse()
-    n = len(new_commits_list)
-    for idx, commit in enumerate(new_commits_list):
+    try:
+        repo_obj = pygit2.Repository(abspath)
+        commits = [repo_obj[commit] for commit in new_commits_list]
+    except (pygit2.GitError, KeyError, ValueError) as err:
+        _log.info("%s: Could not read the commits pushed: %s", title, err)
+        return []
+    hexes = set(commit.oid.hex for commit in commits)
+
+    bases = set()
+    parents = set()
+    for commit in commits:
+        for parent in commit.parents:
+            parents.add(parent.oid.hex)
+            if parent.oid.hex not in hexes:
+                bases.add(parent.oid.hex)
+    tips = [commit for commit in commits if commit.oid.hex not in parents]
+
+    if len(tips) == 1 and len(bases) <= 1:
+        base = repo_obj[bases.pop()] if bases else None
+        return _diff_tree_files(repo_obj, base, tips[0])
+
+    file_list = set()
+    n = len(commits)
+    for idx, commit in enumerate(commits):
         if (idx % 100) == 0:
             _log.info(
                 "Loading files change in commits for %s: %s/%s", title, idx, n
             )
-        if commit == new_commits_list[0]:
-            filenames = pagure.lib.git.read_git_lines(
-                [
-                    "diff-tree",
-                    "--no-commit-id",
-                    "--name-only",
-                    "-r",
-                    "--root",
-                    commit,
-                ],
-                abspath,
-            )
-        else:
-            filenames = pagure.lib.git.read_git_lines(
-                ["diff-tree", "--no-commit-id", "--name-only", "-r", commit],
-                abspath,
-            )
-        for line in filenames:
-            if line.strip():
-                file_list.append(line.strip())
+        parent = commit.parents[0] if commit.parents else None
+        file_list.update(_diff_tree_files(repo_obj, parent, commit))
 
-    return file_list
+    return sorted(file_list)
 
 
 @conn.task(queue=pagure_config.get("LOADJSON_CELERY_QUEUE", None), bind=True)
@@ -311,6 +621,12 @@ def load_json_commits_to_db(
     file_list = set(get_files_to_load(project.fullname, commits, abspath))
     n = len(file_list)
     _log.info("LOADJSON: %s files to process" % n)
+    head_tree = None
+    if file_list:
+        repo_obj = pygit2.Repository(abspath)
+        if not repo_obj.is_empty and not repo_obj.head_is_unborn:
+            head_tree = repo_obj.head.peel(pygit2.Commit).tree
+    counts = {"Done": 0, "SKIPPED": 0, "FAILED": 0}
     mail_body = [
         "Good Morning",
         "",
@@ -331,11 +647,9 @@ def load_json_commits_to_db(
         tmp = "Loading: %s -- %s/%s" % (filename, idx + 1, n)
         try:
             json_data = None
-            data = "".join(
-                pagure.lib.git.read_git_lines(
-                    ["show", "HEAD:%s" % filename], abspath
-                )
-            )
+            data = None
+            if head_tree is not None and filename in head_tree:
+                data = repo_obj[head_tree[filename].id].data.decode("utf-8")
             if data and not filename.startswith("files/"):
                 try:
                     json_data = json.loads(data)
@@ -362,8 +676,10 @@ def load_json_commits_to_db(
                         json_data=json_data,
                     )
                 tmp += " ... ... Done"
+                counts["Done"] += 1
             else:
                 tmp += " ... ... SKIPPED - No JSON data"
+                counts["SKIPPED"] += 1
                 mail_body.append(tmp)
         except Exception as err:
             _log.info("data: %s", json_data)
@@ -371,10 +687,14 @@ def load_json_commits_to_db(
             _log.exception(err)
             tmp += " ... ... FAILED\n"
             tmp += format_callstack()
-            break
+            counts["FAILED"] += 1
         finally:
             mail_body.append(tmp)
 
+    summary = "%(Done)s files loaded, %(SKIPPED)s skipped, %(FAILED)s failed"
+    _log.info("LOADJSON: %s: %s", project.fullname, summary % counts)
+    mail_body.extend(["", summary % counts])
+
     try:
         session.commit()
         _log.info(
@@ -22,7 +22,9 @@ Author: Ralph Bean <rbean@redhat.com>
 from __future__ import absolute_import, unicode_literals
 
 import logging
+import os
 import re
+import threading
 
 import flask
 import markdown.inlinepatterns
@@ -31,9 +33,11 @@ import markdown.preprocessors
 import markdown.util
 import pygit2
 import six
+import sqlalchemy.exc
 
 import pagure.lib.query
 from pagure.config import config as pagure_config
+from pagure.lib import model
 
 try:
     from markdown.inlinepatterns import ImagePattern as ImagePattern
@@ -45,6 +49,9 @@ except ImportError:
     MK_VERSION = 3
 
 _log = logging.getLogger(__name__)
+# The projects, issues, PRs, commits and users referenced in the document
+# being converted, resolved before the inline patterns look for them.
+_REFERENCES = threading.local()
 
 
 # the (?<!\w) (and variants) we use a lot in all these regexes is a
@@ -96,7 +103,7 @@ class MentionPattern(markdown.inlinepatterns.Pattern):
 
         name = markdown.util.AtomicString(m.group(2))
         text = "@%s" % name
-        user = pagure.lib.query.search_user(flask.g.session, username=name)
+        user = _user_exists(name)
         if not user:
             return text
 
@@ -124,16 +131,11 @@ class ExplicitLinkPattern(markdown.inlinepatterns.Pattern):
         idx = m.group(6)
         text = "%s#%s" % (repo, idx)
 
-        if not is_fork and user:
-            namespace = user
-            user = None
-
+        user, namespace = _explicit_link_parts(is_fork, user, namespace)
         if namespace:
-            namespace = namespace.rstrip("/")
             text = "%s/%s" % (namespace, text)
         if user:
-            user = user.rstrip("/")
-            text = "%s/%s" % (user.rstrip("/"), text)
+            text = "%s/%s" % (user, text)
 
         try:
             idx = int(idx)
@@ -165,16 +167,11 @@ class CommitLinkPattern(markdown.inlinepatterns.Pattern):
         commitid = m.group(6)
         text = "%s#%s" % (repo, commitid)
 
-        if not is_fork and user:
-            namespace = user
-            user = None
-
+        user, namespace = _explicit_link_parts(is_fork, user, namespace)
         if namespace:
-            namespace = namespace.rstrip("/")
             text = "%s/%s" % (namespace, text)
         if user:
-            user = user.rstrip("/")
-            text = "%s/%s" % (user.rstrip("/"), text)
+            text = "%s/%s" % (user, text)
 
         if pagure.lib.query.search_projects(
             flask.g.session,
@@ -188,6 +185,29 @@ class CommitLinkPattern(markdown.inlinepatterns.Pattern):
         return text
 
 
+class ReferencesPreprocessor(markdown.preprocessors.Preprocessor):
+    """
+    Preprocessor looking for all the issues, PRs, commits and users
+    referenced in the document so they can be retrieved at once instead
+    of one at a time when the inline patterns find them.
+    """
+
+    def run(self, lines):
+        """Resolve the references found in the text, leave it as is."""
+        _log.debug("ReferencesPreprocessor")
+        _REFERENCES.objects = {}
+        _REFERENCES.private = False
+        if not flask.has_app_context() or "session" not in flask.g:
+            # No database to look the references up in
+            return lines
+        try:
+            _resolve_references("\n".join(lines))
+        except (sqlalchemy.exc.SQLAlchemyError, pygit2.GitError):
+            _log.exception("Could not resolve the references in bulk")
+            _REFERENCES.objects = {}
+        return lines
+
+
 class ImplicitIssuePreprocessor(markdown.preprocessors.Preprocessor):
     """
     Preprocessor which handles lines starting with an implicit
@@ -418,6 +438,9 @@ class PagureExtension(markdown.extensions.Extension):
 
         def _old_mardkown_way():
             markdown.inlinepatterns.AUTOLINK_RE = AUTOLINK_RE
+            md.preprocessors.add(
+                "pagure_references", ReferencesPreprocessor(), "_begin"
+            )
             md.preprocessors["implicit_issue"] = ImplicitIssuePreprocessor()
             md.inlinePatterns["mention"] = MentionPattern(MENTION_RE)
             # Customize the image linking to support lazy loading
@@ -455,6 +478,9 @@ class PagureExtension(markdown.extensions.Extension):
             # The number at the end is the priority, the highest priorities are
             # processed first.
 
+            md.preprocessors.register(
+                ReferencesPreprocessor(), "pagure_references", 110
+            )
             md.preprocessors.register(
                 ImplicitIssuePreprocessor(), "implicit_issue", 100
             )
@@ -513,54 +539,220 @@ def makeExtension(*arg, **kwargs):
     return PagureExtension(**kwargs)
 
 
-def _issue_exists(user, namespace, repo, idx):
-    """Utility method checking if a given issue exists."""
+def _get_reference(kind, key):
+    """Return the object of the given kind resolved for the given key in
+    the document being converted, None if it has not been resolved.
+    """
+    objects = getattr(_REFERENCES, "objects", None)
+    if objects is None:
+        return None
+    return objects.get((kind,) + key)
+
+
+def _set_reference(kind, key, obj):
+    """Store the object of the given kind resolved for the given key in
+    the document being converted and return it.
+    """
+    objects = getattr(_REFERENCES, "objects", None)
+    if objects is not None:
+        objects[(kind,) + key] = obj
+    return obj
+
+
+def _explicit_link_parts(is_fork, user, namespace):
+    """Return the user and namespace of the project an explicit link to
+    an issue, PR or commit points to.
+    """
+    if not is_fork and user:
+        namespace = user
+        user = None
+    if namespace:
+        namespace = namespace.rstrip("/")
+    if user:
+        user = user.rstrip("/")
+    return user, namespace
+
+
+def _resolve_references(text):
+    """Retrieve, with a few queries per project, all the issues, PRs,
+    commits and users the given text refers to.
+    """
+    try:
+        current = _get_ns_repo_user()
+    except RuntimeError:
+        current = None
+
+    # (user, namespace, repo): [ids of issues or PRs, commit hashes]
+    projects = {}
+
+    def _project(namespace, repo, user):
+        return projects.setdefault((user, namespace, repo), [set(), set()])
+
+    if pagure_config.get("ENABLE_TICKETS", True):
+        if current:
+            ids = _project(*current)[0]
+            for regex in (IMPLICIT_ISSUE_RE, IMPLICIT_PR_RE):
+                for match in re.finditer(regex, text):
+                    ids.add(int(match.group(1)))
+        for match in re.finditer(EXPLICIT_LINK_RE, text):
+            is_fork, user, namespace, repo = match.groups()[:4]
+            user, namespace = _explicit_link_parts(is_fork, user, namespace)
+            _project(namespace, repo, user)[0].add(int(match.group("id")))
+
+    if current:
+        hashes = _project(*current)[1]
+        for match in re.finditer(IMPLICIT_COMMIT_RE, text):
+            hashes.add(match.group(1))
+
+    for key, (ids, hashes) in projects.items():
+        if not ids and not hashes:
+            # Nothing in the text refers to the current project
+            continue
+        repo_obj = _project_exists(*key)
+        if ids:
+            issues = {}
+            requests = {}
+            if repo_obj:
+                query = flask.g.session.query(model.Issue).filter(
+                    model.Issue.project_id == repo_obj.id,
+                    model.Issue.id.in_(ids),
+                )
+                issues = dict((issue.id, issue) for issue in query)
+                query = flask.g.session.query(model.PullRequest).filter(
+                    model.PullRequest.project_id == repo_obj.id,
+                    model.PullRequest.id.in_(ids),
+                )
+                requests = dict((request.id, request) for request in query)
+            for idx in ids:
+                _set_reference("issue", key + (idx,), issues.get(idx, False))
+                _set_reference("pr", key + (idx,), requests.get(idx, False))
+        if hashes:
+            git_repo = None
+            if repo_obj:
+                # Unlike get_repo_path, do not abort if the git repo is
+                # missing, its commits just do not exist
+                reponame = repo_obj.repopath("main")
+                if os.path.exists(reponame):
+                    git_repo = pygit2.Repository(reponame)
+            for githash in hashes:
+                _set_reference(
+                    "commit",
+                    key + (githash,),
+                    git_repo is not None and githash in git_repo,
+                )
+
+    names = set(re.findall(MENTION_RE, text))
+    if names:
+        query = flask.g.session.query(model.User).filter(
+            model.User.user.in_(names)
+        )
+        users = dict((user.username, user) for user in query)
+        for name in names:
+            _set_reference("user", (name,), users.get(name, False))
+
 
-    repo_obj = pagure.lib.query.get_authorized_project(
-        flask.g.session, project_name=repo, user=user, namespace=namespace
+def _project_exists(user, namespace, repo):
+    """Utility method returning the given project if it exists and the
+    current user may see it.
+    """
+    repo_obj = _get_reference("project", (user, namespace, repo))
+    if repo_obj is not None:
+        return repo_obj
+
+    repo_obj = pagure.lib.query._get_project(
+        flask.g.session, repo, user=user, namespace=namespace
     )
+    if repo_obj and repo_obj.private:
+        # What is linked now depends on who is viewing the document
+        _REFERENCES.private = True
+        if not pagure.utils.is_repo_user(repo_obj):
+            repo_obj = None
+    return _set_reference(
+        "project", (user, namespace, repo), repo_obj or False
+    )
+
+
+def clear_references():
+    """Forget the objects referenced in the document converted last in this
+    thread, so they are not kept around once it is converted.
+    """
+    _REFERENCES.objects = None
+
+
+def depends_on_user():
+    """Return whether the document converted last in this thread refers to
+    private projects, in which case it is rendered differently depending on
+    who views it.
+    """
+    return getattr(_REFERENCES, "private", True)
+
+
+def set_depends_on_user(private):
+    """Record whether the document converted last in this thread refers to
+    private projects, when its conversion is taken from a cache.
+    """
+    _REFERENCES.private = private
+
+
+def _user_exists(username):
+    """Utility method checking if a given user exists."""
+    user = _get_reference("user", (username,))
+    if user is not None:
+        return user
 
+    user = pagure.lib.query.search_user(flask.g.session, username=username)
+    return _set_reference("user", (username,), user or False)
+
+
+def _issue_exists(user, namespace, repo, idx):
+    """Utility method checking if a given issue exists."""
+    issue_obj = _get_reference("issue", (user, namespace, repo, idx))
+    if issue_obj is not None:
+        return issue_obj
+
+    repo_obj = _project_exists(user, namespace, repo)
     if not repo_obj:
         return False
 
     issue_obj = pagure.lib.query.search_issues(
         flask.g.session, repo=repo_obj, issueid=idx
     )
-    if not issue_obj:
-        return False
-
-    return issue_obj
+    return _set_reference(
+        "issue", (user, namespace, repo, idx), issue_obj or False
+    )
 
 
 def _pr_exists(user, namespace, repo, idx):
     """Utility method checking if a given PR exists."""
-    repo_obj = pagure.lib.query.get_authorized_project(
-        flask.g.session, project_name=repo, user=user, namespace=namespace
-    )
+    pr_obj = _get_reference("pr", (user, namespace, repo, idx))
+    if pr_obj is not None:
+        return pr_obj
 
+    repo_obj = _project_exists(user, namespace, repo)
     if not repo_obj:
         return False
 
     pr_obj = pagure.lib.query.search_pull_requests(
         flask.g.session, project_id=repo_obj.id, requestid=idx
     )
-    if not pr_obj:
-        return False
-
-    return pr_obj
+    return _set_reference("pr", (user, namespace, repo, idx), pr_obj or False)
 
 
 def _commit_exists(user, namespace, repo, githash):
     """Utility method checking if a given commit exists."""
-    repo_obj = pagure.lib.query.get_authorized_project(
-        flask.g.session, project_name=repo, user=user, namespace=namespace
-    )
+    exists = _get_reference("commit", (user, namespace, repo, githash))
+    if exists is not None:
+        return exists
+
+    repo_obj = _project_exists(user, namespace, repo)
     if not repo_obj:
         return False
 
     reponame = pagure.utils.get_repo_path(repo_obj)
     git_repo = pygit2.Repository(reponame)
-    return githash in git_repo
+    return _set_reference(
+        "commit", (user, namespace, repo, githash), githash in git_repo
+    )
 
 
 def _obj_anchor_tag(user, namespace, repo, obj, text):
@@ -15,6 +15,7 @@ import logging
 import os
 import subprocess
 import tempfile
+import threading
 
 import flask
 import werkzeug.wsgi
@@ -169,12 +170,34 @@ def proxy_raw_git(project):
         _log.debug("Running git via git directly")
         cmd = ["/usr/bin/git", "http-backend"]
 
+    if pagure_config.get("HTTP_REPO_ACCESS_STREAMING", False):
+        # Stream the input to git from a separate thread, so that we can
+        # read its output at the same time without risking a dead-lock
+        # (See the warnings in the subprocess module)
+        _log.debug("Calling: %s", cmd)
+        proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=None,
+            env=gitenv,
+        )
+        pump = threading.Thread(
+            target=_pump_request_body,
+            args=(
+                flask.request.stream,
+                proc.stdin,
+                pagure_config.get("HTTP_REPO_ACCESS_CHUNK_SIZE", 65536),
+            ),
+        )
+        pump.daemon = True
+        pump.start()
+        return _git_response(proc)
+
     # Note: using a temporary files to buffer the input contents
     # is non-ideal, but it is a way to make sure we don't need to have
     # the full input (which can be very long) in memory.
-    # Ideally, we'd directly stream, but that's an RFE for the future,
-    # since that needs to happen in other threads so as to not block.
-    # (See the warnings in the subprocess module)
+    # Setting HTTP_REPO_ACCESS_STREAMING allows streaming it directly.
     with tempfile.SpooledTemporaryFile() as infile:
         while True:
             block = flask.request.stream.read(4096)
@@ -188,37 +211,68 @@ def proxy_raw_git(project):
             cmd, stdin=infile, stdout=subprocess.PIPE, stderr=None, env=gitenv
         )
 
-        out = proc.stdout
+        return _git_response(proc)
+
 
-        # First, gather the response head
-        headers = {}
+def _pump_request_body(stream, stdin, chunk_size):
+    """Copy the body of the request into the standard input of the git
+    process, chunk by chunk.
+
+    Writing to the pipe blocks until git has consumed the data previously
+    sent, so no more than one chunk and the pipe buffer are held in memory
+    whatever the size of the pack pushed.
+    """
+    try:
         while True:
-            line = out.readline()
-            if not line:
-                raise Exception("End of file while reading headers?")
-            # This strips the \n, meaning end-of-headers
-            line = line.strip()
-            if not line:
+            block = stream.read(chunk_size)
+            if not block:
                 break
-            header = line.split(b": ", 1)
-            header[0] = header[0].decode("utf-8")
-            headers[str(header[0].lower())] = header[1]
-
-        if len(headers) == 0:
-            raise Exception("No response at all received")
-
-        if "status" not in headers:
-            # If no status provided, assume 200 OK as per RFC3875
-            headers[str("status")] = "200 OK"
-
-        respcode, respmsg = headers.pop("status").split(" ", 1)
-        wrapout = werkzeug.wsgi.wrap_file(flask.request.environ, out)
-        return flask.Response(
-            wrapout,
-            status=int(respcode),
-            headers=headers,
-            direct_passthrough=True,
-        )
+            stdin.write(block)
+    except (IOError, OSError) as err:
+        # git stopped reading its input, it will report why in its output
+        _log.info("Stopped sending the request to git: %s", err)
+    finally:
+        try:
+            stdin.close()
+        except (IOError, OSError):
+            pass
+
+
+def _git_response(proc):
+    """Return a flask.Response streaming back the output of the specified
+    git process (running git http-backend or gitolite-shell).
+    """
+    out = proc.stdout
+
+    # First, gather the response head
+    headers = {}
+    while True:
+        line = out.readline()
+        if not line:
+            raise Exception("End of file while reading headers?")
+        # This strips the \n, meaning end-of-headers
+        line = line.strip()
+        if not line:
+            break
+        header = line.split(b": ", 1)
+        header[0] = header[0].decode("utf-8")
+        headers[str(header[0].lower())] = header[1]
+
+    if len(headers) == 0:
+        raise Exception("No response at all received")
+
+    if "status" not in headers:
+        # If no status provided, assume 200 OK as per RFC3875
+        headers[str("status")] = "200 OK"
+
+    respcode, respmsg = headers.pop("status").split(" ", 1)
+    wrapout = werkzeug.wsgi.wrap_file(flask.request.environ, out)
+    return flask.Response(
+        wrapout,
+        status=int(respcode),
+        headers=headers,
+        direct_passthrough=True,
+    )
 
 
 def clone_proxy(project, username=None, namespace=None):
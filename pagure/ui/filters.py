@@ -545,6 +545,15 @@ def markdown_filter(text):
     return pagure.lib.query.text2markdown(text)
 
 
+@UI_NS.app_template_filter("rendered_html")
+def rendered_html_filter(obj, field):
+    """Template filter returning the html rendering of the markdown field
+    of an issue, a pull-request or a comment, using the one stored in the
+    database when it is still valid.
+    """
+    return pagure.lib.query.get_rendered_html(obj, field)
+
+
 @UI_NS.app_template_filter("patch_to_diff")
 def patch_to_diff(patch):
     """Render a hunk as a diff"""
@@ -354,6 +354,13 @@ def request_pull(repo, requestid, username=None, namespace=None):
     can_delete_branch = (
         pagure_config.get("ALLOW_DELETE_BRANCH", True) and can_rebase_branch
     )
+
+    pagure.lib.query.update_rendered_html(
+        flask.g.session,
+        [(request, "initial_comment")]
+        + [(comment, "comment") for comment in request.comments],
+    )
+
     return flask.render_template(
         "repo_pull_request.html",
         select="requests",
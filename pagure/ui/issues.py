@@ -1170,6 +1170,12 @@ def view_issue(repo, issueid, username=None, namespace=None):
 
     open_access = repo.settings.get("open_metadata_access_to_all", False)
 
+    pagure.lib.query.update_rendered_html(
+        flask.g.session,
+        [(issue, "content")]
+        + [(comment, "comment") for comment in issue.comments],
+    )
+
     return flask.render_template(
         "issue.html",
         select="issues",
@@ -27,7 +27,6 @@ import re
 from math import ceil
 
 import flask
-import kitchen.text.converters as ktc
 import pygit2
 import six
 import werkzeug.utils
@@ -43,6 +42,7 @@ import pagure.lib.git
 import pagure.lib.mimetype
 import pagure.lib.plugins
 import pagure.lib.query
+import pagure.lib.render_cache
 import pagure.lib.tasks
 import pagure.ui.plugins
 from pagure.config import config as pagure_config
@@ -58,14 +58,33 @@ from pagure.lib import encoding_utils
 from pagure.ui import UI_NS
 from pagure.utils import (
     __get_file_in_tree,
+    cache_response,
+    get_etag,
+    is_cacheable_page,
+    is_full_oid,
+    is_not_modified,
     is_true,
     login_required,
+    not_modified_response,
     stream_template,
 )
 
 _log = logging.getLogger(__name__)
 
 
+def _get_repo_state(repo, repo_obj):
+    """Return what the HTML pages of a project show besides the git content
+    they are about, to be part of their ETag: the heads of the branches
+    listed in the branch selector and the number of stars and forks of the
+    project, none of which update its ``date_modified``.
+    """
+    heads = [
+        (branch, "%s" % repo_obj.lookup_branch(branch).target)
+        for branch in flask.g.branches
+    ]
+    return heads + [len(repo.stargazers), len(repo.forks)]
+
+
 def get_preferred_readme(tree):
     """Establish some order about which README gets displayed
     if there are several in the repository. If none of the listed
@@ -157,11 +176,11 @@ def view_repo(repo, username=None, namespace=None):
     readmefile = get_preferred_readme(tree)
     if readmefile:
         name, ext = os.path.splitext(readmefile.name)
-        content = __get_file_in_tree(
+        readme_blob = __get_file_in_tree(
             repo_obj, last_commits[0].tree, [readmefile.name]
-        ).data
+        )
         readme, safe = pagure.doc_utils.convert_readme(
-            content,
+            readme_blob.data,
             ext,
             view_file_url=flask.url_for(
                 "ui_ns.view_raw_file",
@@ -170,6 +189,7 @@ def view_repo(repo, username=None, namespace=None):
                 identifier=branchname,
                 filename="",
             ),
+            oid=readme_blob.oid.hex,
         )
     return flask.render_template(
         "repo_info.html",
@@ -534,6 +554,17 @@ def view_file(repo, identifier, filename, username=None, namespace=None):
     if isinstance(commit, pygit2.Tag):
         commit = commit.peel(pygit2.Commit)
 
+    etag = None
+    if commit is not None and is_cacheable_page():
+        etag = get_etag(
+            commit.oid.hex,
+            flask.request.full_path,
+            repo.date_modified,
+            *_get_repo_state(repo, repo_obj),
+        )
+        if is_not_modified(etag):
+            return not_modified_response(etag, private=repo.private)
+
     tree = None
     if isinstance(commit, pygit2.Tree):
         tree = commit
@@ -588,24 +619,19 @@ def view_file(repo, identifier, filename, username=None, namespace=None):
                 _log.debug("Failed to load image %s, error: %s", filename, err)
                 output_type = "binary"
         elif ext in (".rst", ".mk", ".md", ".markdown") and not rawtext:
-            content, safe = pagure.doc_utils.convert_readme(content.data, ext)
+            content, safe = pagure.doc_utils.convert_readme(
+                content.data, ext, oid=content.oid.hex
+            )
             output_type = "markup"
         elif "data" in dir(content) and not isbinary:
-            file_content = None
             try:
-                file_content = encoding_utils.decode(
-                    ktc.to_bytes(content.data)
-                )
+                content = pagure.lib.render_cache.decode_blob(content)
+                output_type = "file"
             except pagure.exceptions.PagureException:
                 # We cannot decode the file, so let's pretend it's a binary
                 # file and let the user download it instead of displaying
                 # it.
                 output_type = "binary"
-            if file_content is not None:
-                output_type = "file"
-                content = encoding_utils.decode(content.data)
-            else:
-                output_type = "binary"
         elif not isbinary:
             output_type = "file"
             huge = True
@@ -622,12 +648,10 @@ def view_file(repo, identifier, filename, username=None, namespace=None):
             if not isinstance(name, six.text_type):
                 name = name.decode("utf-8")
             if name == "README":
-                readme_file = __get_file_in_tree(
-                    repo_obj, content, [i.name]
-                ).data
+                readme_blob = __get_file_in_tree(repo_obj, content, [i.name])
 
                 readme, safe = pagure.doc_utils.convert_readme(
-                    readme_file, ext
+                    readme_blob.data, ext, oid=readme_blob.oid.hex
                 )
 
                 readme_ext = ext
@@ -642,7 +666,7 @@ def view_file(repo, identifier, filename, username=None, namespace=None):
             namespace=namespace,
         )
 
-    return flask.Response(
+    response = flask.Response(
         flask.stream_with_context(
             stream_template(
                 flask.current_app,
@@ -664,6 +688,9 @@ def view_file(repo, identifier, filename, username=None, namespace=None):
         200,
         headers,
     )
+    if etag:
+        response = cache_response(response, etag, private=repo.private)
+    return response
 
 
 @UI_NS.route("/<repo>/raw/<path:identifier>")
@@ -701,6 +728,16 @@ def view_raw_file(
     if isinstance(commit, pygit2.Tag):
         commit = commit.peel(pygit2.Commit)
 
+    # The content only depends on the object and the path requested, so it
+    # can be validated before being read
+    etag = get_etag(commit.oid.hex, filename)
+    immutable = is_full_oid(identifier)
+    private = flask.g.repo.private
+    if is_not_modified(etag):
+        return not_modified_response(
+            etag, immutable=immutable, private=private
+        )
+
     if filename:
         if isinstance(commit, pygit2.Blob):
             content = commit
@@ -729,7 +766,12 @@ def view_raw_file(
     if not data:
         flask.abort(404, description="No content found")
 
-    return (data, 200, pagure.lib.mimetype.get_type_headers(filename, data))
+    return cache_response(
+        (data, 200, pagure.lib.mimetype.get_type_headers(filename, data)),
+        etag,
+        immutable=immutable,
+        private=private,
+    )
 
 
 @UI_NS.route("/<repo>/blame/<path:filename>")
@@ -914,6 +956,20 @@ def view_commit(repo, commitid, username=None, namespace=None):
             )
         )
 
+    flags = pagure.lib.query.get_commit_flag(flask.g.session, repo, commitid)
+
+    etag = None
+    if is_cacheable_page():
+        etag = get_etag(
+            commit.oid.hex,
+            flask.request.full_path,
+            repo.date_modified,
+            *_get_repo_state(repo, repo_obj),
+            *[(flag.uid, flag.date_updated) for flag in flags],
+        )
+        if is_not_modified(etag):
+            return not_modified_response(etag, private=repo.private)
+
     if commit.parents:
         diff = repo_obj.diff(commit.parents[0], commit)
     else:
@@ -923,7 +979,7 @@ def view_commit(repo, commitid, username=None, namespace=None):
     if diff:
         diff.find_similar()
 
-    return flask.render_template(
+    response = flask.render_template(
         "commit.html",
         select="commits",
         repo=repo,
@@ -933,10 +989,11 @@ def view_commit(repo, commitid, username=None, namespace=None):
         commit=commit,
         diff=diff,
         splitview=splitview,
-        flags=pagure.lib.query.get_commit_flag(
-            flask.g.session, repo, commitid
-        ),
+        flags=flags,
     )
+    if etag:
+        response = cache_response(response, etag, private=repo.private)
+    return response
 
 
 @UI_NS.route("/<repo>/c/<commitid>.patch")
@@ -991,6 +1048,14 @@ def view_commit_patch_or_diff(
         else:
             flask.abort(404, description="Commit not found")
 
+    etag = get_etag(commit.oid.hex, diff, is_js)
+    immutable = is_full_oid(commitid)
+    private = flask.g.repo.private
+    if is_not_modified(etag):
+        return not_modified_response(
+            etag, immutable=immutable, private=private
+        )
+
     if is_js:
         patches = pagure.lib.git.commit_to_patch(
             repo_obj, commit, diff_view=True, find_similar=True, separated=True
@@ -1000,12 +1065,16 @@ def view_commit_patch_or_diff(
         for idx, patch in enumerate(patches):
             diffs[idx + 1] = patch
 
-        return flask.jsonify(diffs)
+        response = flask.jsonify(diffs)
     else:
         patch = pagure.lib.git.commit_to_patch(
             repo_obj, commit, diff_view=diff
         )
-        return flask.Response(patch, content_type="text/plain;charset=UTF-8")
+        response = flask.Response(
+            patch, content_type="text/plain;charset=UTF-8"
+        )
+
+    return cache_response(response, etag, immutable=immutable, private=private)
 
 
 @UI_NS.route("/<repo>/tree/")
@@ -1032,6 +1101,7 @@ def view_tree(repo, identifier=None, username=None, namespace=None):
     readme = None
     safe = False
     readme_ext = None
+    etag = None
     if not repo_obj.is_empty:
         if identifier in repo_obj.listall_branches():
             branchname = identifier
@@ -1058,23 +1128,33 @@ def view_tree(repo, identifier=None, username=None, namespace=None):
             commit = commit.peel(pygit2.Commit)
             branchname = commit.oid.hex
 
+        if commit is not None and is_cacheable_page():
+            etag = get_etag(
+                commit.oid.hex,
+                flask.request.full_path,
+                repo.date_modified,
+                *_get_repo_state(repo, repo_obj),
+            )
+            if is_not_modified(etag):
+                return not_modified_response(etag, private=repo.private)
+
         if commit and not isinstance(commit, pygit2.Blob):
             content = sorted(commit.tree, key=lambda x: x.filemode)
             for i in commit.tree:
                 name, ext = os.path.splitext(i.name)
                 if name == "README":
-                    readme_file = __get_file_in_tree(
+                    readme_blob = __get_file_in_tree(
                         repo_obj, commit.tree, [i.name]
-                    ).data
+                    )
 
                     readme, safe = pagure.doc_utils.convert_readme(
-                        readme_file, ext
+                        readme_blob.data, ext, oid=readme_blob.oid.hex
                     )
 
                     readme_ext = ext
         output_type = "tree"
 
-    return flask.render_template(
+    response = flask.render_template(
         "file.html",
         select="tree",
         origin="view_tree",
@@ -1088,6 +1168,9 @@ def view_tree(repo, identifier=None, username=None, namespace=None):
         readme_ext=readme_ext,
         safe=safe,
     )
+    if etag:
+        response = cache_response(response, etag, private=repo.private)
+    return response
 
 
 @UI_NS.route("/<repo>/releases/")
@@ -2307,8 +2390,7 @@ def regenerate_git(repo, username=None, namespace=None):
                 pagure.lib.git.reinit_git(
                     project=repo, repofolder=pagure_config["REQUESTS_FOLDER"]
                 )
-            for request in repo.requests:
-                pagure.lib.git.update_git(request, repo=repo)
+            pagure.lib.git.update_git(repo.requests, repo=repo)
             flask.flash("Requests git repo updating")
 
         elif (
@@ -2323,8 +2405,7 @@ def regenerate_git(repo, username=None, namespace=None):
                 pagure.lib.git.reinit_git(
                     project=repo, repofolder=pagure_config["TICKETS_FOLDER"]
                 )
-            for ticket in repo.issues:
-                pagure.lib.git.update_git(ticket, repo=repo)
+            pagure.lib.git.update_git(repo.issues, repo=repo)
             flask.flash("Tickets git repo updating")
 
     return flask.redirect(
@@ -12,6 +12,8 @@ from __future__ import absolute_import, unicode_literals
 
 import datetime
 import fnmatch
+import hashlib
+import json
 import logging
 import logging.config
 import os
@@ -21,9 +23,11 @@ from functools import wraps
 import flask
 import pygit2
 import six
+import sqlalchemy.orm
 import werkzeug.utils
 from six.moves.urllib.parse import urljoin, urlparse
 
+import pagure
 from pagure.config import config as pagure_config
 from pagure.exceptions import (
     InvalidDateformatException,
@@ -34,6 +38,9 @@ from pagure.exceptions import (
 _log = logging.getLogger(__name__)
 LOGGER_SETUP = False
 
+# A full SHA-1 or SHA-256 git object ID
+FULL_OID_RE = re.compile(r"^(?:[0-9a-f]{40}|[0-9a-f]{64})$")
+
 
 def set_up_logging(app=None, force=False, configkey="LOGGING"):
     global LOGGER_SETUP
@@ -192,6 +199,110 @@ def is_admin():
     return not groups.isdisjoint(admins)
 
 
+def _get_repo_access_from_redis(key):
+    """Return the access cached in redis under the given key, if any."""
+    import pagure.lib.query
+
+    if not pagure.lib.query.REDIS:
+        return None
+    try:
+        access = pagure.lib.query.REDIS.get(key)
+    except Exception:  # pragma: no cover
+        _log.exception("Could not read the access of the user")
+        return None
+    if access is not None:
+        access = json.loads(access)
+    return access
+
+
+def get_repo_access(repo_obj, username=None, session=None):
+    """Return the access the user has on the provided repo, directly or
+    via the groups of the project, as returned by
+    :func:`pagure.lib.query.get_user_project_access`.
+
+    The access is only looked up once per request for a given user and
+    project, and cached in redis for ``REPO_ACCESS_CACHE_TTL`` seconds if
+    that is set.
+
+    :arg repo_obj: the project to check the access of
+    :arg username: the user to check the access of, defaults to the user
+        currently logged in
+    :arg session: the session to use to connect to the database, defaults
+        to the one of the project or else the one of the request
+    :return: the access of the user, None if there is no user
+    :rtype: dict or None
+    """
+    import pagure.lib.query
+
+    if username is None:
+        if not authenticated():
+            return None
+        username = flask.g.fas_user.username
+
+    cache = None
+    if flask.has_app_context():
+        cache = flask.g.setdefault("repo_access", {})
+        access = cache.get((repo_obj.id, username))
+        if access is not None:
+            return access
+
+    ttl = pagure_config.get("REPO_ACCESS_CACHE_TTL", 0)
+    key = "pagure.repo_access.%s.%s" % (repo_obj.id, username)
+    access = None
+    if ttl:
+        access = _get_repo_access_from_redis(key)
+
+    if access is None:
+        if not session:
+            session = (
+                sqlalchemy.orm.object_session(repo_obj) or flask.g.session
+            )
+        access = pagure.lib.query.get_user_project_access(
+            session, repo_obj, username
+        )
+        if ttl and pagure.lib.query.REDIS:
+            try:
+                pagure.lib.query.REDIS.setex(key, ttl, json.dumps(access))
+            except Exception:  # pragma: no cover
+                _log.exception("Could not cache the access of the user")
+
+    if cache is not None:
+        cache[(repo_obj.id, username)] = access
+    return access
+
+
+@sqlalchemy.event.listens_for(sqlalchemy.orm.Session, "after_commit")
+def _clear_repo_access(session):
+    """Forget the access looked up during the request once something is
+    committed to the database, since it may have changed them.
+    """
+    if flask.has_app_context():
+        flask.g.pop("repo_access", None)
+
+
+def _has_group_access(access, levels, usergroups=None):
+    """Return whether the user is in a group of the project having one of
+    the given access levels.
+    """
+    for group_name, group in access["groups"].items():
+        if group["access"] in levels and (
+            group["member"] or group_name in (usergroups or ())
+        ):
+            return True
+    return False
+
+
+def _match_branches(patterns, refname):
+    """Return whether the given git reference is matched by one of the
+    given branches patterns.
+    """
+    for pattern in patterns:
+        pattern = "refs/heads/{}".format(pattern)
+        if fnmatch.fnmatch(refname, pattern):
+            return True
+    return False
+
+
 def is_repo_admin(repo_obj, username=None):
     """Return whether the user is an admin of the provided repo."""
     if not authenticated():
@@ -205,13 +316,11 @@ def is_repo_admin(repo_obj, username=None):
     if is_admin():
         return True
 
-    usergrps = [usr.user for grp in repo_obj.admin_groups for usr in grp.users]
+    if user == repo_obj.user.user:
+        return True
 
-    return (
-        user == repo_obj.user.user
-        or (user in [usr.user for usr in repo_obj.admins])
-        or (user in usergrps)
-    )
+    access = get_repo_access(repo_obj, user)
+    return "admin" in access["access"] or _has_group_access(access, ("admin",))
 
 
 def is_repo_committer(repo_obj, username=None, session=None):
@@ -227,12 +336,8 @@ def is_repo_committer(repo_obj, username=None, session=None):
         username = flask.g.fas_user.username
         usergroups = set(flask.g.fas_user.groups)
 
-    if not session:
-        session = flask.g.session
-    try:
-        user = pagure.lib.query.get_user(session, username)
-        usergroups = usergroups.union(set(user.groups))
-    except pagure.exceptions.PagureException:
+    access = get_repo_access(repo_obj, username, session=session)
+    if not access["exists"]:
         return False
 
     # If the user is main admin -> yep
@@ -240,18 +345,20 @@ def is_repo_committer(repo_obj, username=None, session=None):
         return True
 
     # If they are in the list of committers -> yep
-    for user in repo_obj.committers:
-        if user.user == username:
-            return True
+    if set(access["access"]) & set(["commit", "admin"]):
+        return True
 
     # If they are in a group that has commit access -> yep
-    for group in repo_obj.committer_groups:
-        if group.group_name in usergroups:
-            return True
+    if _has_group_access(access, ("admin", "commit"), usergroups):
+        return True
 
     # If no direct committer, check EXTERNAL_COMMITTER info
     ext_committer = pagure_config.get("EXTERNAL_COMMITTER", None)
     if ext_committer:
+        if not session:
+            session = flask.g.session
+        user = pagure.lib.query.get_user(session, username)
+        usergroups = usergroups.union(set(user.groups))
         overlap = set(ext_committer) & usergroups
         if overlap:
             for grp in overlap:
@@ -277,51 +384,39 @@ def is_repo_collaborator(repo_obj, refname, username=None, session=None):
         _log.debug("User is a committer")
         return committer
 
-    import pagure.lib.query
-
     if username is None:
         if not authenticated():
             return False
         if is_admin():
             return True
         username = flask.g.fas_user.username
-        usergroups = set(flask.g.fas_user.groups)
 
-    if not session:
-        session = flask.g.session
-    try:
-        user = pagure.lib.query.get_user(session, username)
-        usergroups = set(user.groups)
-    except pagure.exceptions.PagureException:
+    access = get_repo_access(repo_obj, username, session=session)
+    if not access["exists"]:
         return False
 
     # If they are in the list of committers -> maybe
-    for user in repo_obj.collaborators:
-        if user.user.username == username:
-            # if branch is None when the user tries to read,
-            # so we'll allow that
-            if refname is None:
-                return True
-            # If the branch is specified: the user is trying to write, we'll
-            # check if they are allowed to
-            for pattern in user.branches.split(","):
-                pattern = "refs/heads/{}".format(pattern.strip())
-                if fnmatch.fnmatch(refname, pattern):
-                    return True
+    if "collaborator" in access["access"]:
+        # if branch is None when the user tries to read,
+        # so we'll allow that
+        if refname is None:
+            return True
+        # If the branch is specified: the user is trying to write, we'll
+        # check if they are allowed to
+        if _match_branches(access["branches"], refname):
+            return True
 
     # If they are in a group that has commit access -> maybe
-    for project_group in repo_obj.collaborator_project_groups:
-        if project_group.group.group_name in usergroups:
+    for group in access["groups"].values():
+        if group["access"] == "collaborator" and group["member"]:
             # if branch is None when the user tries to read,
             # so we'll allow that
             if refname is None:
                 return True
             # If the branch is specified: the user is trying to write, we'll
             # check if they are allowed to
-            for pattern in project_group.branches.split(","):
-                pattern = "refs/heads/{}".format(pattern.strip())
-                if fnmatch.fnmatch(refname, pattern):
-                    return True
+            if _match_branches(group["branches"], refname):
+                return True
 
     return False
 
@@ -338,12 +433,12 @@ def is_repo_user(repo_obj, username=None):
     if is_admin():
         return True
 
-    usergrps = [usr.user for grp in repo_obj.groups for usr in grp.users]
+    if user == repo_obj.user.user:
+        return True
 
-    return (
-        user == repo_obj.user.user
-        or (user in [usr.user for usr in repo_obj.users])
-        or (user in usergrps)
+    access = get_repo_access(repo_obj, user)
+    return bool(access["access"]) or any(
+        group["member"] for group in access["groups"].values()
     )
 
 
@@ -742,6 +837,81 @@ def stream_template(app, template_name, **context):
     return rv
 
 
+def is_full_oid(identifier):
+    """Returns whether the given identifier is a full git object ID, ie:
+    one which always points to the same content, unlike a branch, a tag
+    or an abbreviated object ID.
+    """
+    return bool(identifier and FULL_OID_RE.match(identifier))
+
+
+def get_etag(*parts):
+    """Returns the ETag of a content, computed from the given parts and
+    from the version of pagure and the theme rendering it.
+
+    :arg parts: the values the content depends on, starting with the ID of
+        the git object it was generated from
+
+    """
+    etag = hashlib.sha1()
+    for part in (pagure.__version__, pagure_config.get("THEME")) + parts:
+        etag.update(("%s\0" % (part,)).encode("utf-8"))
+    return etag.hexdigest()
+
+
+def is_cacheable_page():
+    """Returns whether the HTML page being rendered only depends on the
+    git content and on the project, ie: it is viewed anonymously and no
+    message is waiting to be flashed in it.
+    """
+    return not authenticated() and "_flashes" not in flask.session
+
+
+def is_not_modified(etag):
+    """Returns whether the client already holds the content of the given
+    ETag, via the If-None-Match header of the request.
+    """
+    return etag in flask.request.if_none_match
+
+
+def not_modified_response(etag, immutable=False, private=False):
+    """Returns a 304 Not Modified response for the given ETag."""
+    return cache_response(
+        flask.Response(status=304), etag, immutable=immutable, private=private
+    )
+
+
+def cache_response(response, etag, immutable=False, private=False):
+    """Sets the validators and the caching policy of the given response.
+
+    :arg response: the response to cache, anything flask can make a
+        response of
+    :arg etag: the ETag of the content of the response, as returned by
+        :func:`get_etag`
+    :kwarg immutable: whether the content can never change, ie: it was
+        requested using a full object ID, in which case it is cached for
+        a year, otherwise clients have to revalidate it on each use
+    :kwarg private: whether only the client may cache the response,
+        ie: it belongs to a private project
+    :return: the response
+
+    """
+    response = flask.make_response(response)
+    response.set_etag(etag)
+    if private:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    if immutable:
+        response.cache_control.max_age = pagure_config.get(
+            "IMMUTABLE_CACHE_MAX_AGE", 31536000
+        )
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
 def is_true(value, trueish=("1", "true", "t", "y")):
     if isinstance(value, bool):
         return value
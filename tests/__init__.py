@@ -38,6 +38,7 @@ import mock
 import pygit2
 import redis
 import six
+import sqlalchemy
 
 from bs4 import BeautifulSoup
 from celery.app.task import EagerResult
@@ -61,6 +62,7 @@ import pagure.lib.git
 import pagure.lib.login
 import pagure.lib.model
 import pagure.lib.query
+import pagure.lib.render_cache
 import pagure.lib.tasks_mirror
 import pagure.perfrepo as perfrepo
 from pagure.config import config as pagure_config, reload_config
@@ -314,8 +316,38 @@ class SimplePagureTest(unittest.TestCase):
         perfrepo.reset_stats()
         perfrepo.REQUESTS = []
 
+    @contextmanager
+    def assertMaxQueries(self, max_queries):
+        """Check that the code run in this context does not run more than
+        the given number of SQL queries."""
+        queries = []
+
+        def count_query(conn, cursor, statement, *args):
+            queries.append(statement)
+
+        sqlalchemy.event.listen(
+            sqlalchemy.engine.Engine, "before_cursor_execute", count_query
+        )
+        try:
+            yield queries
+        finally:
+            sqlalchemy.event.remove(
+                sqlalchemy.engine.Engine, "before_cursor_execute", count_query
+            )
+        self.assertLessEqual(
+            len(queries),
+            max_queries,
+            "%s SQL queries run, at most %s allowed"
+            % (len(queries), max_queries),
+        )
+
     def setUp(self):
 
+        # Do not re-use the markdown and the files rendered by a previous
+        # test
+        pagure.lib.query._MARKDOWN_CACHE.clear()
+        pagure.lib.render_cache.clear()
+
         self.dbfolder = tempfile.mkdtemp(prefix="pagure-tests-")
         self.dbpath = "sqlite:///%s/db.sqlite" % self.dbfolder
         session = pagure.lib.model.create_tables(
@@ -15,6 +15,7 @@ import shutil
 import sys
 import os
 
+import flask
 import mock
 import munch
 import pygit2
@@ -501,6 +502,58 @@ class PagureGetRemoteRepoPath(tests.SimplePagureTest):
             )
             self.assertTrue(output)
 
+    def test_get_repo_access_cached(self):
+        """Test that the access of the user is only looked up once per
+        request and forgotten once something is committed."""
+        repo = pagure.lib.query._get_project(self.session, "test")
+        msg = pagure.lib.query.add_user_to_project(
+            self.session,
+            project=repo,
+            new_user="foo",
+            user="pingou",
+            access="collaborator",
+            branches="epel*, f3*",
+        )
+        self.session.commit()
+        self.assertEqual(msg, "User added")
+
+        with self.app.application.test_request_context("/test"):
+            flask.g.fas_user = tests.FakeUser(username="foo")
+            flask.g.session = self.session
+            with mock.patch(
+                "pagure.lib.query.get_user_project_access",
+                side_effect=pagure.lib.query.get_user_project_access,
+            ) as get_access:
+                self.assertEqual(
+                    pagure.utils.get_repo_access(repo),
+                    {
+                        "exists": True,
+                        "access": ["collaborator"],
+                        "branches": ["epel*", "f3*"],
+                        "groups": {},
+                    },
+                )
+                self.assertFalse(pagure.utils.is_repo_admin(repo))
+                self.assertFalse(pagure.utils.is_repo_committer(repo))
+                self.assertTrue(pagure.utils.is_repo_user(repo))
+                self.assertTrue(
+                    pagure.utils.is_repo_collaborator(repo, "refs/heads/f35")
+                )
+                self.assertEqual(get_access.call_count, 1)
+
+                msg = pagure.lib.query.add_user_to_project(
+                    self.session,
+                    project=repo,
+                    new_user="foo",
+                    user="pingou",
+                    access="commit",
+                )
+                self.session.commit()
+                self.assertEqual(msg, "User access updated")
+
+                self.assertTrue(pagure.utils.is_repo_committer(repo))
+                self.assertEqual(get_access.call_count, 2)
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)
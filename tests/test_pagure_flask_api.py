@@ -176,7 +176,7 @@ class PagureFlaskApitests(tests.SimplePagureTest):
         output = self.app.get("/api/0/-/error_codes")
         self.assertEqual(output.status_code, 200)
         data = json.loads(output.get_data(as_text=True))
-        self.assertEqual(len(data), 47)
+        self.assertEqual(len(data), 48)
         self.assertEqual(
             sorted(data.keys()),
             sorted(
@@ -189,6 +189,7 @@ class PagureFlaskApitests(tests.SimplePagureTest):
                     "EGITERROR",
                     "EINVALIDISSUEFIELD",
                     "EINVALIDISSUEFIELD_LINK",
+                    "EINVALIDCURSOR",
                     "EINVALIDPERPAGEVALUE",
                     "EINVALIDPRIORITY",
                     "EINVALIDREQ",
@@ -336,6 +336,84 @@ class PagureFlaskApiForktests(tests.Modeltests):
         )
         self.assertEqual(data["total_requests"], 1)
 
+    def test_api_pull_request_views_queries(self):
+        """Test the number of SQL queries run by api_pull_request_views
+        does not depend on the number of pull-requests returned."""
+        tests.create_projects(self.session)
+        tests.create_projects(
+            self.session, is_fork=True, user_id=2, hook_token_suffix="foo"
+        )
+        repo = pagure.lib.query._get_project(self.session, "test")
+        forked_repo = pagure.lib.query._get_project(
+            self.session, "test", user="foo"
+        )
+        for idx in range(1, 31):
+            req = pagure.lib.model.PullRequest(
+                id=idx,
+                uid="pr%s" % idx,
+                title="test pull-request #%s" % idx,
+                project_id=repo.id,
+                project_id_from=forked_repo.id,
+                branch="master",
+                branch_from="feature%s" % idx,
+                user_id=2,
+            )
+            self.session.add(req)
+            self.session.add(
+                pagure.lib.model.PullRequestComment(
+                    pull_request_uid=req.uid, comment="Looks good", user_id=1
+                )
+            )
+        self.session.commit()
+
+        with self.assertMaxQueries(45):
+            output = self.app.get("/api/0/test/pull-requests?per_page=100")
+        self.assertEqual(output.status_code, 200)
+        data = json.loads(output.get_data(as_text=True))
+        self.assertEqual(data["total_requests"], 30)
+        request = data["requests"][0]
+        self.assertEqual(request["user"]["name"], "foo")
+        self.assertEqual(request["project"]["fullname"], "test")
+        self.assertEqual(request["repo_from"]["fullname"], "forks/foo/test")
+        self.assertEqual(request["repo_from"]["parent"]["fullname"], "test")
+        self.assertEqual(request["comments"][0]["user"]["name"], "pingou")
+
+    def test_api_pull_request_views_cursor(self):
+        """Test the api_pull_request_views method of the flask api when
+        paginating with a cursor."""
+        tests.create_projects(self.session)
+        repo = pagure.lib.query._get_project(self.session, "test")
+        for idx in range(1, 6):
+            self.session.add(
+                pagure.lib.model.PullRequest(
+                    id=idx,
+                    uid="pr%s" % idx,
+                    title="test pull-request #%s" % idx,
+                    project_id=repo.id,
+                    project_id_from=repo.id,
+                    branch="master",
+                    branch_from="feature%s" % idx,
+                    user_id=1,
+                )
+            )
+        self.session.commit()
+
+        uids = []
+        url = "/api/0/test/pull-requests?per_page=2&after="
+        while url:
+            output = self.app.get(url)
+            self.assertEqual(output.status_code, 200)
+            data = json.loads(output.get_data(as_text=True))
+            self.assertEqual(data["total_requests"], 5)
+            self.assertEqual(data["pagination"]["pages"], 3)
+            uids.extend(request["uid"] for request in data["requests"])
+            url = data["pagination"]["next"]
+
+        # Each pull-request is returned once, latest first
+        self.assertEqual(len(uids), 5)
+        self.assertEqual(sorted(uids), ["pr1", "pr2", "pr3", "pr4", "pr5"])
+        self.assertEqual(uids[0], "pr5")
+
     @patch("pagure.lib.notify.send_email")
     def test_api_pull_request_views(self, send_email):
         """Test the api_pull_request_views method of the flask api."""
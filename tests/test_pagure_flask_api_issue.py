@@ -1315,6 +1315,83 @@ class PagureFlaskApiIssuetests(tests.SimplePagureTest):
 
         self.assertDictEqual(data, {"issue": exp, "message": "Issue created"})
 
+    def test_api_view_issues_cursor(self):
+        """Test the api_view_issues method of the flask api when paginating
+        with a cursor."""
+        tests.create_projects(self.session)
+        repo = pagure.lib.query._get_project(self.session, "test")
+        for idx in range(5):
+            pagure.lib.query.new_issue(
+                self.session,
+                repo=repo,
+                title="Test issue #%s" % idx,
+                content="We should work on this",
+                user="pingou",
+            )
+        self.session.commit()
+
+        ids = []
+        url = "/api/0/test/issues?per_page=2&order=asc&after="
+        while url:
+            output = self.app.get(url)
+            self.assertEqual(output.status_code, 200)
+            data = json.loads(output.get_data(as_text=True))
+            self.assertEqual(data["pagination"]["pages"], 3)
+            ids.extend(issue["id"] for issue in data["issues"])
+            url = data["pagination"]["next"]
+        self.assertEqual(ids, [1, 2, 3, 4, 5])
+
+        output = self.app.get("/api/0/test/issues?after=bm90IGEgY3Vyc29y")
+        self.assertEqual(output.status_code, 400)
+        data = json.loads(output.get_data(as_text=True))
+        self.assertEqual(data["error_code"], "EINVALIDCURSOR")
+
+    def test_api_view_issues_queries(self):
+        """Test the number of SQL queries run by api_view_issues does not
+        depend on the number of issues returned."""
+        tests.create_projects(self.session)
+        repo = pagure.lib.query._get_project(self.session, "test")
+        key = pagure.lib.model.IssueKeys(
+            project_id=repo.id, name="bugzilla", key_type="link"
+        )
+        self.session.add(key)
+        self.session.flush()
+        for idx in range(10):
+            issue = pagure.lib.query.new_issue(
+                self.session,
+                repo=repo,
+                title="Issue #%s" % idx,
+                content="We should work on this",
+                user="pingou",
+                assignee="foo",
+                tags=["easyfix"],
+                notify=False,
+            )
+            pagure.lib.query.add_issue_comment(
+                self.session,
+                issue=issue,
+                comment="Working on it",
+                user="foo",
+                notify=False,
+            )
+            self.session.add(
+                pagure.lib.model.IssueValues(
+                    key_id=key.id, issue_uid=issue.uid, value="#%s" % idx
+                )
+            )
+        self.session.commit()
+
+        with self.assertMaxQueries(20):
+            output = self.app.get("/api/0/test/issues?per_page=100")
+        self.assertEqual(output.status_code, 200)
+        data = json.loads(output.get_data(as_text=True))
+        self.assertEqual(data["total_issues"], 10)
+        issue = data["issues"][0]
+        self.assertEqual(issue["assignee"]["name"], "foo")
+        self.assertEqual(issue["tags"], ["easyfix"])
+        self.assertEqual(issue["comments"][0]["user"]["name"], "foo")
+        self.assertEqual(issue["custom_fields"][0]["value"], "#9")
+
     def test_api_view_issues(self):
         """Test the api_view_issues method of the flask api."""
         self.test_api_new_issue()
@@ -4806,6 +4883,46 @@ class PagureFlaskApiIssuetests(tests.SimplePagureTest):
                 {"closed_ticket": 0, "count": 0, "open_ticket": 0},
             )
 
+    def test_api_view_issues_history_stats_detailed_closed(self):
+        """Test the api_view_issues_history_stats method of the flask api
+        with tickets opened and closed in different weeks."""
+        self.test_api_new_issue()
+
+        repo = pagure.lib.query.get_authorized_project(self.session, "test")
+        issue = pagure.lib.query.new_issue(
+            session=self.session,
+            repo=repo,
+            title="Test issue #2",
+            content="We should work on this",
+            user="pingou",
+        )
+        now = datetime.datetime.utcnow()
+        issue.date_created = now - datetime.timedelta(days=10)
+        issue.closed_at = now - datetime.timedelta(days=3)
+        issue.status = "Closed"
+        self.session.add(issue)
+        self.session.commit()
+
+        output = self.app.get("/api/0/test/issues/history/detailed_stats")
+        self.assertEqual(output.status_code, 200)
+        data = json.loads(output.get_data(as_text=True))
+
+        self.assertEqual(len(data["stats"]), 53)
+        keys = sorted(data["stats"].keys())
+        self.assertEqual(
+            data["stats"][keys[-1]],
+            {"closed_ticket": 1, "count": 1, "open_ticket": 1},
+        )
+        self.assertEqual(
+            data["stats"][keys[-2]],
+            {"closed_ticket": 0, "count": 0, "open_ticket": 1},
+        )
+        for k in keys[:-2]:
+            self.assertEqual(
+                data["stats"][k],
+                {"closed_ticket": 0, "count": 0, "open_ticket": 0},
+            )
+
     def test_api_view_issues_history_stats_detailed_invalid_range(self):
         """Test the api_view_issues_history_stats method of the flask api."""
         self.test_api_new_issue()
@@ -389,6 +389,125 @@ class PagureFlaskApiProjecttests(tests.Modeltests):
         self.maxDiff = None
         self.assertDictEqual(data, expected_data)
 
+    def test_api_projects_queries(self):
+        """Test the number of SQL queries run by api_projects does not
+        depend on the number of projects returned."""
+        tests.create_projects(self.session)
+        group = pagure.lib.model.PagureGroup(
+            group_name="packagers",
+            display_name="Packagers",
+            group_type="user",
+            user_id=1,
+        )
+        self.session.add(group)
+        self.session.add(pagure.lib.model.Tag(tag="infra"))
+        self.session.flush()
+        for idx in range(10):
+            project = pagure.lib.model.Project(
+                user_id=1,
+                name="project%s" % idx,
+                description="project #%s" % idx,
+                hook_token="project%s" % idx,
+            )
+            self.session.add(project)
+            self.session.flush()
+            self.session.add_all(
+                [
+                    pagure.lib.model.ProjectUser(
+                        project_id=project.id, user_id=2, access="commit"
+                    ),
+                    pagure.lib.model.ProjectGroup(
+                        project_id=project.id,
+                        group_id=group.id,
+                        access="admin",
+                    ),
+                    pagure.lib.model.TagProject(
+                        tag="infra", project_id=project.id
+                    ),
+                    pagure.lib.model.IssueKeys(
+                        project_id=project.id, name="bugzilla", key_type="link"
+                    ),
+                    pagure.lib.model.Project(
+                        user_id=2,
+                        name="project%s" % idx,
+                        is_fork=True,
+                        parent_id=project.id,
+                        hook_token="fork%s" % idx,
+                    ),
+                ]
+            )
+        self.session.commit()
+
+        with self.assertMaxQueries(30):
+            output = self.app.get("/api/0/projects?per_page=100")
+        self.assertEqual(output.status_code, 200)
+        data = json.loads(output.get_data(as_text=True))
+        self.assertEqual(data["total_projects"], 23)
+        forks = [project for project in data["projects"] if project["parent"]]
+        self.assertEqual(len(forks), 10)
+        self.assertEqual(forks[0]["user"]["name"], "foo")
+        self.assertEqual(
+            forks[0]["parent"]["access_users"],
+            {
+                "admin": [],
+                "collaborator": [],
+                "commit": ["foo"],
+                "owner": ["pingou"],
+                "ticket": [],
+            },
+        )
+        self.assertEqual(
+            forks[0]["parent"]["access_groups"],
+            {
+                "admin": ["packagers"],
+                "collaborator": [],
+                "commit": [],
+                "ticket": [],
+            },
+        )
+        self.assertEqual(forks[0]["parent"]["tags"], ["infra"])
+        self.assertEqual(
+            forks[0]["parent"]["custom_keys"], [["bugzilla", "link"]]
+        )
+
+    def test_api_projects_cursor(self):
+        """Test the api_projects method of the flask api when paginating
+        with a cursor."""
+        tests.create_projects(self.session)
+
+        output = self.app.get("/api/0/projects?short=1&per_page=2&after=")
+        self.assertEqual(output.status_code, 200)
+        data = json.loads(output.get_data(as_text=True))
+        self.assertEqual(data["total_projects"], 3)
+        self.assertEqual(
+            [project["fullname"] for project in data["projects"]],
+            ["test", "test2"],
+        )
+        self.assertEqual(data["pagination"]["pages"], 2)
+        self.assertIsNone(data["pagination"]["prev"])
+        self.assertIsNone(data["pagination"]["last"])
+        self.assertTrue(data["pagination"]["first"].endswith("&after="))
+
+        # The projects are only counted on the first page
+        with self.assertMaxQueries(10) as queries:
+            output = self.app.get(data["pagination"]["next"])
+        self.assertFalse(
+            [query for query in queries if "count(" in query.lower()]
+        )
+        self.assertEqual(output.status_code, 200)
+        data = json.loads(output.get_data(as_text=True))
+        self.assertEqual(data["total_projects"], 3)
+        self.assertEqual(
+            [project["fullname"] for project in data["projects"]],
+            ["somenamespace/test3"],
+        )
+        self.assertIsNone(data["pagination"]["next"])
+
+        output = self.app.get("/api/0/projects?after=invalid")
+        self.assertEqual(output.status_code, 400)
+        data = json.loads(output.get_data(as_text=True))
+        self.assertEqual(data["error_code"], "EINVALIDCURSOR")
+
     def test_api_projects(self):
         """Test the api_projects method of the flask api."""
         tests.create_projects(self.session)
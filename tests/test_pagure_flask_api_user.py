@@ -1732,6 +1732,34 @@ class PagureFlaskApiUsertestissues(tests.Modeltests):
             },
         )
 
+    def test_user_issues_queries(self):
+        """Test the number of SQL queries run to list the issues of an
+        user does not depend on the number of issues returned."""
+        for name in ("test", "test2"):
+            repo = pagure.lib.query._get_project(self.session, name)
+            for idx in range(10):
+                pagure.lib.query.new_issue(
+                    session=self.session,
+                    repo=repo,
+                    title="Test issue #%s" % idx,
+                    content="We should work on this",
+                    user="pingou",
+                    assignee="foo",
+                    tags=["easyfix"],
+                    notify=False,
+                )
+        self.session.commit()
+
+        with self.assertMaxQueries(30):
+            output = self.app.get("/api/0/user/pingou/issues?per_page=100")
+        self.assertEqual(output.status_code, 200)
+        data = json.loads(output.get_data(as_text=True))
+        self.assertEqual(data["total_issues_created"], 21)
+        projects = set(
+            issue["project"]["fullname"] for issue in data["issues_created"]
+        )
+        self.assertEqual(projects, set(["test", "test2"]))
+
     def test_user_issues(self):
         """Return the list of issues associated with the specified user."""
 
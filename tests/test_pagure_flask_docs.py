@@ -215,6 +215,29 @@ class PagureFlaskDocstests(tests.SimplePagureTest):
         output = self.app.get("/test/folder1/foo/folder2")
         self.assertEqual(output.status_code, 404)
 
+    def test_view_docs_cache(self):
+        """Test the caching headers returned by the view_docs endpoint."""
+        tests.create_projects(self.session)
+        pygit2.init_repository(
+            os.path.join(self.path, "repos", "docs", "test.git"), bare=True
+        )
+        self._set_up_doc()
+
+        output = self.app.get("/test/sources")
+        self.assertEqual(output.status_code, 200)
+        self.assertEqual(output.headers["Cache-Control"], "public, no-cache")
+        etag = output.headers["ETag"]
+
+        output = self.app.get("/test/sources", headers={"If-None-Match": etag})
+        self.assertEqual(output.status_code, 304)
+        self.assertEqual(output.get_data(), b"")
+
+        output = self.app.get(
+            "/test/folder1/folder2/test_file", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(output.status_code, 200)
+        self.assertNotEqual(output.headers["ETag"], etag)
+
     @mock.patch(
         "pagure.lib.encoding_utils.decode",
         mock.MagicMock(side_effect=pagure.exceptions.PagureEncodingException),
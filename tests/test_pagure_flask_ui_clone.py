@@ -156,6 +156,37 @@ class PagureFlaskAppClonetests(tests.Modeltests):
         # Either means we didn't fully crash when returning the response
         self.assertIn(output.status_code, (200, 415))
 
+    @patch.dict(
+        "pagure.config.config",
+        {
+            "HTTP_REPO_ACCESS_STREAMING": True,
+            "HTTP_REPO_ACCESS_CHUNK_SIZE": 16,
+        },
+    )
+    def test_http_clone_streaming(self):
+        """Test that HTTP cloning works when streaming the input to git."""
+        output = self.app.get(
+            "/clonetest.git/info/refs?service=git-upload-pack"
+        )
+        self.assertEqual(output.status_code, 200)
+        output_text = output.get_data(as_text=True)
+        self.assertIn("# service=git-upload-pack", output_text)
+        self.assertIn(" refs/heads/master\n0000", output_text)
+
+        repo = pygit2.Repository(
+            os.path.join(self.path, "repos", "clonetest.git")
+        )
+        data = (
+            "0032want %s\n00000009done\n" % repo.head.target.hex
+        ).encode("utf-8")
+        output = self.app.post(
+            "/clonetest.git/git-upload-pack",
+            headers={"Content-Type": "application/x-git-upload-pack-request"},
+            data=data,
+        )
+        self.assertEqual(output.status_code, 200)
+        self.assertIn(b"PACK", output.get_data())
+
     @patch.dict(
         "pagure.config.config",
         {
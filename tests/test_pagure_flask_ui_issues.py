@@ -763,6 +763,40 @@ class PagureFlaskIssuestests(tests.Modeltests):
                 " <p>No issue tracker found for this project</p>", output_text
             )
 
+    def test_view_issues_lazy_repo_context(self):
+        """Test that the view_issues endpoint neither lists the branches of
+        the git repo nor looks up the watch status of the user."""
+        tests.create_projects(self.session)
+        tests.create_projects_git(os.path.join(self.path, "repos"), bare=True)
+
+        branches_mock = MagicMock()
+        listall_branches = pygit2.Repository.listall_branches
+
+        def _listall_branches(repo_obj, *args):
+            branches_mock()
+            return listall_branches(repo_obj, *args)
+
+        user = tests.FakeUser(username="pingou")
+        with tests.user_set(self.app.application, user):
+            with patch.object(
+                pygit2.Repository, "listall_branches", _listall_branches
+            ), patch(
+                "pagure.lib.query.get_watch_level_on_repo",
+                side_effect=pagure.lib.query.get_watch_level_on_repo,
+            ) as watch_mock:
+                output = self.app.get("/test/issues")
+                self.assertEqual(output.status_code, 200)
+                branches_mock.assert_not_called()
+                watch_mock.assert_not_called()
+
+                # They are when the page uses them
+                output = self.app.get("/test/branches")
+                self.assertEqual(output.status_code, 200)
+                self.assertEqual(branches_mock.call_count, 1)
+                output = self.app.get("/test")
+                self.assertEqual(output.status_code, 200)
+                self.assertEqual(watch_mock.call_count, 1)
+
     @patch("pagure.lib.git.update_git")
     @patch("pagure.lib.notify.send_email")
     def test_view_issues(self, p_send_email, p_ugt):
@@ -1538,6 +1572,124 @@ class PagureFlaskIssuestests(tests.Modeltests):
             self.assertIn("function drop_issue(){", output_text)
             self.assertIn('<a class="pointer" id="take-btn"\n', output_text)
 
+    @patch("pagure.lib.git.update_git")
+    @patch("pagure.lib.notify.send_email")
+    def test_view_issue_rendered_html(self, p_send_email, p_ugt):
+        """Test that view_issue stores the rendering of the comments."""
+        p_send_email.return_value = True
+        p_ugt.return_value = True
+
+        tests.create_projects(self.session)
+        tests.create_projects_git(os.path.join(self.path, "repos"), bare=True)
+        repo = pagure.lib.query.get_authorized_project(self.session, "test")
+        issue = pagure.lib.query.new_issue(
+            session=self.session,
+            repo=repo,
+            title="Test issue",
+            content="We should work on **this**",
+            user="pingou",
+        )
+        pagure.lib.query.add_issue_comment(
+            session=self.session,
+            issue=issue,
+            comment="Fixed by #1",
+            user="pingou",
+        )
+        self.session.commit()
+
+        output = self.app.get("/test/issue/1")
+        self.assertEqual(output.status_code, 200)
+        output_text = output.get_data(as_text=True)
+        self.assertIn("We should work on <strong>this</strong>", output_text)
+
+        self.session.expire_all()
+        issue = pagure.lib.query.search_issues(self.session, repo, issueid=1)
+        self.assertEqual(
+            issue.content_html,
+            '<div class="markdown"><p>We should work on '
+            "<strong>this</strong></p></div>",
+        )
+        self.assertTrue(issue.content_html_stamp.startswith("1:"))
+        comment = issue.comments[0]
+        self.assertEqual(
+            comment.comment_html,
+            '<div class="markdown"><p>Fixed by <a href="/test/issue/1" '
+            'title="[Open] Test issue">#1</a></p></div>',
+        )
+
+        # The stored rendering is used on the next views
+        with patch("pagure.lib.query._convert_markdown") as convert:
+            output = self.app.get("/test/issue/1")
+            self.assertEqual(output.status_code, 200)
+            convert.assert_not_called()
+        self.assertIn(
+            "We should work on <strong>this</strong>",
+            output.get_data(as_text=True),
+        )
+
+        # Editing the comment drops its rendering
+        pagure.lib.query.edit_comment(
+            self.session,
+            parent=issue,
+            comment=comment,
+            user="pingou",
+            updated_comment="Fixed in another way",
+        )
+        self.session.commit()
+        self.assertIsNone(comment.comment_html)
+        output = self.app.get("/test/issue/1")
+        self.assertIn("Fixed in another way", output.get_data(as_text=True))
+
+    @patch("pagure.lib.git.update_git")
+    @patch("pagure.lib.notify.send_email")
+    def test_view_issue_rendered_html_private(self, p_send_email, p_ugt):
+        """Test that view_issue renders the comments of a private project
+        only once, without storing them."""
+        p_send_email.return_value = True
+        p_ugt.return_value = True
+
+        tests.create_projects(self.session)
+        tests.create_projects_git(os.path.join(self.path, "repos"), bare=True)
+        repo = pagure.lib.query.get_authorized_project(self.session, "test")
+        repo.private = True
+        self.session.add(repo)
+        issue = pagure.lib.query.new_issue(
+            session=self.session,
+            repo=repo,
+            title="Test issue",
+            content="We should work on **this**",
+            user="pingou",
+        )
+        pagure.lib.query.add_issue_comment(
+            session=self.session,
+            issue=issue,
+            comment="Fixed by #1",
+            user="pingou",
+        )
+        self.session.commit()
+
+        user = tests.FakeUser(username="pingou")
+        with tests.user_set(self.app.application, user):
+            with patch(
+                "pagure.lib.query._render_markdown",
+                side_effect=pagure.lib.query._render_markdown,
+            ) as render:
+                output = self.app.get("/test/issue/1")
+                self.assertEqual(output.status_code, 200)
+            self.assertEqual(render.call_count, 2)
+        output_text = output.get_data(as_text=True)
+        self.assertIn("We should work on <strong>this</strong>", output_text)
+        self.assertIn(
+            'Fixed by <a href="/test/issue/1" '
+            'title="[Open] Test issue">#1</a>',
+            output_text,
+        )
+
+        self.session.expire_all()
+        issue = pagure.lib.query.search_issues(self.session, repo, issueid=1)
+        self.assertIsNotNone(issue.content_html)
+        self.assertIsNone(issue.comments[0].comment_html)
+
     @patch("pagure.lib.git.update_git")
     @patch("pagure.lib.notify.send_email")
     def test_view_issue_user_ticket(self, p_send_email, p_ugt):
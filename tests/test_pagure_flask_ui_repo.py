@@ -1845,6 +1845,31 @@ class PagureFlaskRepotests(tests.Modeltests):
                 output_text,
             )
 
+    @patch(
+        "pagure.decorators.admin_session_timedout",
+        MagicMock(return_value=False),
+    )
+    def test_view_settings_json_parsed_once(self):
+        """Test that the view_settings endpoint parses the JSON attributes
+        of the project only once."""
+        tests.create_projects(self.session)
+        tests.create_projects_git(os.path.join(self.path, "repos"))
+        repo = pagure.lib.query.get_authorized_project(self.session, "test")
+        repo.settings = repo.settings
+        self.session.add(repo)
+        self.session.commit()
+
+        user = tests.FakeUser(username="pingou")
+        with tests.user_set(self.app.application, user):
+            with patch(
+                "pagure.lib.model.json.loads",
+                side_effect=pagure.lib.model.json.loads,
+            ) as loads:
+                output = self.app.get("/test/settings")
+                self.assertEqual(output.status_code, 200)
+            # settings, close_status and the settings of the user
+            self.assertLessEqual(loads.call_count, 3)
+
     @patch(
         "pagure.decorators.admin_session_timedout",
         MagicMock(return_value=False),
@@ -3125,7 +3150,7 @@ class PagureFlaskRepotests(tests.Modeltests):
         )
 
     @patch(
-        "pagure.lib.encoding_utils.decode",
+        "pagure.lib.encoding_utils.guess_encoding",
         MagicMock(side_effect=pagure.exceptions.PagureException),
     )
     def test_view_file_with_wrong_encoding(self):
@@ -3299,6 +3324,175 @@ class PagureFlaskRepotests(tests.Modeltests):
         )
         self.assertIn("foo\n bar", output_text)
 
+    def test_view_raw_file_cache(self):
+        """Test the caching headers returned by the view_raw_file
+        endpoint."""
+        tests.create_projects(self.session)
+        tests.create_projects_git(os.path.join(self.path, "repos"), bare=True)
+        tests.add_content_git_repo(
+            os.path.join(self.path, "repos", "test.git")
+        )
+        repo = pygit2.Repository(os.path.join(self.path, "repos", "test.git"))
+        commit = repo.revparse_single("HEAD")
+
+        # Requested via a branch, the content must be revalidated
+        output = self.app.get("/test/raw/master/f/sources")
+        self.assertEqual(output.status_code, 200)
+        etag = output.headers["ETag"]
+        self.assertEqual(output.headers["Cache-Control"], "public, no-cache")
+
+        output = self.app.get(
+            "/test/raw/master/f/sources", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(output.status_code, 304)
+        self.assertEqual(output.get_data(), b"")
+        self.assertEqual(output.headers["ETag"], etag)
+
+        # Another file has another ETag
+        output = self.app.get(
+            "/test/raw/master/f/folder1/folder2/file",
+            headers={"If-None-Match": etag},
+        )
+        self.assertEqual(output.status_code, 200)
+        self.assertNotEqual(output.headers["ETag"], etag)
+
+        # Requested via a full commit hash, the content never changes
+        output = self.app.get("/test/raw/%s/f/sources" % commit.oid.hex)
+        self.assertEqual(output.status_code, 200)
+        self.assertEqual(output.headers["ETag"], etag)
+        self.assertIn("immutable", output.headers["Cache-Control"])
+        self.assertIn("max-age=31536000", output.headers["Cache-Control"])
+
+        output = self.app.get(
+            "/test/raw/%s/f/sources" % commit.oid.hex[:7],
+            headers={"If-None-Match": etag},
+        )
+        self.assertEqual(output.status_code, 304)
+        self.assertNotIn("immutable", output.headers["Cache-Control"])
+
+        # A new commit changes the content of the branch
+        tests.add_commit_git_repo(
+            os.path.join(self.path, "repos", "test.git"), ncommits=1
+        )
+        output = self.app.get(
+            "/test/raw/master/f/sources", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(output.status_code, 200)
+        self.assertNotEqual(output.headers["ETag"], etag)
+
+    def test_view_file_cache(self):
+        """Test the caching headers returned by the view_file and
+        view_commit endpoints."""
+        tests.create_projects(self.session)
+        tests.create_tokens(self.session)
+        tests.create_projects_git(os.path.join(self.path, "repos"), bare=True)
+        tests.add_content_git_repo(
+            os.path.join(self.path, "repos", "test.git")
+        )
+        repo = pygit2.Repository(os.path.join(self.path, "repos", "test.git"))
+        commit = repo.revparse_single("HEAD")
+
+        for url in [
+            "/test/blob/master/f/sources",
+            "/test/tree/master",
+            "/test/c/%s" % commit.oid.hex,
+            "/test/c/%s.patch" % commit.oid.hex,
+        ]:
+            output = self.app.get(url)
+            self.assertEqual(output.status_code, 200)
+            etag = output.headers["ETag"]
+
+            output = self.app.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(output.status_code, 304)
+            self.assertNotIn("Content-Security-Policy", output.headers)
+
+        # New branches and stars change the pages of the project
+        etags = {}
+        urls = [
+            "/test/blob/master/f/sources",
+            "/test/tree/master",
+            "/test/c/%s" % commit.oid.hex,
+        ]
+        for url in urls:
+            etags[url] = self.app.get(url).headers["ETag"]
+        repo.branches.local.create("feature", commit)
+        for url in urls:
+            output = self.app.get(url, headers={"If-None-Match": etags[url]})
+            self.assertEqual(output.status_code, 200)
+            etags[url] = output.headers["ETag"]
+        msg = pagure.lib.query.update_star_project(
+            self.session,
+            repo=pagure.lib.query.get_authorized_project(self.session, "test"),
+            star="1",
+            user="foo",
+        )
+        self.session.commit()
+        self.assertEqual(msg, "You starred this project")
+        for url in urls:
+            output = self.app.get(url, headers={"If-None-Match": etags[url]})
+            self.assertEqual(output.status_code, 200)
+
+        # The pages rendered for a user are not cached
+        user = tests.FakeUser(username="pingou")
+        with tests.user_set(self.app.application, user):
+            output = self.app.get(
+                "/test/blob/master/f/sources",
+                headers={"If-None-Match": etag},
+            )
+            self.assertEqual(output.status_code, 200)
+            self.assertNotIn("ETag", output.headers)
+
+        # Flagging the commit changes its page
+        output = self.app.get("/test/c/%s" % commit.oid.hex)
+        etag = output.headers["ETag"]
+        pagure.lib.query.add_commit_flag(
+            session=self.session,
+            repo=pagure.lib.query.get_authorized_project(self.session, "test"),
+            commit_hash=commit.oid.hex,
+            username="Jenkins",
+            percent=100,
+            comment="Build passed",
+            status="success",
+            url="https://jenkins.fedoraproject.org",
+            uid="jenkins_build_pagure_100+seed",
+            user="foo",
+            token="aaabbbcccddd",
+        )
+        self.session.commit()
+        output = self.app.get(
+            "/test/c/%s" % commit.oid.hex, headers={"If-None-Match": etag}
+        )
+        self.assertEqual(output.status_code, 200)
+        self.assertIn("Build passed", output.get_data(as_text=True))
+
+    def test_view_file_render_cache(self):
+        """Test that viewing the same files again does not render them
+        again."""
+        tests.create_projects(self.session)
+        tests.create_projects_git(os.path.join(self.path, "repos"), bare=True)
+        tests.add_readme_git_repo(os.path.join(self.path, "repos", "test.git"))
+        tests.add_content_git_repo(
+            os.path.join(self.path, "repos", "test.git")
+        )
+
+        with patch(
+            "pagure.lib.encoding_utils.guess_encoding",
+            wraps=pagure.lib.encoding_utils.guess_encoding,
+        ) as guess_encoding:
+            for _ in range(3):
+                output = self.app.get("/test/blob/master/f/sources")
+                self.assertEqual(output.status_code, 200)
+                self.assertIn("foo", output.get_data(as_text=True))
+                output = self.app.get("/test")
+                self.assertEqual(output.status_code, 200)
+                self.assertIn(
+                    "Pagure is a light-weight git-centered forge",
+                    output.get_data(as_text=True),
+                )
+        # Once for the file and once for the README
+        self.assertEqual(guess_encoding.call_count, 2)
+        self.assertEqual(pagure.lib.render_cache.get_stats()["hits"], 4)
+
     def test_view_commit(self):
         """Test the view_commit endpoint."""
         output = self.app.get("/foo/c/bar")
@@ -16,6 +16,7 @@ import shutil
 import sys
 import os
 
+import flask
 import six
 import pygit2
 import markdown
@@ -4387,6 +4388,83 @@ class PagureLibtests(tests.Modeltests):
                     html = pagure.lib.query.text2markdown(text)
                     self.assertEqual(html, expected[idx])
 
+    def test_text2markdown_bulk_references(self):
+        """Test that text2markdown resolves the references of a document
+        at once."""
+        pagure.config.config["TESTING"] = True
+        pagure.config.config["SERVER_NAME"] = "localhost.localdomain"
+
+        # This creates the project test with PR#1
+        self.test_new_pull_request()
+        repo = pagure.lib.query._get_project(self.session, "test")
+        for idx in (2, 3):
+            pagure.lib.query.new_issue(
+                issue_id=idx,
+                session=self.session,
+                repo=repo,
+                title="test issue #%s" % idx,
+                content="content test issue",
+                user="pingou",
+            )
+        self.session.commit()
+
+        text = "#1, #2, PR#3, #4, test#2 and ns/test#3 thanks to @pingou @bob"
+        expected = (
+            '<div class="markdown"><p>'
+            '<a href="/test/pull-request/1" title="[Open] test pull-request">'
+            "#1</a>, "
+            '<a href="/test/issue/2" title="[Open] test issue #2">#2</a>, '
+            '<a href="/test/issue/3" title="[Open] test issue #3">PR#3</a>, '
+            "#4, "
+            '<a href="/test/issue/2" title="[Open] test issue #2">test#2</a>'
+            " and ns/test#3 thanks to "
+            '<a href="http://localhost.localdomain/user/pingou">@pingou</a>'
+            " @bob</p></div>"
+        )
+
+        with patch(
+            "pagure.lib.query.search_issues",
+            wraps=pagure.lib.query.search_issues,
+        ) as search_issues, patch(
+            "pagure.lib.query.search_pull_requests",
+            wraps=pagure.lib.query.search_pull_requests,
+        ) as search_prs, patch(
+            "pagure.lib.query.search_user",
+            wraps=pagure.lib.query.search_user,
+        ) as search_user:
+            with self.app.application.app_context() as ctx:
+                ctx.g.session = self.session
+                with ctx.app.test_request_context() as reqctx:
+                    reqctx.request.url_root = "http://localhost.localdomain/"
+                    reqctx.request.url = (
+                        "http://localhost.localdomain/test/issue/69"
+                    )
+                    reqctx.request.args = Mock()
+                    reqctx.request.args.get = Mock(return_value=None)
+                    html = pagure.lib.query.text2markdown(text)
+
+        self.assertEqual(html, expected)
+        search_issues.assert_not_called()
+        search_prs.assert_not_called()
+        search_user.assert_not_called()
+        # The objects found are not kept once the document is converted
+        self.assertIsNone(pagure.pfmarkdown._REFERENCES.objects)
+
+    @patch("pagure.pfmarkdown._resolve_references")
+    def test_text2markdown_references_no_session(self, resolve):
+        """Test that text2markdown does not look up the references outside
+        of the application."""
+        html = pagure.lib.query.text2markdown("Some **text**")
+        self.assertEqual(
+            html,
+            '<div class="markdown"><p>Some <strong>text</strong></p></div>',
+        )
+        resolve.assert_not_called()
+
+        with self.app.application.app_context():
+            pagure.lib.query.text2markdown("Some other text")
+        resolve.assert_not_called()
+
     def test_text2markdown_exception(self):
         """Test the text2markdown method in pagure.lib.query."""
 
@@ -4406,6 +4484,91 @@ class PagureLibtests(tests.Modeltests):
         html = pagure.lib.query.text2markdown(text)
         self.assertEqual(html, expected_html)
 
+    def test_text2markdown_cache(self):
+        """Test that text2markdown renders a document only once."""
+        text = "Some *markdown* text"
+        expected_html = (
+            '<div class="markdown"><p>Some <em>markdown</em> text</p></div>'
+        )
+
+        with patch(
+            "pagure.lib.query._convert_markdown",
+            wraps=pagure.lib.query._convert_markdown,
+        ) as convert:
+            with self.app.application.app_context():
+                html = pagure.lib.query.text2markdown(text)
+                self.assertEqual(html, expected_html)
+                html = pagure.lib.query.text2markdown(text)
+                self.assertEqual(html, expected_html)
+                self.assertEqual(convert.call_count, 1)
+
+                # Different extensions are a different rendering
+                html = pagure.lib.query.text2markdown(text, readme=True)
+                self.assertEqual(html, expected_html)
+                self.assertEqual(convert.call_count, 2)
+
+        # The markdown processors are re-used
+        self.assertIs(
+            pagure.lib.query._get_markdown_processor(True, False),
+            pagure.lib.query._get_markdown_processor(True, False),
+        )
+
+    def test_text2markdown_cache_context(self):
+        """Test that text2markdown caches documents per project and only
+        per user when they link to private projects."""
+
+        def _render(text, extended, readme):
+            pagure.pfmarkdown.set_depends_on_user("private" in text)
+            return "<p>%s</p>" % text
+
+        def _text2markdown(url, text, username=None):
+            with self.app.application.app_context() as ctx:
+                ctx.g.session = self.session
+                with ctx.app.test_request_context() as reqctx:
+                    reqctx.request.url_root = "http://localhost.localdomain/"
+                    reqctx.request.url = (
+                        "http://localhost.localdomain/%s" % url
+                    )
+                    if username:
+                        flask.g.fas_user = tests.FakeUser(username=username)
+                    return pagure.lib.query.text2markdown(text)
+
+        with patch(
+            "pagure.lib.query._render_markdown", side_effect=_render
+        ) as render:
+            for url, username in (
+                ("test/issue/1", None),
+                ("test/issue/2?foo=bar", "pingou"),
+                ("test/pull-request/3", "foo"),
+            ):
+                self.assertEqual(
+                    _text2markdown(url, "public", username), "<p>public</p>"
+                )
+            self.assertEqual(render.call_count, 1)
+
+            # Other projects have their own rendering
+            _text2markdown("test2/issue/1", "public")
+            _text2markdown("fork/foo/test/issue/1", "public")
+            self.assertEqual(render.call_count, 3)
+
+            # Documents linking to private projects are cached per user
+            for url, username in (
+                ("test/issue/1", "pingou"),
+                ("test/issue/2", "pingou"),
+                ("test/issue/1", "foo"),
+                ("test/issue/1", None),
+                ("test/issue/2", None),
+            ):
+                self.assertEqual(
+                    _text2markdown(url, "private", username), "<p>private</p>"
+                )
+                self.assertTrue(pagure.pfmarkdown.depends_on_user())
+            self.assertEqual(render.call_count, 6)
+
+            _text2markdown("test/issue/1", "public")
+            self.assertFalse(pagure.pfmarkdown.depends_on_user())
+            self.assertEqual(render.call_count, 6)
+
     def test_get_access_levels(self):
         """Test the get_access_levels method in pagure.lib"""
 
@@ -5,6 +5,7 @@ Tests for :module:`pagure.lib.encoding_utils`.
 
 from __future__ import unicode_literals, absolute_import
 
+import codecs
 import os
 import unittest
 import sys
@@ -16,6 +17,8 @@ except ImportError:
     pass
 
 import chardet
+from mock import patch
+from chardet import universaldetector
 
 sys.path.insert(
     0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
@@ -23,6 +26,10 @@ sys.path.insert(
 
 from pagure.lib import encoding_utils
 
+CORPUS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "encoding_corpus"
+)
+
 
 class TestGuessEncoding(unittest.TestCase):
     def test_guess_encoding_ascii(self):
@@ -31,10 +38,7 @@ class TestGuessEncoding(unittest.TestCase):
         """
         data = "Twas bryllyg, and the slythy toves did gyre and gymble"
         result = encoding_utils.guess_encoding(data.encode("ascii"))
-        if cchardet is not None:
-            self.assertEqual(result, "ASCII")
-        else:
-            self.assertEqual(result, "ascii")
+        self.assertEqual(result, "ascii")
 
     def test_guess_encoding_favor_utf_8(self):
         """
@@ -46,10 +50,8 @@ class TestGuessEncoding(unittest.TestCase):
         data = "Šabata".encode("utf-8")
         result = encoding_utils.guess_encoding(data)
         chardet_result = chardet.detect(data)
-        if cchardet:
-            self.assertEqual(result, "WINDOWS-1250")
-        else:
-            self.assertEqual(result, "utf-8")
+        self.assertEqual(result, "utf-8")
+        if not cchardet:
             if chardet.__version__[0] in ("3", "4"):
                 self.assertEqual(chardet_result["encoding"], "ISO-8859-9")
             else:
@@ -60,64 +62,47 @@ class TestGuessEncoding(unittest.TestCase):
         result = encoding_utils.guess_encoding("".encode("utf-8"))
         self.assertEqual(result, "ascii")
 
+    def test_guess_encoding_bom(self):
+        """Test that the byte order marks are recognized."""
+        data = "Šabata"
+        for encoded, expected in [
+            (data.encode("utf-8-sig"), "utf-8-sig"),
+            (data.encode("utf-16"), "utf-16"),
+            (codecs.BOM_UTF16_BE + data.encode("utf-16-be"), "utf-16"),
+            (data.encode("utf-32"), "utf-32"),
+            (codecs.BOM_UTF32_BE + data.encode("utf-32-be"), "utf-32"),
+        ]:
+            result = encoding_utils.guess_encoding(encoded)
+            self.assertEqual(result, expected)
+            self.assertEqual(encoded.decode(result), data)
+
+    def test_guess_encoding_sample(self):
+        """Test that the encoding guessed from the start of the data is
+        checked against all of it."""
+        data = b"a" * encoding_utils.SAMPLE_SIZE + "é".encode("latin-1")
+        result = encoding_utils.guess_encoding(data)
+        self.assertTrue(data.decode(result).endswith("é"))
+
 
 class TestGuessEncodings(unittest.TestCase):
     def test_guess_encodings(self):
         """Test the encoding_utils.guess_encodings() method."""
         data = "Šabata".encode("utf-8")
         result = encoding_utils.guess_encodings(data)
-        chardet_result = chardet.detect(data)
-        if cchardet is not None:
-            # The last one in the list (which apparently has only one)
-            self.assertEqual(result[-1].encoding, "WINDOWS-1250")
-        else:
-            if chardet.__version__[0] in ("3", "4"):
-                # The first three have different confidence values
-                expexted_list = ["utf-8", "ISO-8859-9", "ISO-8859-1"]
-                # This is the one with the least confidence
-                self.assertEqual(result[-1].encoding, "windows-1255")
-                self.assertListEqual(
-                    [encoding.encoding for encoding in result][:3],
-                    expexted_list,
-                )
-
-                # The values in the middle of the list all have the same confidence
-                # value and can't be sorted reliably: use sets.
-                expected_list = sorted(
-                    [
-                        "utf-8",
-                        "ISO-8859-9",
-                        "ISO-8859-1",
-                        "MacCyrillic",
-                        "IBM866",
-                        "TIS-620",
-                        "EUC-JP",
-                        "EUC-KR",
-                        "GB2312",
-                        "KOI8-R",
-                        "Big5",
-                        "IBM855",
-                        "ISO-8859-7",
-                        "SHIFT_JIS",
-                        "windows-1253",
-                        "CP949",
-                        "EUC-TW",
-                        "ISO-8859-5",
-                        "windows-1251",
-                        "windows-1255",
-                    ]
-                )
-                self.assertListEqual(
-                    sorted(set([encoding.encoding for encoding in result])),
-                    expected_list,
-                )
-                self.assertEqual(chardet_result["encoding"], "ISO-8859-9")
-            else:
-                self.assertListEqual(
-                    [encoding.encoding for encoding in result],
-                    ["utf-8", "ISO-8859-2", "windows-1252"],
-                )
-                self.assertEqual(chardet_result["encoding"], "ISO-8859-2")
+        self.assertEqual(result, [encoding_utils.Guess("utf-8", 1.0)])
+
+    def test_guess_encodings_chardet(self):
+        """Test the encoding_utils.guess_encodings() method when the data is
+        not UTF-8."""
+        with open(
+            os.path.join(CORPUS, "declaration.iso-8859-1.txt"), "rb"
+        ) as stream:
+            data = stream.read()
+        result = encoding_utils.guess_encodings(data)
+        self.assertEqual(result[0].encoding, "ISO-8859-1")
+        if cchardet is None:
+            # All the encodings chardet considered are returned
+            self.assertGreater(len(result), 1)
 
     def test_guess_encodings_no_data(self):
         """Test encoding_utils.guess_encodings() with an emtpy string"""
@@ -125,6 +110,54 @@ class TestGuessEncodings(unittest.TestCase):
         self.assertEqual([encoding.encoding for encoding in result], ["ascii"])
 
 
+class TestDetectEncodings(unittest.TestCase):
+    def _patch_chardet(self):
+        """Patch the detector used by encoding_utils."""
+        if cchardet is not None:
+            return patch.object(encoding_utils, "cchardet")
+        return patch.object(encoding_utils, "universaldetector")
+
+    def test_detect_encodings_fast_path(self):
+        """Test that chardet is not used for ascii, UTF-8 or data starting
+        with a byte order mark."""
+        for filename in [
+            "README.ascii.rst",
+            "changelog.utf-8.rst",
+            "changelog.utf-8-sig.rst",
+            "changelog.utf-16.rst",
+        ]:
+            with open(os.path.join(CORPUS, filename), "rb") as stream:
+                data = stream.read()
+            with self._patch_chardet() as detector:
+                result = encoding_utils.detect_encodings(data)
+            self.assertFalse(detector.mock_calls)
+            self.assertEqual(result, {filename.split(".")[1]: 1.0})
+
+    @unittest.skipIf(cchardet is not None, "Checks the chardet detector")
+    def test_detect_encodings_sample(self):
+        """Test that chardet only looks at a sample of the data."""
+        with open(
+            os.path.join(CORPUS, "declaration.iso-8859-1.txt"), "rb"
+        ) as stream:
+            data = stream.read() * 2000
+        self.assertGreater(len(data), encoding_utils.SAMPLE_SIZE)
+
+        fed = []
+        feed = universaldetector.UniversalDetector.feed
+
+        def _feed(detector, data):
+            fed.append(len(data))
+            return feed(detector, data)
+
+        with patch.object(universaldetector.UniversalDetector, "feed", _feed):
+            result = encoding_utils.detect_encodings(data)
+            self.assertEqual(fed, [encoding_utils.SAMPLE_SIZE])
+            self.assertIn("ISO-8859-1", result)
+
+            encoding_utils.detect_encodings(data, sample_size=None)
+            self.assertEqual(fed[-1], len(data))
+
+
 class TestDecode(unittest.TestCase):
     def test_decode(self):
         """Test encoding_utils.decode()"""
@@ -136,6 +169,18 @@ class TestDecode(unittest.TestCase):
         )
         self.assertEqual(data, encoding_utils.decode(data.encode("utf-8")))
 
+    def test_decode_corpus(self):
+        """Test encoding_utils.decode() on files in various encodings, named
+        after their encoding."""
+        for filename in sorted(os.listdir(CORPUS)):
+            with open(os.path.join(CORPUS, filename), "rb") as stream:
+                data = stream.read()
+            self.assertEqual(
+                encoding_utils.decode(data),
+                data.decode(filename.split(".")[1]),
+                filename,
+            )
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)
@@ -1626,6 +1626,146 @@ index 458821a..77674a8
         files = [entry.name for entry in commit.tree]
         self.assertEqual(files, [])
 
+    @patch("pagure.lib.notify.send_email", MagicMock(return_value=True))
+    def test_update_git_several_objects(self):
+        """Test the update_git of pagure.lib.git with several issues."""
+        self.test_update_git()
+
+        gitpath = os.path.join(
+            self.path, "repos", "tickets", "test_ticket_repo.git"
+        )
+        gitrepo = pygit2.Repository(gitpath)
+
+        repo = pagure.lib.query.get_authorized_project(
+            self.session, "test_ticket_repo"
+        )
+        pagure.lib.query.new_issue(
+            session=self.session,
+            repo=repo,
+            title="Test issue #2",
+            content="We should work on this as well",
+            user="pingou",
+        )
+        head = gitrepo.revparse_single("HEAD")
+        issues = pagure.lib.query.search_issues(self.session, repo)
+        self.assertEqual(len(issues), 2)
+        for issue in issues:
+            issue.content += "!"
+            self.session.add(issue)
+        self.session.commit()
+
+        pagure.lib.git.update_git(issues, repo).get()
+
+        # Both issues were updated in a single commit
+        commit = gitrepo.revparse_single("HEAD")
+        self.assertEqual(commit.parents, [head])
+        self.assertTrue(commit.message.startswith("Updated 2 issues\n\n"))
+        self.assertEqual(
+            sorted(entry.name for entry in commit.tree),
+            sorted(issue.uid for issue in issues),
+        )
+
+        # Nothing changed, nothing to commit
+        pagure.lib.git.update_git(issues, repo).get()
+        self.assertEqual(gitrepo.revparse_single("HEAD"), commit)
+
+    @patch("pagure.lib.notify.send_email", MagicMock(return_value=True))
+    def test_update_git_coalesced(self):
+        """Test that the update_git of pagure.lib.git writes in one commit
+        the other issues updated since the last commit."""
+        self.test_update_git_several_objects()
+
+        gitpath = os.path.join(
+            self.path, "repos", "tickets", "test_ticket_repo.git"
+        )
+        gitrepo = pygit2.Repository(gitpath)
+        head = gitrepo.revparse_single("HEAD")
+
+        repo = pagure.lib.query.get_authorized_project(
+            self.session, "test_ticket_repo"
+        )
+        issues = pagure.lib.query.search_issues(self.session, repo)
+        for issue in issues:
+            issue.content += " and now"
+            issue.last_updated = datetime.datetime.utcnow()
+            self.session.add(issue)
+        self.session.commit()
+
+        pagure.lib.git.update_git(issues[0], repo).get()
+        commit = gitrepo.revparse_single("HEAD")
+        self.assertEqual(commit.parents, [head])
+        self.assertTrue(commit.message.startswith("Updated 2 issues\n\n"))
+
+        # The update queued for the other issue has nothing left to do
+        pagure.lib.git.update_git(issues[1], repo).get()
+        self.assertEqual(gitrepo.revparse_single("HEAD"), commit)
+
+        # Issues which did not change are not mentioned in the commit
+        issues[1].content += " again"
+        self.session.add(issues[1])
+        self.session.commit()
+        pagure.lib.git.update_git(issues[1], repo).get()
+        commit = gitrepo.revparse_single("HEAD")
+        self.assertEqual(
+            commit.message,
+            "Updated issue %s: %s" % (issues[1].uid, issues[1].title),
+        )
+
+    @patch("pagure.lib.notify.send_email", MagicMock(return_value=True))
+    def test_update_git_hooks(self):
+        """Test that the update_git of pagure.lib.git runs the hooks of
+        the git repo."""
+        self.test_update_git()
+
+        gitpath = os.path.join(
+            self.path, "repos", "tickets", "test_ticket_repo.git"
+        )
+        gitrepo = pygit2.Repository(gitpath)
+        head = gitrepo.revparse_single("HEAD")
+
+        output = os.path.join(self.path, "post-receive.out")
+        hookdir = os.path.join(gitpath, "hooks")
+        if not os.path.exists(hookdir):
+            os.makedirs(hookdir)
+        for hooktype, script in (
+            ("pre-receive", "#!/bin/sh\nexit 1\n"),
+            ("post-receive", "#!/bin/sh\ncat > %s\n" % output),
+        ):
+            with open(os.path.join(hookdir, hooktype), "w") as stream:
+                stream.write(script)
+            os.chmod(os.path.join(hookdir, hooktype), 0o755)
+
+        repo = pagure.lib.query.get_authorized_project(
+            self.session, "test_ticket_repo"
+        )
+        issue = pagure.lib.query.search_issues(self.session, repo, issueid=1)
+        issue.content = "Something else"
+        self.session.add(issue)
+        self.session.commit()
+
+        # The pre-receive hook declines the update
+        self.assertRaises(
+            pagure.exceptions.PagurePushDenied,
+            pagure.lib.git._update_git,
+            issue,
+            repo,
+        )
+        self.assertEqual(gitrepo.revparse_single("HEAD"), head)
+        self.assertFalse(os.path.exists(output))
+
+        # The pre-receive hook accepts it
+        with open(os.path.join(hookdir, "pre-receive"), "w") as stream:
+            stream.write("#!/bin/sh\nexit 0\n")
+        pagure.lib.git._update_git(issue, repo)
+
+        commit = gitrepo.revparse_single("HEAD")
+        self.assertEqual(commit.parents, [head])
+        with open(output) as stream:
+            self.assertEqual(
+                stream.read(),
+                "%s %s refs/heads/master\n" % (head.hex, commit.hex),
+            )
+
     @patch("pagure.lib.notify.send_email")
     def test_update_git_requests(self, email_f):
         """Test the update_git of pagure.lib.git for pull-requests."""
@@ -3195,6 +3335,66 @@ index 0000000..60f7480
             output = pagure.lib.git.get_author(githash, gitrepo)
             self.assertEqual(output, "pagure")
 
+    def test_get_commits_info(self):
+        """Test the get_commits_info method of pagure.lib.git."""
+        gitrepo = os.path.join(self.path, "repos", "test_info.git")
+        tests.add_commit_git_repo(gitrepo, ncommits=3)
+        repo = pygit2.Repository(gitrepo)
+        commits = [commit.oid.hex for commit in repo.walk(repo.head.target)]
+        self.assertEqual(len(commits), 3)
+
+        output = pagure.lib.git.get_commits_info(commits, gitrepo)
+        self.assertEqual(sorted(output), sorted(commits))
+        self.assertEqual(
+            output[commits[0]],
+            {
+                "author": "Alice Author",
+                "email": "alice@authors.tld",
+                "subject": "Add row 2 to sources file",
+            },
+        )
+        self.assertEqual(
+            pagure.lib.git.get_commit_subject(commits[-1], gitrepo),
+            "Add row 0 to sources file",
+        )
+        self.assertEqual(
+            pagure.lib.git.get_author_email(commits[-1], gitrepo),
+            "alice@authors.tld",
+        )
+
+    def test_log_commits_to_db(self):
+        """Test the log_commits_to_db method of pagure.lib.git."""
+        tests.create_projects(self.session)
+        project = pagure.lib.query.get_authorized_project(self.session, "test")
+        gitrepo = os.path.join(self.path, "repos", "test_log.git")
+        tests.add_commit_git_repo(gitrepo, ncommits=3)
+        repo = pygit2.Repository(gitrepo)
+        commits = [commit.oid.hex for commit in repo.walk(repo.head.target)]
+
+        # The commits are attributed to the user owning their email
+        item = pagure.lib.model.UserEmail(user_id=1, email="alice@authors.tld")
+        self.session.add(item)
+        self.session.commit()
+
+        pagure.lib.git.log_commits_to_db(
+            self.session, project, commits[:2] + ["invalid"], gitrepo
+        )
+        self.session.commit()
+        # Logging them again does not duplicate them
+        pagure.lib.git.log_commits_to_db(
+            self.session, project, commits, gitrepo
+        )
+        self.session.commit()
+
+        logs = (
+            self.session.query(pagure.lib.model.PagureLog)
+            .filter_by(project_id=project.id, log_type="committed")
+            .all()
+        )
+        self.assertEqual(sorted(log.ref_id for log in logs), sorted(commits))
+        self.assertEqual(set(log.user_id for log in logs), set([1]))
+        self.assertEqual(set(log.user_email for log in logs), set([None]))
+
     def get_author_email(self):
         """Test the get_author_email method of pagure.lib.git."""
 
@@ -3650,6 +3850,159 @@ index 0000000..60f7480
             orig.references["refs/pull/6/head"].peel().hex, newesthex
         )
 
+    @patch.dict("pagure.config.config", {"REPO_CACHE_MAX_ENTRIES": 3})
+    def test_repo_cache(self):
+        """Test that the cache kept in the git repos is bounded."""
+        gitrepo = os.path.join(self.path, "repos", "test_cache.git")
+        pygit2.init_repository(gitrepo, bare=True)
+        repo = pygit2.Repository(gitrepo)
+
+        self.assertIsNone(pagure.lib.git.read_repo_cache(repo, "diff", "a"))
+        pagure.lib.git.write_repo_cache(repo, "diff", "a", ["1"])
+        pagure.lib.git.write_repo_cache(repo, "stats", "a", {"head": "2"})
+        self.assertEqual(
+            pagure.lib.git.read_repo_cache(repo, "diff", "a"), ["1"]
+        )
+        self.assertEqual(
+            pagure.lib.git.read_repo_cache(repo, "stats", "a"), {"head": "2"}
+        )
+
+        # Beyond the limit, the outdated entries of the section are removed
+        outdated = MagicMock(side_effect=lambda keys: ["b"])
+        pagure.lib.git.write_repo_cache(repo, "diff", "b", ["3"])
+        pagure.lib.git.write_repo_cache(
+            repo, "diff", "c", ["4"], outdated=outdated
+        )
+        outdated.assert_called_once()
+        self.assertEqual(sorted(outdated.call_args[0][0]), ["a", "b"])
+        self.assertIsNone(pagure.lib.git.read_repo_cache(repo, "diff", "b"))
+        self.assertEqual(
+            pagure.lib.git.read_repo_cache(repo, "diff", "a"), ["1"]
+        )
+
+        # Or all of them if that is not enough
+        pagure.lib.git.write_repo_cache(repo, "diff", "d", ["5"])
+        self.assertIsNone(pagure.lib.git.read_repo_cache(repo, "diff", "a"))
+        self.assertIsNone(pagure.lib.git.read_repo_cache(repo, "diff", "c"))
+        self.assertEqual(
+            pagure.lib.git.read_repo_cache(repo, "diff", "d"), ["5"]
+        )
+        self.assertEqual(
+            pagure.lib.git.read_repo_cache(repo, "stats", "a"), {"head": "2"}
+        )
+
+    def test_get_branches_of_commit(self):
+        """Test the get_branches_of_commit method of pagure.lib.git."""
+        gitrepo = os.path.join(self.path, "repos", "test_branches.git")
+        tests.add_commit_git_repo(gitrepo, ncommits=2)
+        tests.add_commit_git_repo(gitrepo, ncommits=1, branch="feature")
+        repo = pygit2.Repository(gitrepo)
+        master = repo.lookup_branch("master").peel().hex
+        feature = repo.lookup_branch("feature").peel().hex
+
+        # Commits in the default branch are not reported
+        self.assertEqual(
+            pagure.lib.git.get_branches_of_commit(repo, master), []
+        )
+        self.assertEqual(
+            pagure.lib.git.get_branches_of_commit(repo, feature), ["feature"]
+        )
+
+        # The branches are looked up again once they move
+        tests.add_commit_git_repo(gitrepo, ncommits=1, branch="feature")
+        repo = pygit2.Repository(gitrepo)
+        self.assertEqual(
+            pagure.lib.git.get_branches_of_commit(repo, feature), ["feature"]
+        )
+
+        # Objects which are not commits are in no branch
+        tree = repo[feature].tree.hex
+        self.assertEqual(pagure.lib.git.get_branches_of_commit(repo, tree), [])
+        self.assertEqual(
+            pagure.lib.git.get_branches_of_commit(repo, "0" * 40), []
+        )
+
+    def test_temporary_clone_pool(self):
+        """Test that TemporaryClone reuses and resets the clones kept in
+        the CLONE_POOL_FOLDER."""
+        tests.create_projects(self.session)
+        gitrepo = os.path.join(self.path, "repos", "test.git")
+        tests.add_content_git_repo(gitrepo)
+        tests.add_commit_git_repo(gitrepo, ncommits=1, branch="feature")
+        project = pagure.lib.query._get_project(self.session, "test")
+        pooldir = os.path.join(self.path, "clone_pool")
+
+        with patch.dict(
+            "pagure.config.config", {"CLONE_POOL_FOLDER": pooldir}
+        ):
+            with pagure.lib.git.TemporaryClone(
+                project, "main", "test"
+            ) as tempclone:
+                clonepath = tempclone.repopath
+                self.assertEqual(
+                    sorted(tempclone.repo.branches.local),
+                    ["feature", "master"],
+                )
+                # Leave some mess behind
+                tempclone.repo.create_remote("fork", "/tmp/fork.git")
+                tempclone.repo.branches.local.create(
+                    "stray", tempclone.repo.head.peel()
+                )
+                tempclone.repo.references.create(
+                    "refs/notes/stray", tempclone.repo.head.target
+                )
+                tempclone.repo.config["user.name"] = "Stray"
+                with open(os.path.join(clonepath, "stray"), "w") as stream:
+                    stream.write("stray")
+                with open(os.path.join(clonepath, "sources"), "w") as stream:
+                    stream.write("changed")
+
+                # While in use, the clone is not shared
+                with pagure.lib.git.TemporaryClone(
+                    project, "main", "test"
+                ) as other:
+                    self.assertNotEqual(other.repopath, clonepath)
+                    otherpath = other.repopath
+                self.assertFalse(os.path.exists(otherpath))
+
+            self.assertTrue(os.path.exists(clonepath))
+            with open(clonepath + ".size") as stream:
+                total, other = [int(size) for size in stream.read().split()]
+            self.assertTrue(0 < other < total)
+            tests.add_commit_git_repo(gitrepo, ncommits=1)
+
+            with pagure.lib.git.TemporaryClone(
+                project, "main", "test"
+            ) as tempclone:
+                self.assertEqual(tempclone.repopath, clonepath)
+                repo = tempclone.repo
+                self.assertEqual(
+                    sorted(repo.branches.local), ["feature", "master"]
+                )
+                self.assertEqual([r.name for r in repo.remotes], ["origin"])
+                self.assertNotIn("refs/notes/stray", repo.listall_references())
+                config = pygit2.Config(
+                    os.path.join(clonepath, ".git", "config")
+                )
+                self.assertNotIn("user.name", config)
+                self.assertEqual(repo.head.shorthand, "master")
+                self.assertEqual(
+                    repo.head.target,
+                    pygit2.Repository(gitrepo).head.target,
+                )
+                self.assertFalse(
+                    os.path.exists(os.path.join(clonepath, "stray"))
+                )
+                self.assertEqual(repo.status(), {})
+
+        # Over the limits, the clones used the least recently are removed
+        with patch.dict(
+            "pagure.config.config",
+            {"CLONE_POOL_FOLDER": pooldir, "CLONE_POOL_MAX_CLONES": 0},
+        ):
+            pagure.lib.git._evict_pooled_clones()
+        self.assertFalse(os.path.exists(clonepath))
+
 
 class PagureLibGitCommitToPatchtests(tests.Modeltests):
     """Tests for pagure.lib.git"""
@@ -256,6 +256,46 @@ class PagureFlaskForkPrtests(tests.Modeltests):
             orig_commit.message, "Editing the file sources for testing #5"
         )
 
+    def test_get_pr_info_cached(self):
+        """Test pagure.lib.git.get_diff_info uses its ancestry cache"""
+
+        gitrepo = os.path.join(self.path, "repos", "test.git")
+        gitrepo2 = os.path.join(
+            self.path, "repos", "forks", "pingou", "test.git"
+        )
+
+        diff, diff_commits, orig_commit = pagure.lib.git.get_diff_info(
+            repo_obj=PagureRepo(gitrepo2),
+            orig_repo=PagureRepo(gitrepo),
+            branch_from="feature_foo",
+            branch_to="master",
+        )
+        self.assertEqual(len(diff_commits), 2)
+        self.assertTrue(
+            os.path.exists(
+                os.path.join(gitrepo, pagure.lib.git.REPO_CACHE_FILE)
+            )
+        )
+
+        # The second call is answered from the cache without walking
+        with patch("pagure.lib.repo.PagureRepo.walk") as walk:
+            diff, diff_commits2, orig_commit = pagure.lib.git.get_diff_info(
+                repo_obj=PagureRepo(gitrepo2),
+                orig_repo=PagureRepo(gitrepo),
+                branch_from="feature_foo",
+                branch_to="master",
+            )
+            walk.assert_not_called()
+
+        self.assertEqual(
+            [c.oid.hex for c in diff_commits2],
+            [c.oid.hex for c in diff_commits],
+        )
+        self.assertEqual(
+            diff_commits2[0].message,
+            "Second edit on side branch of the file sources for testing",
+        )
+
     def test_get_pr_info_raises(self):
         """Test pagure.ui.fork._get_pr_info"""
 
@@ -303,50 +303,50 @@ repo requests/test
 @group2 = threebean puiterwijk kevin pingou
 
 # end of header
-repo test2
+repo test
   R   = @all
+  RW+ = foo
   RW+ = pingou
 
-repo docs/test2
+repo docs/test
   R   = @all
+  RW+ = foo
   RW+ = pingou
 
-repo tickets/test2
+repo tickets/test
+  RW+ = foo
   RW+ = pingou
 
-repo requests/test2
+repo requests/test
+  RW+ = foo
   RW+ = pingou
 
-repo somenamespace/test3
+repo test2
   R   = @all
   RW+ = pingou
 
-repo docs/somenamespace/test3
+repo docs/test2
   R   = @all
   RW+ = pingou
 
-repo tickets/somenamespace/test3
+repo tickets/test2
   RW+ = pingou
 
-repo requests/somenamespace/test3
+repo requests/test2
   RW+ = pingou
 
-repo test
+repo somenamespace/test3
   R   = @all
-  RW+ = foo
   RW+ = pingou
 
-repo docs/test
+repo docs/somenamespace/test3
   R   = @all
-  RW+ = foo
   RW+ = pingou
 
-repo tickets/test
-  RW+ = foo
+repo tickets/somenamespace/test3
   RW+ = pingou
 
-repo requests/test
-  RW+ = foo
+repo requests/somenamespace/test3
   RW+ = pingou
 
 # end of body
@@ -358,6 +358,61 @@ repo requests/test
         # print data
         self.assertEqual(data, exp)
 
+    def test_index_config(self):
+        """Test the _index_config method of the gitolite helper."""
+        helper = pagure.lib.git_auth.get_git_auth_helper("gitolite3")
+        config = ["@grp  = foo pingou", "# end of groups", ""]
+        config.extend(CORE_CONFIG.split("\n"))
+
+        index = helper._index_config(config)
+
+        self.assertEqual(index["@grp"], 0)
+        self.assertEqual(index["repo test"], (3, 6))
+        self.assertEqual(index["repo requests/test"], (14, 16))
+        self.assertEqual(
+            index["repo requests/somenamespace/test3"],
+            (len(config) - 2, len(config)),
+        )
+        self.assertEqual(len(index), 13)
+
+    def test_replace_project_config(self):
+        """Test the _replace_project_config method of the gitolite helper."""
+        helper = pagure.lib.git_auth.get_git_auth_helper("gitolite3")
+        config = CORE_CONFIG.split("\n")
+        project = pagure.lib.query._get_project(self.session, "test2")
+
+        new_config = helper._replace_project_config(
+            config, project, ["repo test2", "  RW+ = foo", ""]
+        )
+
+        # The block of the project is replaced where it was
+        idx = new_config.index("repo test2")
+        self.assertEqual(
+            new_config[idx - 1 : idx + 3],
+            ["", "repo test2", "  RW+ = foo", ""],
+        )
+        self.assertEqual(new_config[:idx], config[:idx])
+        self.assertNotIn("repo docs/test2", new_config)
+        self.assertNotIn("repo tickets/test2", new_config)
+        self.assertNotIn("repo requests/test2", new_config)
+        self.assertEqual(
+            [row for row in new_config[idx + 3 :] if row],
+            [
+                row
+                for row in config[config.index("repo somenamespace/test3") :]
+                if row
+            ],
+        )
+
+        # Projects not yet in the configuration are added at the end
+        project = pagure.lib.query._get_project(self.session, "test")
+        new_config = helper._clean_current_config(config, project)
+        new_config = helper._replace_project_config(
+            new_config, project, ["repo test", "  RW+ = foo", ""]
+        )
+        self.assertEqual(new_config[-3:], ["repo test", "  RW+ = foo", ""])
+        self.assertNotIn("repo docs/test", new_config)
+
     @patch.dict(
         "pagure.config.config", {"ENABLE_DOCS": False, "ENABLE_TICKETS": False}
     )
@@ -685,51 +740,51 @@ repo requests/test
 @grp2  = foo
 # end of groups
 
-repo test2
+repo test
   R   = @all
   RW+ = pingou
+  RW+ = foo
 
-repo docs/test2
+repo docs/test
   R   = @all
   RW+ = pingou
+  RW+ = foo
 
-repo tickets/test2
+repo tickets/test
   RW+ = pingou
+  RW+ = foo
 
-repo requests/test2
+repo requests/test
   RW+ = pingou
+  RW+ = foo
 
-repo somenamespace/test3
+repo test2
   R   = @all
   RW+ = pingou
 
-repo docs/somenamespace/test3
+repo docs/test2
   R   = @all
   RW+ = pingou
 
-repo tickets/somenamespace/test3
+repo tickets/test2
   RW+ = pingou
 
-repo requests/somenamespace/test3
+repo requests/test2
   RW+ = pingou
 
-repo test
+repo somenamespace/test3
   R   = @all
   RW+ = pingou
-  RW+ = foo
 
-repo docs/test
+repo docs/somenamespace/test3
   R   = @all
   RW+ = pingou
-  RW+ = foo
 
-repo tickets/test
+repo tickets/somenamespace/test3
   RW+ = pingou
-  RW+ = foo
 
-repo requests/test
+repo requests/somenamespace/test3
   RW+ = pingou
-  RW+ = foo
 
 # end of body
 # end of generated configuration
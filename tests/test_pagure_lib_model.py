@@ -247,6 +247,57 @@ class PagureLibModeltests(tests.Modeltests):
 
         self.assertEqual([p.fullname for p in group.projects], order)
 
+    def test_project_json_attributes_cached(self):
+        """Test that the JSON attributes of a project are only parsed
+        when they changed."""
+        tests.create_projects(self.session)
+        self.session.commit()
+        repo = pagure.lib.query.get_authorized_project(self.session, "test")
+
+        with patch(
+            "pagure.lib.model.json.loads",
+            side_effect=pagure.lib.model.json.loads,
+        ) as loads:
+            for _ in range(10):
+                self.assertTrue(repo.settings["issue_tracker"])
+                self.assertEqual(repo.milestones, {})
+                self.assertEqual(
+                    repo.close_status,
+                    ["Invalid", "Insufficient data", "Fixed", "Duplicate"],
+                )
+            self.assertEqual(loads.call_count, 1)
+
+            # Changing the values returned does not change the project
+            settings = repo.settings
+            settings["issue_tracker"] = False
+            repo.close_status.append("Foo")
+            self.assertTrue(repo.settings["issue_tracker"])
+            self.assertEqual(len(repo.close_status), 4)
+
+            # The setter invalidates the cache
+            repo.settings = settings
+            self.assertFalse(repo.settings["issue_tracker"])
+            repo.milestones = {"v1.0": {"date": None, "active": True}}
+            self.assertEqual(
+                repo.milestones, {"v1.0": {"date": None, "active": True}}
+            )
+            self.session.commit()
+            loads.reset_mock()
+
+            # So does a change made in the database by someone else
+            self.session.execute(
+                pagure.lib.model.Project.__table__.update()
+                .where(pagure.lib.model.Project.id == repo.id)
+                .values(_close_status='["Fixed"]')
+            )
+            self.session.commit()
+            self.assertEqual(repo.close_status, ["Fixed"])
+            self.assertFalse(repo.settings["issue_tracker"])
+            # Refreshing the project does not parse the unchanged JSON again
+            self.session.refresh(repo)
+            self.assertEqual(repo.close_status, ["Fixed"])
+            self.assertEqual(loads.call_count, 1)
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)
@@ -14,6 +14,7 @@ import unittest
 import shutil
 import sys
 import os
+import smtplib
 
 from mock import patch, MagicMock
 
@@ -544,6 +545,46 @@ RW1haWwgY29udGVudA==
 """
         self.assertEqual(email.as_string(), exp)
 
+    @patch.dict(
+        "pagure.config.config",
+        {"EMAIL_SEND": True, "SMTP_STARTTLS": True, "SMTP_POOL_SIZE": 1},
+    )
+    @patch("pagure.lib.notify._SMTP_POOL", [])
+    @patch("pagure.lib.notify.smtplib.SMTP")
+    def test_send_email_reuses_connection(self, mock_smtp):
+        """Test that the send_email method from pagure.lib.notify reuses
+        the connection to the SMTP server across recipients and calls."""
+        smtp = mock_smtp.return_value
+        smtp.starttls.return_value = (220, "ok")
+
+        for _ in range(2):
+            pagure.lib.notify.send_email(
+                "Email content",
+                "Email Subject",
+                "foo@bar.com,bar@foo.net",
+                project_name="namespace/project",
+            )
+
+        mock_smtp.assert_called_once_with("localhost", 25)
+        smtp.starttls.assert_called_once()
+        self.assertEqual(smtp.sendmail.call_count, 4)
+        self.assertEqual(
+            [c[0][1] for c in smtp.sendmail.call_args_list],
+            [["foo@bar.com"], ["bar@foo.net"]] * 2,
+        )
+        smtp.quit.assert_not_called()
+
+        # A connection closed by the server is replaced
+        smtp.sendmail.side_effect = [
+            smtplib.SMTPServerDisconnected("closed"),
+            None,
+        ]
+        pagure.lib.notify.send_email(
+            "Email content", "Email Subject", "foo@bar.com"
+        )
+        self.assertEqual(mock_smtp.call_count, 2)
+        self.assertEqual(smtp.sendmail.call_count, 6)
+
     def test_notification_mention(self):
         g = munch.Munch()
         g.session = self.session
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for :module:`pagure.lib.render_cache`.
+"""
+
+from __future__ import unicode_literals, absolute_import
+
+import json
+import os
+import sys
+import unittest
+
+import flask
+from mock import MagicMock, patch
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+)
+
+import pagure.doc_utils
+import pagure.lib.query
+import pagure.pfmarkdown
+from pagure.exceptions import PagureEncodingException
+from pagure.lib import render_cache
+
+
+class FakeBlob(object):
+    """Stand-in for a pygit2.Blob."""
+
+    def __init__(self, hexsha, data):
+        self.oid = MagicMock(hex=hexsha)
+        self.data = data
+
+
+@patch.dict(
+    "pagure.lib.render_cache.pagure_config",
+    {"RENDER_CACHE_MAX_SIZE": 1000, "RENDER_CACHE_REDIS": False},
+)
+class TestRenderCache(unittest.TestCase):
+    def setUp(self):
+        render_cache.clear()
+
+    def test_get_rendering(self):
+        """Test that a rendering is only computed once per blob and mode."""
+        render = MagicMock(return_value=("<p>foo</p>", True))
+
+        for _ in range(3):
+            self.assertEqual(
+                render_cache.get_rendering("abc", "readme.md", render),
+                ("<p>foo</p>", True),
+            )
+        self.assertEqual(render.call_count, 1)
+
+        render_cache.get_rendering("abc", "readme.rst", render)
+        render_cache.get_rendering("def", "readme.md", render)
+        render_cache.get_rendering("abc", "readme.md", render, context="/")
+        self.assertEqual(render.call_count, 4)
+
+        stats = render_cache.get_stats()
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["misses"], 4)
+        self.assertEqual(stats["entries"], 4)
+        self.assertEqual(
+            stats["size"], 4 * len(json.dumps(["<p>foo</p>", True]))
+        )
+
+    def test_get_rendering_size_limit(self):
+        """Test that the least recently used renderings are evicted."""
+        render = MagicMock(return_value=["x" * 296])
+
+        render_cache.get_rendering("a", "file", render)
+        render_cache.get_rendering("b", "file", render)
+        render_cache.get_rendering("c", "file", render)
+        render_cache.get_rendering("a", "file", render)
+        render_cache.get_rendering("d", "file", render)
+        self.assertEqual(render.call_count, 4)
+        stats = render_cache.get_stats()
+        self.assertEqual(stats["entries"], 3)
+        self.assertEqual(stats["size"], 900)
+
+        # "b" was the least recently used
+        render_cache.get_rendering("a", "file", render)
+        self.assertEqual(render.call_count, 4)
+        render_cache.get_rendering("b", "file", render)
+        self.assertEqual(render.call_count, 5)
+
+        # Too large to be cached at all
+        render = MagicMock(return_value=["x" * 1000])
+        render_cache.get_rendering("e", "file", render)
+        render_cache.get_rendering("e", "file", render)
+        self.assertEqual(render.call_count, 2)
+
+    @patch.dict(
+        "pagure.lib.render_cache.pagure_config", {"RENDER_CACHE_MAX_SIZE": 0}
+    )
+    def test_get_rendering_disabled(self):
+        """Test that nothing is cached if the cache is disabled."""
+        render = MagicMock(return_value=["foo"])
+        render_cache.get_rendering("abc", "file", render)
+        render_cache.get_rendering("abc", "file", render)
+        self.assertEqual(render.call_count, 2)
+        self.assertEqual(render_cache.get_stats()["entries"], 0)
+
+    @patch.dict(
+        "pagure.lib.render_cache.pagure_config", {"RENDER_CACHE_REDIS": True}
+    )
+    def test_get_rendering_redis(self):
+        """Test that the renderings are shared via redis."""
+        redis = MagicMock()
+        redis.get.return_value = None
+        render = MagicMock(return_value=["<p>foo</p>", True])
+        with patch("pagure.lib.query.REDIS", redis):
+            render_cache.get_rendering("abc", "readme.md", render)
+            self.assertEqual(redis.setex.call_count, 1)
+            key, ttl, value = redis.setex.call_args[0]
+            self.assertTrue(key.startswith("pagure.render."))
+            self.assertEqual(ttl, 86400)
+
+            # Another process finds it in redis
+            render_cache.clear()
+            redis.get.return_value = value.encode("utf-8")
+            self.assertEqual(
+                render_cache.get_rendering("abc", "readme.md", render),
+                ("<p>foo</p>", True),
+            )
+            self.assertEqual(render.call_count, 1)
+            self.assertEqual(render_cache.get_stats()["redis_hits"], 1)
+
+            # And then in memory
+            render_cache.get_rendering("abc", "readme.md", render)
+            self.assertEqual(redis.get.call_count, 2)
+            self.assertEqual(render_cache.get_stats()["hits"], 1)
+
+    def test_decode_blob(self):
+        """Test that the encoding of a blob is only guessed once."""
+        blob = FakeBlob("abc", "Šabata ďábel".encode("utf-8"))
+        with patch(
+            "pagure.lib.encoding_utils.guess_encoding",
+            return_value="utf-8",
+        ) as guess_encoding:
+            self.assertEqual(render_cache.decode_blob(blob), "Šabata ďábel")
+            self.assertEqual(render_cache.decode_blob(blob), "Šabata ďábel")
+        self.assertEqual(guess_encoding.call_count, 1)
+
+    def test_decode_blob_failed(self):
+        """Test that blobs which cannot be decoded are remembered."""
+        blob = FakeBlob("abc", b"\xff\xfe")
+        with patch(
+            "pagure.lib.encoding_utils.guess_encoding",
+            side_effect=PagureEncodingException("No encoding"),
+        ) as guess_encoding:
+            for _ in range(2):
+                self.assertRaises(
+                    PagureEncodingException, render_cache.decode_blob, blob
+                )
+        self.assertEqual(guess_encoding.call_count, 1)
+
+    def test_convert_readme(self):
+        """Test that the READMEs are cached by the ID of their blob."""
+        with patch(
+            "pagure.doc_utils._convert_readme",
+            return_value=("<p>foo</p>", True),
+        ) as convert:
+            for _ in range(2):
+                self.assertEqual(
+                    pagure.doc_utils.convert_readme(b"foo", ".md", oid="abc"),
+                    ("<p>foo</p>", True),
+                )
+            pagure.doc_utils.convert_readme(b"foo", ".md")
+        self.assertEqual(convert.call_count, 2)
+
+    def test_convert_readme_private(self):
+        """Test that the READMEs linking to private projects are cached per
+        user."""
+
+        def _convert(content, ext, view_file_url):
+            pagure.pfmarkdown.set_depends_on_user(True)
+            return "<p>foo</p>", True
+
+        app = flask.Flask(__name__)
+        with patch(
+            "pagure.doc_utils._convert_readme", side_effect=_convert
+        ) as convert:
+            for username in ("pingou", "pingou", "foo", None, None):
+                with app.test_request_context("/test/tree/master"):
+                    if username:
+                        flask.g.fas_user = MagicMock(username=username)
+                    self.assertEqual(
+                        pagure.doc_utils.convert_readme(
+                            b"foo", ".md", oid="abc"
+                        ),
+                        ("<p>foo</p>", True),
+                    )
+        # Once for each user, once when it was not known to be private
+        self.assertEqual(convert.call_count, 4)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -10,6 +10,7 @@
 
 from __future__ import unicode_literals, absolute_import
 
+import collections
 import datetime
 import os
 import shutil
@@ -19,6 +20,7 @@ import time
 import unittest
 
 import pygit2
+import requests
 import six
 from mock import ANY, patch, MagicMock, call
 
@@ -251,46 +253,94 @@ class PagureLibTaskServicestests(tests.Modeltests):
         up_pr.assert_not_called()
         send.assert_not_called()
 
+    def _create_json_repo(self):
+        """Create a git repo with two commits pushing JSON files and
+        return its path and the list of the commits."""
+        path = os.path.join(self.path, "repos", "tickets", "json.git")
+        repo = pygit2.init_repository(path, bare=True)
+        author = pygit2.Signature("Alice Author", "alice@authors.tld")
+
+        files = repo.TreeBuilder()
+        files.insert(
+            "image", repo.create_blob(b"PNG"), pygit2.GIT_FILEMODE_BLOB
+        )
+        files = files.write()
+
+        commits = []
+        parents = []
+        for content in (
+            {"file1": b'{"a": 1}'},
+            {"file1": b'{"a": 2}', "file2": b'{"b": 1}'},
+        ):
+            builder = repo.TreeBuilder()
+            builder.insert("files", files, pygit2.GIT_FILEMODE_TREE)
+            for filename, data in content.items():
+                builder.insert(
+                    filename, repo.create_blob(data), pygit2.GIT_FILEMODE_BLOB
+                )
+            commit = repo.create_commit(
+                "refs/heads/master",
+                author,
+                author,
+                "Update",
+                builder.write(),
+                parents,
+            )
+            commits.append(commit.hex)
+            parents = [commit]
+        return path, commits
+
+    def test_get_files_to_load(self):
+        """Test the get_files_to_load method."""
+        path, commits = self._create_json_repo()
+
+        output = pagure.lib.tasks_services.get_files_to_load(
+            "test", commits, path
+        )
+        self.assertEqual(output, ["file1", "file2", "files/image"])
+
+        output = pagure.lib.tasks_services.get_files_to_load(
+            "test", commits[1:], path
+        )
+        self.assertEqual(output, ["file1", "file2"])
+
+        output = pagure.lib.tasks_services.get_files_to_load(
+            "test", ["hash1"], path
+        )
+        self.assertEqual(output, [])
+
     @patch("pagure.lib.notify.send_email")
     @patch("pagure.lib.git.update_request_from_git")
     @patch("pagure.lib.git.update_ticket_from_git")
-    @patch("pagure.lib.git.read_git_lines")
-    def test_load_json_commits_to_db_no_agent(
-        self, git, up_issue, up_pr, send
-    ):
+    def test_load_json_commits_to_db_no_agent(self, up_issue, up_pr, send):
         """Test the load_json_commits_to_db method."""
-        git.side_effect = [["file1"], ["file2"], ["files/image"], ["file1"]]
+        path, commits = self._create_json_repo()
 
         output = pagure.lib.tasks_services.load_json_commits_to_db(
             name="test",
-            commits=["hash1", "hash2"],
-            abspath=self.path,
+            commits=commits,
+            abspath=path,
             data_type="ticket",
             agent=None,
             namespace=None,
             username=None,
         )
         self.assertIsNone(output)
-        up_issue.assert_not_called()
+        self.assertEqual(up_issue.call_count, 2)
         up_pr.assert_not_called()
         send.assert_not_called()
 
-    @patch("json.loads")
     @patch("pagure.lib.notify.send_email")
     @patch("pagure.lib.git.update_request_from_git")
     @patch("pagure.lib.git.update_ticket_from_git")
-    @patch("pagure.lib.git.read_git_lines")
-    def test_load_json_commits_to_db_tickets(
-        self, git, up_issue, up_pr, send, json_loads
-    ):
+    def test_load_json_commits_to_db_tickets(self, up_issue, up_pr, send):
         """Test the load_json_commits_to_db method."""
-        git.side_effect = [["file1"], ["file2"], ["files/image"], ["file1"]]
-        json_loads.return_value = "foobar"
+        path, commits = self._create_json_repo()
 
         output = pagure.lib.tasks_services.load_json_commits_to_db(
             name="test",
-            commits=["hash1", "hash2"],
-            abspath=self.path,
+            commits=commits,
+            abspath=path,
             data_type="ticket",
             agent=None,
             namespace=None,
@@ -303,7 +353,7 @@ class PagureLibTaskServicestests(tests.Modeltests):
                 ANY,
                 agent=None,
                 issue_uid="file1",
-                json_data="foobar",
+                json_data={"a": 2},
                 namespace=None,
                 reponame="test",
                 username=None,
@@ -312,7 +362,7 @@ class PagureLibTaskServicestests(tests.Modeltests):
                 ANY,
                 agent=None,
                 issue_uid="file2",
-                json_data="foobar",
+                json_data={"b": 1},
                 namespace=None,
                 reponame="test",
                 username=None,
@@ -322,22 +372,17 @@ class PagureLibTaskServicestests(tests.Modeltests):
         up_pr.assert_not_called()
         send.assert_not_called()
 
-    @patch("json.loads")
     @patch("pagure.lib.notify.send_email")
     @patch("pagure.lib.git.update_request_from_git")
     @patch("pagure.lib.git.update_ticket_from_git")
-    @patch("pagure.lib.git.read_git_lines")
-    def test_load_json_commits_to_db_prs(
-        self, git, up_issue, up_pr, send, json_loads
-    ):
+    def test_load_json_commits_to_db_prs(self, up_issue, up_pr, send):
         """Test the load_json_commits_to_db method."""
-        git.side_effect = [["file1"], ["file2"], ["files/image"], ["file1"]]
-        json_loads.return_value = "foobar"
+        path, commits = self._create_json_repo()
 
         output = pagure.lib.tasks_services.load_json_commits_to_db(
             name="test",
-            commits=["hash1", "hash2"],
-            abspath=self.path,
+            commits=commits,
+            abspath=path,
             data_type="pull-request",
             agent="pingou",
             namespace=None,
@@ -348,7 +393,7 @@ class PagureLibTaskServicestests(tests.Modeltests):
         calls = [
             call(
                 ANY,
-                json_data="foobar",
+                json_data={"a": 2},
                 namespace=None,
                 reponame="test",
                 request_uid="file1",
@@ -356,7 +401,7 @@ class PagureLibTaskServicestests(tests.Modeltests):
             ),
             call(
                 ANY,
-                json_data="foobar",
+                json_data={"b": 1},
                 namespace=None,
                 reponame="test",
                 request_uid="file2",
@@ -372,31 +417,34 @@ class PagureLibTaskServicestests(tests.Modeltests):
                 "repo into\n"
                 "the database. It should ignore files that are not JSON files,"
                 " this\nis fine.\n\n"
-                "Loading: file1 -- 1/2 ... ... Done\n"
-                "Loading: file2 -- 2/2 ... ... Done",
+                "Loading: file1 -- 1/3 ... ... Done\n"
+                "Loading: file2 -- 2/3 ... ... Done\n"
+                "Loading: files/image -- 3/3 ... ... SKIPPED - No JSON data\n"
+                "Loading: files/image -- 3/3 ... ... SKIPPED - No JSON data\n"
+                "\n"
+                "2 files loaded, 1 skipped, 0 failed",
                 "Issue import report",
                 "bar@pingou.com",
             )
         ]
         self.assertEqual(calls, send.mock_calls)
 
-    @patch("json.loads")
+    @patch("pagure.lib.tasks_services.format_callstack")
     @patch("pagure.lib.notify.send_email")
     @patch("pagure.lib.git.update_request_from_git")
     @patch("pagure.lib.git.update_ticket_from_git")
-    @patch("pagure.lib.git.read_git_lines")
     def test_load_json_commits_to_db_prs_raises_error(
-        self, git, up_issue, up_pr, send, json_loads
+        self, up_issue, up_pr, send, callstack
     ):
         """Test the load_json_commits_to_db method."""
-        git.side_effect = [["file1"], ["file2"], ["files/image"], ["file1"]]
-        json_loads.return_value = "foobar"
-        up_pr.side_effect = Exception("foo error")
+        path, commits = self._create_json_repo()
+        up_pr.side_effect = [Exception("foo error"), None]
+        callstack.return_value = "<callstack>"
 
         output = pagure.lib.tasks_services.load_json_commits_to_db(
             name="test",
-            commits=["hash1", "hash2"],
-            abspath=self.path,
+            commits=commits,
+            abspath=path,
             data_type="pull-request",
             agent="pingou",
             namespace=None,
@@ -404,15 +452,24 @@ class PagureLibTaskServicestests(tests.Modeltests):
         )
         self.assertIsNone(output)
 
+        # The failure on the first file does not stop the import
         calls = [
             call(
                 ANY,
-                json_data="foobar",
+                json_data={"a": 2},
                 namespace=None,
                 reponame="test",
                 request_uid="file1",
                 username=None,
-            )
+            ),
+            call(
+                ANY,
+                json_data={"b": 1},
+                namespace=None,
+                reponame="test",
+                request_uid="file2",
+                username=None,
+            ),
         ]
         up_issue.assert_not_called()
         self.assertEqual(calls, up_pr.mock_calls)
@@ -424,7 +481,12 @@ class PagureLibTaskServicestests(tests.Modeltests):
                 "repo into\n"
                 "the database. It should ignore files that are not JSON files,"
                 " this\nis fine.\n\n"
-                "Loading: file1 -- 1/2 ... ... FAILED\n",
+                "Loading: file1 -- 1/3 ... ... FAILED\n<callstack>\n"
+                "Loading: file2 -- 2/3 ... ... Done\n"
+                "Loading: files/image -- 3/3 ... ... SKIPPED - No JSON data\n"
+                "Loading: files/image -- 3/3 ... ... SKIPPED - No JSON data\n"
+                "\n"
+                "1 files loaded, 1 skipped, 1 failed",
                 "Issue import report",
                 "bar@pingou.com",
             )
@@ -477,10 +539,12 @@ class PagureLibTaskServicesWithWebHooktests(tests.Modeltests):
     @patch("time.time", MagicMock(return_value=2))
     @patch("uuid.uuid4", MagicMock(return_value="not_so_random"))
     @patch("datetime.datetime")
-    @patch("requests.post")
-    def test_webhook_notification_no_webhook(self, post, dt):
+    @patch("pagure.lib.tasks_services._get_session")
+    def test_webhook_notification_no_webhook(self, get_session, dt):
         """Test the webhook_notification method."""
-        post.return_value = False
+        post = get_session.return_value.post
+        post.return_value = MagicMock(status_code=404)
+        post.return_value.__bool__.return_value = False
         utcnow = MagicMock()
         utcnow.year = 2018
         dt.utcnow.return_value = utcnow
@@ -546,9 +610,146 @@ class PagureLibTaskServicesWithWebHooktests(tests.Modeltests):
             ),
         ]
 
-        print(post.mock_calls)
+        post.assert_has_calls(calls, any_order=True)
+        get_session.assert_has_calls(
+            [call("http://bar.org/bar"), call("http://foo.com/api/flag")],
+            any_order=True,
+        )
+
+    @patch("pagure.lib.tasks_services.retry_web_hook")
+    @patch("pagure.lib.tasks_services._get_session")
+    def test_webhook_notification_retry(self, get_session, retry):
+        """Test that the webhook_notification method schedules a retry for
+        the urls which could not be reached."""
 
-        self.assertEqual(calls, post.mock_calls)
+        def _post(url, **kwargs):
+            if url == "http://foo.com/api/flag":
+                raise requests.exceptions.ConnectionError("Nope")
+            return MagicMock(status_code=200)
+
+        get_session.return_value.post.side_effect = _post
+
+        output = pagure.lib.tasks_services.webhook_notification(
+            topic="topic",
+            msg={"payload": ["a", "b", "c"]},
+            namespace=None,
+            name="test",
+            user=None,
+        )
+        self.assertIsNone(output)
+
+        retry.apply_async.assert_called_once_with(
+            kwargs={
+                "topic": "topic",
+                "url": "http://foo.com/api/flag",
+                "content": ANY,
+                "attempt": 1,
+                "namespace": None,
+                "name": "test",
+                "user": None,
+            },
+            countdown=60,
+        )
+
+    @patch("pagure.lib.tasks_services.retry_web_hook.apply_async")
+    @patch("pagure.lib.tasks_services._get_session")
+    def test_retry_web_hook(self, get_session, apply_async):
+        """Test the retry_web_hook method."""
+        get_session.return_value.post.return_value = MagicMock(status_code=503)
+        get_session.return_value.post.return_value.__bool__.return_value = (
+            False
+        )
+
+        pagure.lib.tasks_services.retry_web_hook(
+            topic="topic",
+            url="http://foo.com/api/flag",
+            content="{}",
+            attempt=2,
+            namespace=None,
+            name="test",
+            user=None,
+        )
+
+        # The delay doubles with each attempt
+        apply_async.assert_called_once_with(kwargs=ANY, countdown=240)
+        self.assertEqual(apply_async.call_args[1]["kwargs"]["attempt"], 3)
+
+        # Until it gives up
+        apply_async.reset_mock()
+        pagure.lib.tasks_services.retry_web_hook(
+            topic="topic",
+            url="http://foo.com/api/flag",
+            content="{}",
+            attempt=5,
+            namespace=None,
+            name="test",
+            user=None,
+        )
+        apply_async.assert_not_called()
+
+    @patch("pagure.lib.tasks_services.retry_web_hook.apply_async")
+    @patch("pagure.lib.tasks_services._get_session")
+    def test_retry_web_hook_removed_url(self, get_session, apply_async):
+        """Test that retry_web_hook stops once the url is no longer a
+        web-hook of the project."""
+        project = pagure.lib.query._get_project(self.session, "test")
+        settings = project.settings
+        settings["Web-hooks"] = "http://bar.org/bar"
+        project.settings = settings
+        self.session.add(project)
+        self.session.commit()
+
+        pagure.lib.tasks_services.retry_web_hook(
+            topic="topic",
+            url="http://foo.com/api/flag",
+            content="{}",
+            attempt=2,
+            namespace=None,
+            name="test",
+            user=None,
+        )
+
+        get_session.assert_not_called()
+        apply_async.assert_not_called()
+
+    @patch("pagure.lib.tasks_services.WEBHOOK_MAX_SESSIONS", 2)
+    @patch("pagure.lib.tasks_services._SESSIONS", collections.OrderedDict())
+    def test_get_session(self):
+        """Test that the HTTP sessions are reused per host and closed when
+        they are no longer used."""
+        session = pagure.lib.tasks_services._get_session("http://a.org/x")
+        self.assertIs(
+            pagure.lib.tasks_services._get_session("http://a.org/y"), session
+        )
+
+        # The least recently used sessions are closed beyond the limit
+        with patch.object(session, "close") as close:
+            pagure.lib.tasks_services._get_session("http://b.org/x")
+            pagure.lib.tasks_services._get_session("http://c.org/x")
+            close.assert_called_once_with()
+        self.assertEqual(
+            list(pagure.lib.tasks_services._SESSIONS), ["b.org", "c.org"]
+        )
+
+        # And so are the sessions which have not been used for a while
+        with patch("time.time", return_value=time.time() + 3600):
+            pagure.lib.tasks_services._get_session("http://c.org/y")
+        self.assertEqual(list(pagure.lib.tasks_services._SESSIONS), ["c.org"])
+
+    def test_record_web_hook_delivery(self):
+        """Test the _record_web_hook_delivery method."""
+        with patch("pagure.lib.query.REDIS") as redis:
+            pagure.lib.tasks_services._record_web_hook_delivery(
+                "test", "http://foo.com/api/flag", 200, 0.3, 0
+            )
+        pipeline = redis.pipeline.return_value
+        pipeline.ltrim.assert_called_once_with(
+            "pagure.webhook.test.log", 0, 99
+        )
+        pipeline.hincrby.assert_called_once_with(
+            "pagure.webhook.test.latency", "0.5", 1
+        )
+        pipeline.execute.assert_called_once_with()
 
 
 class PagureLibTaskServicesJenkinsCItests(tests.Modeltests):
@@ -877,7 +1078,8 @@ class PagureLibTaskServicesLoadJsonTickettests(tests.Modeltests):
                 "repo into\n"
                 "the database. It should ignore files that are not JSON files,"
                 " this\nis fine.\n\n"
-                "Loading: %s -- 1/1 ... ... Done" % issue.uid,
+                "Loading: %s -- 1/1 ... ... Done\n\n"
+                "1 files loaded, 0 skipped, 0 failed" % issue.uid,
                 "Issue import report",
                 "bar@pingou.com",
             )
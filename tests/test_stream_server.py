@@ -16,6 +16,7 @@ Tests for the Pagure streaming server.
 
 from __future__ import unicode_literals, absolute_import
 
+import asyncio
 import logging
 import os
 import sys
@@ -31,9 +32,6 @@ sys.path.insert(
     0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../pagure-ev")
 )
 
-if six.PY3:
-    raise unittest.case.SkipTest("Skipping on python3")
-
 import pagure.lib.query  # pylint: disable=wrong-import-position
 from pagure.exceptions import (
     PagureException,
@@ -275,6 +273,150 @@ class StreamingServerTests(tests.Modeltests):
         # NOTE: we cannot test the 'Invalid object provided' exception
         # as it's a backup (current code will never hit it)
 
+    def test_read_request(self):
+        """Tests for read_request."""
+
+        def read(data):
+            async def _read():
+                reader = asyncio.StreamReader()
+                reader.feed_data(data)
+                reader.feed_eof()
+                return await pss.read_request(reader)
+
+            return asyncio.run(_read())
+
+        result = read(
+            b"GET /test/issue/1?foo=bar HTTP/1.1\r\nHost: localhost\r\n\r\n"
+        )
+        self.assertEqual(result, "/test/issue/1")
+
+        result = read(b"GET /test/pull-request/3 HTTP/1.0\n\n")
+        self.assertEqual(result, "/test/pull-request/3")
+
+        # Invalid requests
+        for data in (
+            b"",
+            b"\r\n",
+            b"GET /test/issue/1 HTTP/1.1\r\n",
+            b"POST /test/issue/1 HTTP/1.1\r\n\r\n",
+            b"GET /test/issue/1\r\n\r\n",
+            b"GET foo HTTP/1.1\r\n\r\n",
+            b"GET /test/issue/1 HTTP/1.1\r\n"
+            + b"X-Foo: bar\r\n" * 1000
+            + b"\r\n",
+        ):
+            self.assertRaises(ValueError, read, data)
+
+    def test_get_uid_from_path(self):
+        """Tests for get_uid_from_path."""
+        issue = pagure.lib.query.search_issues(
+            self.session, self.repo, issueid=1
+        )
+        pss._OBJ_CACHE.clear()
+
+        async def get_uids():
+            return await asyncio.gather(
+                pss.get_uid_from_path("/test/issue/1"),
+                pss.get_uid_from_path("/test/issue/1"),
+            )
+
+        with mock.patch(
+            "pagure_stream_server._get_uid_from_path",
+            return_value=issue.uid,
+        ) as lookup:
+            self.assertEqual(asyncio.run(get_uids()), [issue.uid] * 2)
+            self.assertEqual(asyncio.run(get_uids()), [issue.uid] * 2)
+        # Concurrent and later lookups of the same path query the database
+        # only once
+        lookup.assert_called_once_with("/test/issue/1")
+
+        # Errors are not remembered
+        async def get_uid(path):
+            return await pss.get_uid_from_path(path)
+
+        for _ in range(2):
+            self.assertRaises(
+                PagureEvException, asyncio.run, get_uid("/test/issue/2")
+            )
+        self.assertNotIn("/test/issue/2", pss._OBJ_CACHE)
+        pss._OBJ_CACHE.clear()
+
+    def test_dispatch(self):
+        """Tests for dispatch and the disconnection of slow clients."""
+
+        async def _dispatch():
+            writers = [mock.MagicMock() for _ in range(3)]
+            clients = [pss.Client("pagure.foo", writer) for writer in writers]
+            pss.SUBSCRIBERS["pagure.foo"].update(clients[:2])
+            pss.SUBSCRIBERS["pagure.bar"].add(clients[2])
+            try:
+                pss.dispatch("pagure.foo", "msg", 0)
+                self.assertEqual(
+                    [client.queue.qsize() for client in clients], [1, 1, 0]
+                )
+
+                # The first client reads its messages, the second doesn't
+                clients[0].queue.get_nowait()
+                for _ in range(pss.CLIENT_QUEUE_SIZE):
+                    pss.dispatch("pagure.foo", "msg", 0)
+                    clients[0].queue.get_nowait()
+                self.assertEqual(
+                    pss.SUBSCRIBERS["pagure.foo"], set([clients[0]])
+                )
+                writers[0].transport.abort.assert_not_called()
+                writers[1].transport.abort.assert_called_once_with()
+                self.assertEqual(clients[2].queue.qsize(), 0)
+            finally:
+                pss.SUBSCRIBERS.clear()
+
+        dropped = pss.STATS["clients_dropped"]
+        asyncio.run(_dispatch())
+        self.assertEqual(pss.STATS["clients_dropped"], dropped + 1)
+        self.assertIn("clients_dropped: %s\n" % (dropped + 1), pss.get_stats())
+
+    @mock.patch("pagure_stream_server.time.sleep", mock.MagicMock())
+    @mock.patch("pagure_stream_server.redis.Redis")
+    def test_listen_to_redis(self, redis_cls):
+        """Tests that listen_to_redis reconnects on redis errors, skips
+        the invalid messages and stops the server on other errors."""
+
+        def _message(channel, data):
+            return {"type": "pmessage", "channel": channel, "data": data}
+
+        def _listen(*messages):
+            for message in messages:
+                if isinstance(message, Exception):
+                    raise message
+                yield message
+
+        pubsub = redis_cls.return_value.pubsub.return_value
+        pubsub.listen.side_effect = [
+            _listen(
+                _message(b"pagure.a", b"1"),
+                pss.redis.exceptions.TimeoutError("Timeout"),
+            ),
+            _listen(
+                _message(b"pagure.a", b"\xff"),
+                {"type": "psubscribe", "channel": b"pagure.*", "data": 1},
+                _message(b"pagure.b", b"2"),
+                ValueError("Oops"),
+            ),
+        ]
+        loop = mock.MagicMock()
+
+        pss.listen_to_redis(loop)
+
+        self.assertEqual(pubsub.psubscribe.call_count, 2)
+        self.assertEqual(pubsub.close.call_count, 2)
+        self.assertEqual(
+            loop.call_soon_threadsafe.call_args_list,
+            [
+                mock.call(pss.dispatch, "pagure.a", "1", mock.ANY),
+                mock.call(pss.dispatch, "pagure.b", "2", mock.ANY),
+                mock.call(loop.stop),
+            ],
+        )
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)
@@ -3,8 +3,13 @@ from __future__ import unicode_literals, absolute_import
 from mock import patch, MagicMock, Mock
 from collections import namedtuple
 import os
+import shutil
+import tempfile
 import unittest
 
+import pygit2
+
+import pagure.lib.git
 from pagure.lib import tasks
 
 
@@ -21,9 +26,22 @@ class MockCommit(object):
 @patch("pagure.lib.query.create_session", new=Mock())
 class TestCommitsAuthorStats(unittest.TestCase):
     def setUp(self):
-        self.search_user_patcher = patch("pagure.lib.query.search_user")
+        self.search_user_patcher = patch(
+            "pagure.lib.query.get_users_by_email"
+        )
         mock_search_user = self.search_user_patcher.start()
-        mock_search_user.side_effect = lambda _, email: self.authors.get(email)
+        mock_search_user.side_effect = lambda _, emails: dict(
+            (email, self.authors[email])
+            for email in emails
+            if email in self.authors
+        )
+
+        self.cache_patcher = patch(
+            "pagure.lib.git.read_repo_cache", new=Mock(return_value=None)
+        )
+        self.cache_patcher.start()
+        self.write_cache_patcher = patch("pagure.lib.git.write_repo_cache")
+        self.write_cache_patcher.start()
 
         self.pygit_patcher = patch("pygit2.Repository")
         mock_repo = self.pygit_patcher.start().return_value
@@ -48,6 +66,8 @@ class TestCommitsAuthorStats(unittest.TestCase):
 
     def tearDown(self):
         self.search_user_patcher.stop()
+        self.cache_patcher.stop()
+        self.write_cache_patcher.stop()
         self.pygit_patcher.stop()
         self.exists_patcher.stop()
 
@@ -230,6 +250,99 @@ class TestCommitsAuthorStats(unittest.TestCase):
         )
 
 
+@patch("pagure.lib.query.get_users_by_email", new=Mock(return_value={}))
+class TestCommitsStatsCache(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix="pagure-tests-")
+        self.repopath = os.path.join(self.path, "test.git")
+        self.repo = pygit2.init_repository(self.repopath, bare=True)
+        self.parents = []
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def add_commit(self, name, email):
+        author = pygit2.Signature(name, email)
+        tree = self.repo.TreeBuilder().write()
+        commit = self.repo.create_commit(
+            "refs/heads/master",
+            author,
+            author,
+            "Commit by %s" % name,
+            tree,
+            self.parents,
+        )
+        self.parents = [commit.hex]
+        return commit.hex
+
+    def test_commits_author_stats_incremental(self):
+        first = self.add_commit("Alice", "alice@example.com")
+        self.add_commit("Bob", "bob@example.com")
+
+        num_commits, authors, num_authors, _ = tasks.commits_author_stats(
+            self.repopath
+        )
+        self.assertEqual(num_commits, 2)
+        self.assertEqual(num_authors, 2)
+
+        # Only the commits added since are walked and added to the stats
+        self.add_commit("Alice", "alice@example.com")
+        (
+            num_commits,
+            authors,
+            num_authors,
+            first_time,
+        ) = tasks.commits_author_stats(self.repopath)
+
+        self.assertEqual(num_commits, 3)
+        self.assertEqual(num_authors, 2)
+        self.assertEqual(authors[0][0], 2)
+        self.assertEqual(authors[0][1][0][:2], ("Alice", "alice@example.com"))
+        self.assertEqual(first_time, self.repo[first].commit_time)
+
+        # The cached stats are used as a starting point
+        cached = pagure.lib.git.read_repo_cache(self.repo, "stats", "authors")
+        cached["number_of_commits"] = 10
+        pagure.lib.git.write_repo_cache(self.repo, "stats", "authors", cached)
+        self.add_commit("Bob", "bob@example.com")
+        num_commits, _, _, _ = tasks.commits_author_stats(self.repopath)
+        self.assertEqual(num_commits, 11)
+
+    def test_commits_author_stats_rewritten_history(self):
+        self.add_commit("Alice", "alice@example.com")
+        self.add_commit("Bob", "bob@example.com")
+        tasks.commits_author_stats(self.repopath)
+
+        # Rewrite the history
+        self.parents = []
+        self.repo.references.delete("refs/heads/master")
+        self.add_commit("Carol", "carol@example.com")
+
+        num_commits, authors, num_authors, _ = tasks.commits_author_stats(
+            self.repopath
+        )
+        self.assertEqual(num_commits, 1)
+        self.assertEqual(num_authors, 1)
+        self.assertEqual(authors[0][1][0][:2], ("Carol", "carol@example.com"))
+
+    def test_commits_history_stats_incremental(self):
+        self.add_commit("Alice", "alice@example.com")
+        self.add_commit("Bob", "bob@example.com")
+
+        output = tasks.commits_history_stats(self.repopath)
+        self.assertEqual(len(output), 1)
+        self.assertEqual(output[0][1], 2)
+
+        self.add_commit("Alice", "alice@example.com")
+        output = tasks.commits_history_stats(self.repopath)
+        self.assertEqual(len(output), 1)
+        self.assertEqual(output[0][1], 3)
+
+        # Nothing changed
+        output = tasks.commits_history_stats(self.repopath)
+        self.assertEqual(output[0][1], 3)
+
+
 class TestGitolitePostCompileOnly(object):
     @patch("pagure.lib.git_auth.get_git_auth_helper")
     def test_backend_has_post_compile_only(self, get_helper):